@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,6 +45,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'finance.metrics.RequestMetricsMiddleware',  # first, so it times the whole stack
+    'finance.routers.ReplicaRoutingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -85,6 +88,88 @@ DATABASES = {
     }
 }
 
+# PRAGMA name -> value applied to every new sqlite connection (see finance/database.py)
+FINANCE_SQLITE_PRAGMAS = {}
+
+# FINANCE_DB_PROFILE=production tunes sqlite for concurrent requests:
+# WAL lets readers run while a write (e.g. a transaction import) is in progress,
+# synchronous=NORMAL is durable under WAL except on power loss, the page cache and
+# mmap keep hot pages in memory and writers wait for the lock instead of failing.
+# Connections are kept open between requests and health checked before reuse.
+FINANCE_DB_PROFILE = os.environ.get('FINANCE_DB_PROFILE', 'development')
+if FINANCE_DB_PROFILE == 'production':
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': 600,  # seconds
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 20,  # seconds to wait for a lock
+            'transaction_mode': 'IMMEDIATE',  # take the write lock at BEGIN, avoids upgrade deadlocks
+        },
+    })
+    FINANCE_SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -64000,  # KiB, negative values are a size rather than pages
+        'mmap_size': 268435456,  # bytes
+        'busy_timeout': 20000,  # ms
+        'temp_store': 'MEMORY',
+    }
+
+# read replicas, see finance/routers.py
+# FINANCE_REPLICA_DB=<path> adds a sqlite replica kept as a copy of the primary by
+# `manage.py sync_replica`; clients read the primary for FINANCE_REPLICA_PIN_SECONDS
+# after they write, which should cover the sync interval.
+# Replicas need a cache shared by every worker (redis, memcached, database) for
+# FINANCE_REPLICA_PIN_CACHE_ALIAS and FINANCE_ANALYTICS_CACHE_ALIAS: with locmem
+# replicas are never read and sync_replica refuses to run
+DATABASE_ROUTERS = ['finance.routers.PrimaryReplicaRouter']
+FINANCE_REPLICAS = []
+FINANCE_REPLICA_PIN_SECONDS = 10
+FINANCE_REPLICA_PIN_CACHE_ALIAS = 'default'
+if os.environ.get('FINANCE_REPLICA_DB'):
+    DATABASES['replica'] = dict(DATABASES['default'], NAME=os.environ['FINANCE_REPLICA_DB'], TEST={'MIRROR': 'default'})
+    FINANCE_REPLICAS = ['replica']
+
+# delta sync (/api/sync/, see finance/sync.py)
+# caught up cursors restart this many seconds back to cover writes still being committed;
+# deletes are remembered for FINANCE_SYNC_TOMBSTONE_DAYS (`manage.py prune_sync_tombstones`)
+FINANCE_SYNC_OVERLAP_SECONDS = 5
+FINANCE_SYNC_TOMBSTONE_DAYS = 30
+
+# a BudgetAlert is written when a budget's spent counter reaches these percents of its amount
+# (see finance/budgets.py, `manage.py reconcile_budgets` corrects drifted counters)
+FINANCE_BUDGET_ALERT_THRESHOLDS = (80, 100)
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# swap the backend (e.g. redis) to share cached analytics between workers
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# cached analytic responses (see finance/caching.py)
+FINANCE_ANALYTICS_CACHE_ALIAS = 'default'
+FINANCE_ANALYTICS_CACHE_TIMEOUT = 300  # seconds
+
+# token -> user cache used by finance.authentication.CachedTokenAuthentication
+# the shared layer is skipped with a locmem alias, point it at redis or memcached to use it
+FINANCE_AUTH_CACHE_ALIAS = 'default'
+FINANCE_AUTH_CACHE_TIMEOUT = 300  # seconds
+FINANCE_AUTH_LOCAL_CACHE_SIZE = 1024  # tokens kept in each worker process
+FINANCE_AUTH_LOCAL_TIMEOUT = 5  # seconds other workers may still accept a deleted token or deactivated user
+
+# shared version keys of the in-process category and role tables (see finance/lookups.py)
+FINANCE_LOOKUP_CACHE_ALIAS = 'default'
+FINANCE_LOOKUP_LOCAL_TIMEOUT = 60  # seconds a worker trusts its tables without a shared version bump
+
+# worker processes for the forecast runway simulation, None uses every CPU and 1 runs in-process
+FINANCE_SIMULATION_WORKERS = None
+
+# queries slower than this are logged with their view by finance.metrics.RequestMetricsMiddleware, None disables
+FINANCE_SLOW_QUERY_MS = 200
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -148,14 +233,14 @@ CSRF_TRUSTED_ORIGINS = [
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'finance.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'finance.renderers.ORJSONRenderer',  # JSONRenderer output, encoded with orjson when installed
         'rest_framework.renderers.BrowsableAPIRenderer',
     ],
     'DEFAULT_PARSER_CLASSES': [
@@ -195,11 +280,16 @@ LOGGING = {
     'loggers': {
         'django': {
             'handlers': ['console'],
-            'level': 'DEBUG',
+            'level': 'INFO',
         },
         'django.request': {
             'handlers': ['console'],
             'level': 'DEBUG',
         },
+        # json lines per slow query, and per request at DEBUG (see finance/metrics.py)
+        'finance.metrics': {
+            'handlers': ['console'],
+            'level': os.environ.get('FINANCE_METRICS_LOG_LEVEL', 'INFO'),
+        },
     },
 }
\ No newline at end of file
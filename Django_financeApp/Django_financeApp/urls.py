@@ -1,8 +1,10 @@
 from django.contrib import admin
 from django.urls import path, include
+from finance.views import MetricsView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('finance.urls')),
     path('api-auth/', include('rest_framework.urls')),        #auth path
+    path('metrics/', MetricsView.as_view(), name='metrics'),   # admin only request metrics
 ]
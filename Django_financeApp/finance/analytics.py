@@ -0,0 +1,129 @@
+import uuid
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils.dateparse import parse_date
+
+from . import rollups
+from .forecasting import MAX_PROJECTION_PERIODS, PROJECTION_BUCKETS
+from .models import Budget, DailyRollup
+
+# queries and payloads of the dashboard endpoints
+# shared by the DRF views and their async variants in async_views.py so both
+# paths run the same SQL and return the same data
+
+
+# builds the transaction filter for scoped summaries from query params
+def summary_scope(params):
+    scope = Q()
+    for param, lookup in (('start_date', 'date__gte'), ('end_date', 'date__lte')):
+        if params.get(param):
+            try:
+                value = parse_date(params[param])
+            except ValueError:
+                value = None
+            if value is None:
+                raise ValueError(f'{param} must be a date in YYYY-MM-DD format.')
+            scope &= Q(**{lookup: value})
+    if params.get('user'):
+        if not params['user'].isdigit():
+            raise ValueError('user must be a user id.')
+        scope &= Q(user_id=int(params['user']))
+    if params.get('category'):
+        try:
+            scope &= Q(category_id=uuid.UUID(params['category']))
+        except ValueError:
+            raise ValueError('category must be a category id.')
+    return scope
+
+
+# daily rollup rows and aggregates behind the transaction summary
+def summary_query(scope, today):
+    last_month = today - timedelta(days=30)
+    aggregates = {
+        'income': rollups.completed_sum('income'),
+        'expenses': rollups.completed_sum('expense'),
+        'pending_income': rollups.pending_sum('income'),
+        'pending_expenses': rollups.pending_sum('expense'),
+        'monthly_expenses': rollups.completed_sum('expense', filter=Q(date__gte=last_month)),
+    }
+    return DailyRollup.objects.filter(scope), aggregates
+
+
+def summary_payload(totals):
+    avg_monthly_expense = totals['monthly_expenses']  # Since we're considering a 30-day window
+    net_amount = totals['income'] - totals['expenses']
+    burn_rate = net_amount / avg_monthly_expense if avg_monthly_expense > 0 else 1
+    return {
+        'completed': {
+            'total_income': totals['income'],
+            'total_expenses': totals['expenses'],
+            'net_amount': net_amount,
+            'burn_rate': burn_rate or 0
+        },
+        'pending': {
+            'total_income': totals['pending_income'],
+            'total_expenses': totals['pending_expenses'],
+            'net_amount': totals['pending_income'] - totals['pending_expenses']
+        }
+    }
+
+
+# budgets starting this month, their completed expenses are the running
+# Budget.spent counter (budgets.py) and category names come from the lookup
+# table (lookups.py), so the report reads budget rows only
+def progress_queryset(today):
+    start_of_month = today.replace(day=1)
+    start_of_nextMonth = (start_of_month.replace(day=28) + timedelta(days=4)).replace(day=1)  # First day of next month
+
+    return Budget.objects.filter(start_date__gte=start_of_month, start_date__lt=start_of_nextMonth)
+
+
+# returns percentage of budget used from amount planned
+# `categories` is a lookups.categories() table
+def progress_payload(budgets, categories):
+    budget_progress = []
+
+    for budget in budgets:
+        total_spent = budget.spent
+
+        budget_progress.append({
+            'budget_id': budget.id,
+            'category': categories.get(budget.category_id).name,
+            'budget_amount': budget.amount,
+            'amount_spent': total_spent,
+            'amount_remaining': budget.amount - total_spent,
+            'percentage_used': (total_spent / budget.amount) * 100 if budget.amount > 0 else 0
+        })
+
+    return budget_progress
+
+
+# ?periods= and ?bucket= of the projection endpoints
+def projection_params(params):
+    bucket = params.get('bucket', 'week')
+    if bucket not in PROJECTION_BUCKETS:
+        raise ValueError(f"Invalid bucket. Choose one of: {', '.join(PROJECTION_BUCKETS)}.")
+    try:
+        periods = int(params.get('periods', 13))
+    except ValueError:
+        periods = 0
+    if not 1 <= periods <= MAX_PROJECTION_PERIODS:
+        raise ValueError(f'periods must be between 1 and {MAX_PROJECTION_PERIODS}.')
+    return periods, bucket
+
+
+# summary13week rows from forecasting.cash_projection periods
+def projection_payload(projection):
+    return [
+        {
+            'week': period_num + 1,
+            'opening_balance': float(period['opening_balance']),
+            'cash_in': float(period['cash_in']),
+            'cash_out': float(period['cash_out']),
+            'closing_balance': float(period['closing_balance']),
+            'week_start': period['start_date'],
+            'week_end': period['end_date'],
+        }
+        for period_num, period in enumerate(projection)
+    ]
@@ -0,0 +1,98 @@
+import functools
+from datetime import date
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import analytics, forecasting, lookups
+
+# async versions of the dashboard endpoints for ASGI deployments
+# they build the same queries as the DRF views (see analytics.py) and await them
+# through django's async ORM, so a slow request does not hold a worker thread.
+# On every backend Django 5.1 runs async ORM calls through the one
+# thread-sensitive sync_to_async executor, so the queries of a request run one
+# after another; gathering them would not overlap any database work, and each is
+# awaited in turn.
+
+
+def json_response(data, status=status.HTTP_200_OK):
+    # DRF's encoder keeps the payload identical to the JSONRenderer output
+    return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False)
+
+
+def authenticate(request):
+    authenticators = [authenticator() for authenticator in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+    return Request(request, authenticators=authenticators).user
+
+
+# GET only, runs the DRF authentication classes and sets request.user
+# views with login_required answer anonymous requests with 401
+def async_api_view(login_required=False):
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return json_response({'detail': f'Method "{request.method}" not allowed.'}, status.HTTP_405_METHOD_NOT_ALLOWED)
+            try:
+                request.user = await sync_to_async(authenticate)(request)
+            except APIException as e:
+                return json_response({'detail': e.detail}, e.status_code)
+            if login_required and not request.user.is_authenticated:
+                return json_response({'detail': 'Authentication credentials were not provided.'}, status.HTTP_401_UNAUTHORIZED)
+            try:
+                return await view(request, *args, **kwargs)
+            except ValueError as e:
+                return json_response({'error': str(e)}, status.HTTP_400_BAD_REQUEST)
+        return wrapper
+    return decorator
+
+
+async def fetch_summary(params):
+    rows, aggregates = analytics.summary_query(analytics.summary_scope(params), timezone.now().date())
+    return analytics.summary_payload(await rows.aaggregate(**aggregates))
+
+
+async def fetch_progress():
+    budgets = [budget async for budget in analytics.progress_queryset(date.today())]
+    # the lookup table may load or fall back to the database
+    return await sync_to_async(lambda: analytics.progress_payload(budgets, lookups.categories()))()
+
+
+async def fetch_projection(user, params):
+    periods, bucket = analytics.projection_params(params)
+    windows = forecasting.projection_windows(timezone.now().date(), periods, bucket)
+    baseline, aggregates, pending = forecasting.cash_projection_queries(user, windows[0][0], windows)
+
+    totals = await baseline.aaggregate(**aggregates)
+    rows = [row async for row in pending]
+    return analytics.projection_payload(forecasting.fold_cash_projection(totals, rows, windows))
+
+
+@async_api_view()
+async def transaction_summary(request):
+    return json_response(await fetch_summary(request.GET))
+
+
+@async_api_view()
+async def budget_progress(request):
+    return json_response(await fetch_progress())
+
+
+@async_api_view(login_required=True)
+async def summary13week(request):
+    return json_response(await fetch_projection(request.user, request.GET))
+
+
+# everything the dashboard page loads, in one request
+@async_api_view(login_required=True)
+async def dashboard(request):
+    summary = await fetch_summary(request.GET)
+    progress = await fetch_progress()
+    projection = await fetch_projection(request.user, request.GET)
+    return json_response({'summary': summary, 'progress': progress, 'summary13week': projection})
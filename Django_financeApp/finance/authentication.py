@@ -0,0 +1,117 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from . import caching
+
+# token authentication without a database query per request
+# token -> user is cached in two layers. A bounded in-process LRU answers
+# without any lookup for FINANCE_AUTH_LOCAL_TIMEOUT seconds, then the shared
+# django cache is asked, then the token table. Deleting a token or changing its
+# user (see signals.py) drops it from the shared cache and from the local LRU of
+# the worker that made the change; other workers keep accepting it for at most
+# FINANCE_AUTH_LOCAL_TIMEOUT seconds.
+# The shared layer needs a cache every worker sees (redis, memcached, database,
+# file). A locmem alias could hold a token for FINANCE_AUTH_CACHE_TIMEOUT in the
+# other workers, so it is skipped and only the local layer is used.
+# Each request gets its own copy of the cached user and token.
+
+
+# the shared token cache, None when the alias is process-local
+def get_cache():
+    cache = caches[getattr(settings, 'FINANCE_AUTH_CACHE_ALIAS', 'default')]
+    return cache if caching.is_shared(cache) else None
+
+
+def get_timeout():
+    return getattr(settings, 'FINANCE_AUTH_CACHE_TIMEOUT', 300)
+
+
+def local_timeout():
+    return getattr(settings, 'FINANCE_AUTH_LOCAL_TIMEOUT', 5)
+
+
+def entry_key(key):
+    return f'finance:auth:token:{key}'
+
+
+class TokenLRU:
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry['expires'] <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def pop(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local_tokens = TokenLRU(getattr(settings, 'FINANCE_AUTH_LOCAL_CACHE_SIZE', 1024))
+
+
+# drops a token from both layers, called when the token or its user changes
+def invalidate(*keys):
+    for key in keys:
+        local_tokens.pop(key)
+    cache = get_cache()
+    if cache is not None:
+        cache.delete_many([entry_key(key) for key in keys])
+
+
+# a user and token no other request holds
+def request_copy(token):
+    token = copy.copy(token)
+    token.user = copy.copy(token.user)
+    return token.user, token
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        entry = local_tokens.get(key)
+        if entry is not None:
+            return request_copy(entry['token'])
+
+        cache = get_cache()
+        token = cache.get(entry_key(key)) if cache is not None else None
+        if token is None:
+            model = self.get_model()
+            try:
+                token = model.objects.select_related('user').get(key=key)
+            except model.DoesNotExist:
+                raise AuthenticationFailed('Invalid token.')
+            if cache is not None:
+                cache.set(entry_key(key), token, get_timeout())
+
+        if not token.user.is_active:
+            raise AuthenticationFailed('User inactive or deleted.')
+
+        local_tokens.set(key, {'token': token, 'expires': time.monotonic() + local_timeout()})
+        return request_copy(token)
@@ -0,0 +1,48 @@
+import logging
+import statistics
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+
+# shared setup of the benchmark_* management commands
+# they drive the API in-process through django's test clients, as a real user
+# with a token, and without the response caches unless asked to keep them
+
+DUMMY_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+
+def percentile(values, percent):
+    return statistics.quantiles(values, n=100)[percent - 1] if len(values) > 1 else values[0]
+
+
+# the named user, otherwise the first staff user when `staff_first`, then the first user; None without users
+def get_user(username=None, staff_first=False):
+    if username:
+        return User.objects.filter(username=username).first()
+    users = User.objects.order_by('pk')
+    return (users.filter(is_staff=True).first() if staff_first else None) or users.first()
+
+
+def auth_headers(user):
+    return {'Authorization': f'Token {Token.objects.get_or_create(user=user)[0].key}'}
+
+
+# settings for a run: the test clients send requests for 'testserver', caches are
+# disabled unless `with_cache` and finance.metrics only logs at `metrics_level`
+# and above, the per request and slow query lines would flood the console
+@contextmanager
+def benchmark_settings(with_cache=False, metrics_level=logging.WARNING):
+    overrides = {'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver']}
+    if not with_cache:
+        overrides['CACHES'] = DUMMY_CACHES
+    metrics_logger = logging.getLogger('finance.metrics')
+    level = metrics_logger.level
+    metrics_logger.setLevel(metrics_level)
+    try:
+        with override_settings(**overrides):
+            yield
+    finally:
+        metrics_logger.setLevel(level)
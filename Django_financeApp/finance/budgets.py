@@ -0,0 +1,133 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import F, Q, Sum, Value
+from django.db.models.functions import Coalesce, Now
+
+from .models import Budget, BudgetAlert, Transaction
+
+# running Budget.spent counters
+# a budget's spent amount is the sum of its user's completed expenses in its
+# category between start_date and end_date. It follows the same deltas as the
+# daily rollup (rollups.apply_deltas), so every single-row transaction write and
+# every bulk import moves it with F() increments and reading a budget's status
+# needs no scan. Writes that skip both (raw deletes, queryset updates) are
+# corrected by `manage.py reconcile_budgets`.
+# Each time spent moves from below to at or above one of
+# FINANCE_BUDGET_ALERT_THRESHOLDS percent of the amount, a BudgetAlert is written.
+
+SPENT_FIELD = 'expense_completed'  # the rollup delta budgets count
+
+
+def thresholds():
+    return getattr(settings, 'FINANCE_BUDGET_ALERT_THRESHOLDS', (80, 100))
+
+
+# thresholds reached by `spent` out of `amount`
+def reached(amount, spent):
+    amount, spent = Decimal(str(amount)), Decimal(str(spent))  # unsaved budgets may hold ints, floats or strings
+    if amount <= 0:
+        return set()
+    return {threshold for threshold in thresholds() if spent * 100 >= threshold * amount}
+
+
+# one alert per threshold newly reached, rows are (budget_id, amount, spent, previous amount, previous spent)
+def write_alerts(rows):
+    BudgetAlert.objects.bulk_create([
+        BudgetAlert(budget_id=budget_id, threshold=threshold, spent=spent, amount=amount)
+        for budget_id, amount, spent, previous_amount, previous_spent in rows
+        for threshold in sorted(reached(amount, spent) - reached(previous_amount, previous_spent))
+    ])
+
+
+# applies rollup deltas {(user_id, category_id, date): {field: amount}} to the budgets they fall in
+def apply_deltas(deltas):
+    days = defaultdict(list)
+    for (user_id, category_id, day), fields in deltas.items():
+        amount = fields.get(SPENT_FIELD)
+        if amount and user_id is not None:
+            days[(user_id, category_id)].append((day, amount))
+    if not days:
+        return
+
+    first = min(day for changes in days.values() for day, _ in changes)
+    last = max(day for changes in days.values() for day, _ in changes)
+    pairs = Q()
+    for user_id, category_id in days:
+        pairs |= Q(user_id=user_id, category_id=category_id)
+    candidates = Budget.objects.filter(pairs, start_date__lte=last, end_date__gte=first).values_list(
+        'id', 'user_id', 'category_id', 'start_date', 'end_date'
+    )
+
+    increments = {}
+    for budget_id, user_id, category_id, start, end in candidates:
+        change = sum((amount for day, amount in days[(user_id, category_id)] if start <= day <= end), Decimal(0))
+        if change:
+            increments[budget_id] = change
+    if not increments:
+        return
+
+    # the updates lock the rows until the read back commits, so spent - increment is
+    # the value before this write and concurrent writers cannot alert twice.
+    # updated_at moves too, /sync/ pages budgets by it
+    with transaction.atomic():
+        for budget_id, change in increments.items():
+            Budget.objects.filter(pk=budget_id).update(spent=F('spent') + change, updated_at=Now())
+        write_alerts([
+            (budget_id, amount, spent, amount, spent - increments[budget_id])
+            for budget_id, amount, spent in Budget.objects.filter(pk__in=increments).values_list('id', 'amount', 'spent')
+        ])
+
+
+def matching_expenses(**filters):
+    return Transaction.objects.filter(type='expense', completed=True, **filters)
+
+
+# sets spent on a budget about to be saved, whose user, category or window may have changed
+def refresh(budget):
+    if budget.user_id is None:
+        budget.spent = Decimal(0)
+        return
+    budget.spent = matching_expenses(
+        user_id=budget.user_id,
+        category_id=budget.category_id,
+        date__gte=budget.start_date,
+        date__lte=budget.end_date,
+    ).aggregate(total=Coalesce(Sum('amount'), Value(0, output_field=models.DecimalField())))['total']
+
+
+# recomputes spent from the transaction table where it drifted, optionally for some users only
+# expenses are grouped per user, category and day in one query and summed per budget
+# here; a correlated subquery per budget is far slower on sqlite. Corrections are
+# applied as increments so writes landing meanwhile are kept.
+# returns the corrected budgets as (id, stored, expected)
+def reconcile(user_ids=None, dry_run=False):
+    budgets = Budget.objects.all()
+    if user_ids is not None:
+        budgets = budgets.filter(user_id__in=user_ids)
+
+    with transaction.atomic():
+        rows = list(budgets.values_list('id', 'user_id', 'category_id', 'start_date', 'end_date', 'amount', 'spent'))
+        if not rows:
+            return []
+        expenses = matching_expenses(
+            user_id__in={row[1] for row in rows},
+            date__gte=min(row[3] for row in rows),
+            date__lte=max(row[4] for row in rows),
+        ).order_by().values_list('user_id', 'category_id', 'date').annotate(total=Sum('amount'))
+        days = defaultdict(list)
+        for user_id, category_id, day, total in expenses:
+            days[(user_id, category_id)].append((day, total))
+
+        drifted = []
+        for budget_id, user_id, category_id, start, end, amount, spent in rows:
+            expected = sum((total for day, total in days[(user_id, category_id)] if start <= day <= end), Decimal(0))
+            if expected != spent:
+                drifted.append((budget_id, amount, spent, expected))
+        if drifted and not dry_run:
+            for budget_id, _, spent, expected in drifted:
+                Budget.objects.filter(pk=budget_id).update(spent=F('spent') + (expected - spent), updated_at=Now())
+            write_alerts([(budget_id, amount, expected, amount, spent) for budget_id, amount, spent, expected in drifted])
+    return [(budget_id, spent, expected) for budget_id, _, spent, expected in drifted]
@@ -0,0 +1,110 @@
+import functools
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+# response cache for the analytic endpoints
+# entries are keyed by endpoint, user, query params and a version token. Writes
+# replace the version token (see signals.py) so stale entries are never read again
+# and simply expire. The token is the time of the last write, which doubles as
+# the Last-Modified header.
+
+USER_SCOPE = 'user'      # result only depends on the requesting user's data
+GLOBAL_SCOPE = 'global'  # result can include every user's data
+
+
+def get_cache():
+    return caches[getattr(settings, 'FINANCE_ANALYTICS_CACHE_ALIAS', 'default')]
+
+
+def get_timeout():
+    return getattr(settings, 'FINANCE_ANALYTICS_CACHE_TIMEOUT', 300)
+
+
+# whether every worker process sees the same entries, locmem keeps one cache per process
+def is_shared(cache):
+    return not isinstance(cache, LocMemCache)
+
+
+def version_key(scope, user_id=None):
+    return f'finance:analytics:version:{scope}:{user_id}' if scope == USER_SCOPE else f'finance:analytics:version:{scope}'
+
+
+# current version token, created on first use, in the analytics cache unless another is given
+def get_version(key, cache=None):
+    if cache is None:
+        cache = get_cache()
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(key, version, None):
+            version = cache.get(key) or version
+    return version
+
+
+# bumped by sync_replica after each copy. With read replicas an entry computed
+# from a replica that had not caught up would otherwise outlive the copy
+REPLICA_EPOCH_KEY = 'finance:analytics:replica_epoch'
+
+
+def replica_epoch():
+    if not getattr(settings, 'FINANCE_REPLICAS', []):
+        return 0
+    return get_version(REPLICA_EPOCH_KEY)
+
+
+def bump_replica_epoch():
+    get_cache().set(REPLICA_EPOCH_KEY, time.time_ns(), None)
+
+
+# called on every write that can change an analytic result
+def invalidate(*user_ids):
+    now = time.time_ns()
+    keys = [version_key(GLOBAL_SCOPE)] + [version_key(USER_SCOPE, user_id) for user_id in set(user_ids) if user_id]
+    get_cache().set_many({key: now for key in keys}, None)
+
+
+def make_etag(data):
+    payload = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True).encode()
+    return '"%s"' % hashlib.md5(payload, usedforsecurity=False).hexdigest()
+
+
+# caches a GET action's response.data per user and query params and answers
+# conditional requests (If-None-Match / If-Modified-Since) with 304
+def cached_analytics(scope):
+    def decorator(view_method):
+        @functools.wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            user_id = request.user.pk or 'anonymous'
+            version = get_version(version_key(scope, user_id))
+            params = hashlib.md5(request.query_params.urlencode().encode(), usedforsecurity=False).hexdigest()
+            key = f'finance:analytics:{self.basename}:{view_method.__name__}:{user_id}:{version}:{replica_epoch()}:{params}'
+
+            cache = get_cache()
+            entry = cache.get(key)
+            if entry is None:
+                response = view_method(self, request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                entry = {'data': response.data, 'etag': make_etag(response.data)}
+                cache.set(key, entry, get_timeout())
+
+            last_modified = version // 1_000_000_000
+            not_modified = get_conditional_response(request, etag=entry['etag'], last_modified=last_modified)
+            if not_modified is not None:
+                return not_modified
+
+            response = Response(entry['data'])
+            response['ETag'] = entry['etag']
+            response['Last-Modified'] = http_date(last_modified)
+            return response
+        return wrapper
+    return decorator
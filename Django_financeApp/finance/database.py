@@ -0,0 +1,23 @@
+from django.conf import settings
+
+# sqlite connection tuning
+# FINANCE_SQLITE_PRAGMAS is applied to every new connection from the
+# connection_created signal (see signals.py). The pragmas are run on the raw
+# sqlite3 connection so they are not counted as request queries.
+
+
+def configure_connection(connection):
+    pragmas = getattr(settings, 'FINANCE_SQLITE_PRAGMAS', {})
+    if connection.vendor != 'sqlite' or not pragmas:
+        return
+    for name, value in pragmas.items():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
+
+
+# current value of each configured pragma, for checks and the benchmark output
+def current_pragmas(connection):
+    connection.ensure_connection()
+    return {
+        name: connection.connection.execute(f'PRAGMA {name}').fetchone()[0]
+        for name in getattr(settings, 'FINANCE_SQLITE_PRAGMAS', {})
+    }
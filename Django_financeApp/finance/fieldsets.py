@@ -0,0 +1,162 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import filters, serializers
+
+# sparse fieldsets for list and detail reads
+# ?fields=date,amount,category.name keeps only the named fields, a dotted name
+# picks fields of a nested relation. ?expand=category keeps a relation nested.
+# With either parameter, nested relations that are neither expanded nor picked
+# with a dotted name are sent as their primary key; without them responses are
+# unchanged. The selection is pushed into the queryset, so only the columns
+# sent are loaded and only the relations sent nested are joined.
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+READ_ACTIONS = ('list', 'retrieve')
+
+
+def split(value):
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+# 'a,b.c,b.d' -> {'a': None, 'b': {'c': None, 'd': None}}, None means every field
+def field_tree(names):
+    tree = {}
+    for name in names:
+        node = tree
+        *parents, leaf = name.split('.')
+        for parent in parents:
+            if node.get(parent) is None:
+                node[parent] = {}
+            node = node[parent]
+        node.setdefault(leaf, None)
+    return tree
+
+
+class Selection:
+    def __init__(self, fields=None, expand=(), active=False):
+        self.fields = fields  # field tree, or None for every field
+        self.expand = set(expand)
+        self.active = active  # relations are collapsed to their key unless expanded
+
+    @classmethod
+    def from_request(cls, request):
+        params = request.query_params
+        if FIELDS_PARAM not in params and EXPAND_PARAM not in params:
+            return cls()
+        fields = field_tree(split(params[FIELDS_PARAM])) if FIELDS_PARAM in params else None
+        return cls(fields, split(params.get(EXPAND_PARAM, '')), active=True)
+
+    # declared names that are kept, in declared order
+    def names(self, declared):
+        if self.fields is None:
+            return list(declared)
+        unknown = [name for name in self.fields if name not in declared]
+        if unknown:
+            raise serializers.ValidationError({'error': f'Unknown fields: {", ".join(unknown)}.'})
+        return [name for name in declared if name in self.fields]
+
+    # selection inside a kept relation, or None when it is sent as its key
+    def relation(self, name):
+        subtree = self.fields.get(name) if self.fields is not None else None
+        if self.active and subtree is None and name not in self.expand:
+            return None
+        return Selection(subtree, active=self.active)
+
+
+def target(serializer):
+    return serializer.child if isinstance(serializer, serializers.ListSerializer) else serializer
+
+
+# drops unselected fields from a (nested) model serializer, collapsed relations
+# become read only primary key fields
+def trim(serializer, selection):
+    fields = serializer.fields
+    keep = selection.names(fields)
+    for name in list(fields):
+        if name not in keep:
+            del fields[name]
+    for name in keep:
+        field = fields[name]
+        if not isinstance(field, serializers.BaseSerializer):
+            continue
+        nested = selection.relation(name)
+        if nested is None:
+            source = {} if field.source == name else {'source': field.source}
+            fields[name] = serializers.PrimaryKeyRelatedField(read_only=True, **source)
+        else:
+            trim(target(field), nested)
+
+
+def apply(serializer, selection):
+    serializer = target(serializer)
+    if hasattr(serializer, 'select'):
+        serializer.select(selection)
+    elif selection.active:
+        trim(serializer, selection)
+
+
+# only() columns and select_related() relations a trimmed model serializer reads,
+# or None when a field is not a plain model field (method fields, dotted sources)
+def model_columns(serializer, prefix=''):
+    model = serializer.Meta.model
+    columns, related = [], []
+    for name, field in serializer.fields.items():
+        try:
+            model_field = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            return None
+        if not model_field.concrete or model_field.many_to_many:
+            return None
+        if getattr(field, 'lookup_table', None) is not None:
+            columns.append(prefix + field.source)  # only the key, the row comes from the lookup table
+        elif isinstance(field, serializers.BaseSerializer):
+            nested = model_columns(field, f'{prefix}{field.source}__')
+            if nested is None:
+                return None
+            related += [prefix + field.source, *nested[1]]
+            columns += nested[0]
+        else:
+            columns.append(prefix + field.source)
+    return columns, related
+
+
+# narrows the queryset to what the serializer sends plus `keep` (fields read by pagination)
+def restrict(queryset, serializer, selection, keep=()):
+    serializer = target(serializer)
+    if hasattr(serializer, 'lookups'):
+        return queryset.values(*dict.fromkeys([*serializer.lookups(), *keep]))
+    if not selection.active:
+        return queryset
+    plan = model_columns(serializer)
+    if plan is None:
+        return queryset
+    columns, related = plan
+    queryset = queryset.select_related(None)
+    if related:  # select_related() without names would follow every relation
+        queryset = queryset.select_related(*related)
+    return queryset.only(*columns, *keep)
+
+
+# viewset mixin applying ?fields= and ?expand= to list and retrieve
+class SparseFieldsMixin:
+    def get_selection(self):
+        if self.action not in READ_ACTIONS:
+            return Selection()
+        return Selection.from_request(self.request)
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        if self.action in READ_ACTIONS:
+            apply(serializer, self.get_selection())
+        return serializer
+
+    def filter_queryset(self, queryset):
+        if self.action in READ_ACTIONS:
+            queryset = restrict(queryset, self.get_serializer(), self.get_selection(), self.pagination_keys(queryset))
+        return super().filter_queryset(queryset)
+
+    # the primary key and the ordering field, read by keyset pagination cursors
+    def pagination_keys(self, queryset):
+        ordering = filters.OrderingFilter().get_ordering(self.request, queryset, self) or []
+        names = [queryset.model._meta.pk.name, *(field.lstrip('-') for field in ordering)]
+        return [name for name in names if '__' not in name]
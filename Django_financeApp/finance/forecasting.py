@@ -0,0 +1,226 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.db.models import F, Q, Sum
+
+from . import rollups, simulation
+from .models import DailyRollup
+
+# cash forecasting on a user's daily net cash series
+# the history is loaded with one query into numpy arrays and every model is fitted
+# and projected with array operations, so cost does not grow with the number of periods
+
+PROJECTION_BUCKETS = ('day', 'week', 'month')
+MAX_PROJECTION_PERIODS = 366
+
+MODELS = ('moving_average', 'exponential_smoothing', 'weekday', 'seasonal')
+MOVING_AVERAGE_WINDOW = 30    # days
+SMOOTHING_ALPHA = 0.1
+RUNWAY_HISTORY_DAYS = 365     # daily flows the runway simulation resamples from
+
+
+def add_months(day, months):
+    # same day of month, clamped to the last day of shorter months
+    month_index = day.month - 1 + months
+    year, month = day.year + month_index // 12, month_index % 12 + 1
+    last_day = (date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)).day
+    return day.replace(year=year, month=month, day=min(day.day, last_day))
+
+
+# consecutive (start, end) date windows covering the projection horizon
+def projection_windows(start, periods, bucket):
+    windows = []
+    for period_num in range(periods):
+        if bucket == 'day':
+            period_start = start + timedelta(days=period_num)
+            period_end = period_start
+        elif bucket == 'week':
+            period_start = start + timedelta(weeks=period_num)
+            period_end = period_start + timedelta(days=6)
+        else:
+            period_start = add_months(start, period_num)
+            period_end = add_months(start, period_num + 1) - timedelta(days=1)
+        windows.append((period_start, period_end))
+    return windows
+
+
+# opening/cash in/cash out/closing per period: pending transactions plus the
+# average daily expense of the last 30 days, starting from today's completed balance
+# values are Decimals keyed like the Forecast model fields
+def cash_projection(user, current_date, periods, bucket):
+    windows = projection_windows(current_date, periods, bucket)
+    baseline, aggregates, pending = cash_projection_queries(user, current_date, windows)
+    return fold_cash_projection(baseline.aggregate(**aggregates), pending, windows)
+
+
+# the two independent queries behind cash_projection: the balance baseline
+# (rows and aggregates) and pending transactions grouped by day
+def cash_projection_queries(user, current_date, windows):
+    # Calculate initial closing balance and the last 30 days of expenses in one pass over the rollup
+    thirty_days_ago = current_date - timedelta(days=30)
+    aggregates = {
+        'income': rollups.completed_sum('income', filter=Q(date__lte=current_date)),
+        'expense': rollups.completed_sum('expense', filter=Q(date__lte=current_date)),
+        'recent_expense': rollups.completed_sum('expense', filter=Q(date__gte=thirty_days_ago)),
+    }
+
+    # Get pending transactions for the whole horizon grouped by day
+    pending = DailyRollup.objects.filter(
+        user=user,
+        date__range=[windows[0][0], windows[-1][1]]
+    ).order_by().values('date').annotate(
+        cash_in=rollups.pending_sum('income'),
+        cash_out_pending=rollups.pending_sum('expense')
+    )
+    return DailyRollup.objects.filter(user=user), aggregates, pending
+
+
+def fold_cash_projection(baseline, pending, windows):
+    initial_closing = baseline['income'] - baseline['expense']
+    daily_avg_expense = baseline['recent_expense'] / 30
+    daily = {row['date']: row for row in pending}
+
+    projection = []
+    current_closing_balance = initial_closing
+
+    for period_start, period_end in windows:
+        days = [period_start + timedelta(days=offset) for offset in range((period_end - period_start).days + 1)]
+        rows = [daily[day] for day in days if day in daily]
+
+        cash_in = sum((row['cash_in'] for row in rows), Decimal(0))
+        cash_out = sum((row['cash_out_pending'] for row in rows), Decimal(0)) + daily_avg_expense * len(days)
+        opening = current_closing_balance
+        closing = opening + cash_in - cash_out
+
+        projection.append({
+            'opening_balance': opening,
+            'cash_in': cash_in,
+            'cash_out': cash_out,
+            'closing_balance': closing,
+            'start_date': period_start,
+            'end_date': period_end,
+        })
+
+        current_closing_balance = closing
+
+    return projection
+
+
+# (ordinal days, net cash per day) of completed transactions up to end_date, gaps filled with 0
+def load_daily_series(user, end_date):
+    rows = DailyRollup.objects.filter(user=user, date__lte=end_date).order_by().values('date').annotate(
+        net=Sum(F('income_completed') - F('expense_completed'))
+    ).values_list('date', 'net')
+    rows = list(rows)
+    if not rows:
+        return np.array([end_date.toordinal()]), np.zeros(1)
+
+    ordinals = np.fromiter((day.toordinal() for day, _ in rows), dtype=np.int64, count=len(rows))
+    amounts = np.fromiter((float(net) for _, net in rows), dtype=np.float64, count=len(rows))
+    first = ordinals.min()
+    days = np.arange(first, end_date.toordinal() + 1)
+    series = np.zeros(days.size)
+    np.add.at(series, ordinals - first, amounts)
+    return days, series
+
+
+def weekdays(ordinals):
+    # date.fromordinal(1) is a Monday, matches date.weekday()
+    return (ordinals - 1) % 7
+
+
+def months(ordinals):
+    # month of year, 0-11
+    datetimes = (ordinals - date(1970, 1, 1).toordinal()).astype('datetime64[D]')
+    return datetimes.astype('datetime64[M]').astype(np.int64) % 12
+
+
+# mean of each group's values, 0 for groups with no observations
+def group_means(groups, values, size):
+    totals = np.bincount(groups, weights=values, minlength=size)
+    counts = np.bincount(groups, minlength=size)
+    return np.divide(totals, counts, out=np.zeros(size), where=counts > 0)
+
+
+# daily net cash projected by each model for the future ordinals
+def fit_models(days, series, future):
+    window = series[-MOVING_AVERAGE_WINDOW:]
+    moving_average = window.mean()
+
+    # simple exponential smoothing level as a weighted sum of the history
+    weights = SMOOTHING_ALPHA * (1 - SMOOTHING_ALPHA) ** np.arange(series.size)[::-1]
+    weights[0] = (1 - SMOOTHING_ALPHA) ** (series.size - 1)
+    smoothed = weights @ series
+
+    mean = series.mean()
+    weekday_profile = group_means(weekdays(days), series, 7)
+    weekday_effect = weekday_profile - mean
+    month_effect = group_means(months(days), series, 12) - mean
+    observed_months = np.bincount(months(days), minlength=12) > 0
+    month_effect[~observed_months] = 0
+
+    future_weekdays = weekdays(future)
+    return {
+        'moving_average': np.full(future.size, moving_average),
+        'exponential_smoothing': np.full(future.size, smoothed),
+        'weekday': weekday_profile[future_weekdays],
+        'seasonal': mean + weekday_effect[future_weekdays] + month_effect[months(future)],
+    }
+
+
+# per period opening/net/closing balances for the requested models
+def forecast(user, start_date, periods, bucket, models=MODELS):
+    days, series = load_daily_series(user, start_date - timedelta(days=1))
+    opening_balance = series.sum()
+
+    windows = projection_windows(start_date, periods, bucket)
+    future = np.arange(start_date.toordinal(), windows[-1][1].toordinal() + 1)
+    starts = np.array([period_start.toordinal() for period_start, _ in windows]) - start_date.toordinal()
+
+    results = {}
+    fitted = fit_models(days, series, future)
+    for name in models:
+        daily = fitted[name]
+        net = np.add.reduceat(daily, starts)
+        closing = opening_balance + np.cumsum(net)
+        opening = np.concatenate(([opening_balance], closing[:-1]))
+        results[name] = [
+            {
+                'period': index + 1,
+                'period_start': period_start,
+                'period_end': period_end,
+                'opening_balance': round(float(opening[index]), 2),
+                'net_cash': round(float(net[index]), 2),
+                'closing_balance': round(float(closing[index]), 2),
+            }
+            for index, (period_start, period_end) in enumerate(windows)
+        ]
+    return results
+
+
+# bootstrap cash runway: week closing balance bands and probability of going negative
+def runway(user, start_date, weeks, paths, seed=None):
+    days, series = load_daily_series(user, start_date - timedelta(days=1))
+    opening_balance = series.sum()
+    bands = simulation.simulate(
+        series[-RUNWAY_HISTORY_DAYS:], opening_balance, weeks, paths,
+        workers=getattr(settings, 'FINANCE_SIMULATION_WORKERS', None), seed=seed
+    )
+    return {
+        'opening_balance': round(float(opening_balance), 2),
+        'paths': paths,
+        'weeks': [
+            {
+                'week': index + 1,
+                'week_start': week_start,
+                'week_end': week_end,
+                'p10': round(float(bands['p10'][index]), 2),
+                'p50': round(float(bands['p50'][index]), 2),
+                'p90': round(float(bands['p90'][index]), 2),
+                'probability_negative': round(float(bands['probability_negative'][index]), 4),
+            }
+            for index, (week_start, week_end) in enumerate(projection_windows(start_date, weeks, 'week'))
+        ],
+    }
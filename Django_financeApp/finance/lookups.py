@@ -0,0 +1,109 @@
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Q
+
+from . import caching
+from .models import Category, Role
+
+# in-process lookup tables for categories and roles
+# both tables are small and rarely change, yet most requests read them: nested
+# serialization, write validation, imports and the budget report. Each worker
+# keeps every row in memory together with the shared version it was loaded at.
+# Saves and deletes replace the shared version (see signals.py), so every worker
+# reloads the table on its next read. Callers take one snapshot per request or
+# list and use it for every row, which costs a single cache read.
+# Tables are also reloaded after FINANCE_LOOKUP_LOCAL_TIMEOUT seconds, so workers
+# whose cache is not shared with the writer (locmem) catch up on their own.
+# Rows are always read from the primary: a replica that has not caught up would
+# otherwise be cached under the new version.
+
+
+def get_cache():
+    return caches[getattr(settings, 'FINANCE_LOOKUP_CACHE_ALIAS', 'default')]
+
+
+def local_timeout():
+    return getattr(settings, 'FINANCE_LOOKUP_LOCAL_TIMEOUT', 60)
+
+
+def version_key(model):
+    return f'finance:lookups:version:{model._meta.label_lower}'
+
+
+def get_version(model):
+    return caching.get_version(version_key(model), get_cache())
+
+
+# rows by primary key and by name, treat the rows as read only
+# misses fall back to the database, for rows written after the snapshot was taken
+class LookupTable:
+    def __init__(self, model, version, rows):
+        self.model = model
+        self.version = version
+        self.expires = time.monotonic() + local_timeout()
+        self.by_id = {row.pk: row for row in rows}
+        self.by_name = {row.name: row for row in rows}
+
+    def get(self, pk):
+        row = self.by_id.get(pk)
+        if row is None:
+            row = self.rows().filter(pk=pk).first()
+        return row
+
+    # a name or the string form of a primary key, None when neither matches
+    def resolve(self, reference):
+        row = self.by_name.get(reference)
+        if row is not None:
+            return row
+        try:
+            pk = uuid.UUID(str(reference))
+        except ValueError:
+            return self.rows().filter(name=reference).first()
+        return self.by_id.get(pk) or self.rows().filter(Q(pk=pk) | Q(name=reference)).first()
+
+    def rows(self):
+        return self.model.objects.using(DEFAULT_DB_ALIAS)
+
+    def current(self, version):
+        return self.version == version and time.monotonic() < self.expires
+
+
+local_tables = {}
+lock = threading.Lock()
+
+
+def table(model):
+    version = get_version(model)
+    current = local_tables.get(model)
+    if current is not None and current.current(version):
+        return current
+    with lock:
+        current = local_tables.get(model)
+        if current is None or not current.current(version):
+            current = local_tables[model] = LookupTable(model, version, list(model.objects.using(DEFAULT_DB_ALIAS)))
+        return current
+
+
+def categories():
+    return table(Category)
+
+
+def roles():
+    return table(Role)
+
+
+# called on every category or role write; repeated on commit so a worker that
+# reloaded while the write was still open does not keep the old rows
+def invalidate(model):
+    bump(model)
+    transaction.on_commit(lambda: bump(model))
+
+
+def bump(model):
+    local_tables.pop(model, None)
+    get_cache().set(version_key(model), time.time_ns(), None)
@@ -0,0 +1,87 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import AsyncClient, Client
+
+from finance.benchmarking import auth_headers, benchmark_settings, get_user, percentile
+
+# one dashboard load on each stack
+WSGI_URLS = ['/api/transactions/summary/', '/api/budgets/progress/', '/api/forecasts/summary13week/']
+ASGI_URLS = ['/api/async/transactions/summary/', '/api/async/budgets/progress/', '/api/async/forecasts/summary13week/']
+
+
+# compares dashboard throughput of the sync DRF views driven through the WSGI
+# handler by a thread per client with the async views driven through the ASGI
+# handler by one coroutine per client, both in-process against the configured database
+class Command(BaseCommand):
+    help = 'Benchmark WSGI vs ASGI dashboard throughput with concurrent clients.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='username to run the dashboard as (defaults to the first user)')
+        parser.add_argument('--clients', type=int, default=200)
+        parser.add_argument('--loads', type=int, default=5, help='dashboard loads per client')
+        parser.add_argument('--with-cache', action='store_true', help='keep the response and token caches enabled')
+
+    def handle(self, *args, **options):
+        user = get_user(options['user'])
+        if user is None:
+            raise CommandError('No user to benchmark with. Create one or pass --user.')
+
+        # the async views are not cached, caching stays off by default so both stacks do the same work
+        with benchmark_settings(with_cache=options['with_cache']):
+            results = self.run_both(auth_headers(user), options)
+
+        for name, (elapsed, latencies) in results.items():
+            requests = len(latencies)
+            self.stdout.write(
+                f'{name}: {requests} requests in {elapsed:.2f}s, {requests / elapsed:.1f} req/s, '
+                f'p50 {percentile(latencies, 50):.1f} ms, p95 {percentile(latencies, 95):.1f} ms, '
+                f'p99 {percentile(latencies, 99):.1f} ms'
+            )
+
+    def run_both(self, headers, options):
+        return {
+            'WSGI': self.run_wsgi(headers, options['clients'], options['loads']),
+            'ASGI': asyncio.run(self.run_asgi(headers, options['clients'], options['loads'])),
+        }
+
+    def run_wsgi(self, headers, clients, loads):
+        def client_session(_):
+            client = Client(headers=headers)
+            latencies = []
+            try:
+                for _ in range(loads):
+                    for url in WSGI_URLS:
+                        started = time.perf_counter()
+                        self.check_response(client.get(url), url)
+                        latencies.append((time.perf_counter() - started) * 1000)
+            finally:
+                connections.close_all()
+            return latencies
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as executor:
+            sessions = list(executor.map(client_session, range(clients)))
+        return time.perf_counter() - started, [latency for session in sessions for latency in session]
+
+    async def run_asgi(self, headers, clients, loads):
+        async def client_session():
+            client = AsyncClient()
+            latencies = []
+            for _ in range(loads):
+                for url in ASGI_URLS:
+                    started = time.perf_counter()
+                    self.check_response(await client.get(url, headers=headers), url)
+                    latencies.append((time.perf_counter() - started) * 1000)
+            return latencies
+
+        started = time.perf_counter()
+        sessions = await asyncio.gather(*(client_session() for _ in range(clients)))
+        return time.perf_counter() - started, [latency for session in sessions for latency in session]
+
+    def check_response(self, response, url):
+        if response.status_code != 200:
+            raise CommandError(f'{url} returned {response.status_code}')
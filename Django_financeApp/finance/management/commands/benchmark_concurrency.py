@@ -0,0 +1,131 @@
+import json
+import logging
+import threading
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from django.test import Client
+
+from finance import budgets, database, rollups, signals
+from finance.benchmarking import auth_headers, benchmark_settings, get_user, percentile
+from finance.models import Category, Transaction
+
+READ_URLS = ['/api/transactions/', '/api/transactions/summary/', '/api/budgets/progress/']
+IMPORT_URL = '/api/transactions/import/'
+IMPORT_DESCRIPTION = 'benchmark import'  # marks the rows removed after the run
+
+
+# read latency on its own and while transaction imports are written concurrently
+# run it once per database profile (FINANCE_DB_PROFILE) to compare; with the
+# default rollback journal readers wait for every import to commit, under WAL they don't
+class Command(BaseCommand):
+    help = 'Benchmark read latency while transaction imports are being written.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='username to run as (defaults to the first user)')
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--seconds', type=float, default=10, help='duration of each phase')
+        parser.add_argument('--import-rows', type=int, default=500, help='rows per import request')
+
+    def handle(self, *args, **options):
+        if options['readers'] < 1 or options['writers'] < 1 or options['import_rows'] < 1:
+            raise CommandError('--readers, --writers and --import-rows must be at least 1.')
+        user = get_user(options['user'])
+        categories = list(Category.objects.values_list('name', flat=True)[:10])
+        if user is None or not categories:
+            raise CommandError('Needs a user and categories. Run seed_data first.')
+        headers = auth_headers(user)
+
+        self.stdout.write(f'profile: {settings.FINANCE_DB_PROFILE} {database.current_pragmas(connection)}')
+        try:
+            # lock waits would log every read as a slow query
+            with benchmark_settings(metrics_level=logging.ERROR):
+                alone = self.run_phase(headers, categories, options, writers=0)
+                mixed = self.run_phase(headers, categories, options, writers=options['writers'])
+        finally:
+            self.cleanup(user)
+
+        for name, result in (('reads only', alone), ('reads + imports', mixed)):
+            self.report(name, result, options['seconds'])
+
+    def run_phase(self, headers, categories, options, writers):
+        stop = threading.Event()
+        result = {'latencies': [], 'read_errors': 0, 'imported': 0, 'write_errors': 0}
+        lock = threading.Lock()
+
+        def reader():
+            client = Client(headers=headers)
+            try:
+                while not stop.is_set():
+                    for url in READ_URLS:
+                        started = time.perf_counter()
+                        try:
+                            client.get(url, {'format': 'json'})
+                        except OperationalError:
+                            with lock:
+                                result['read_errors'] += 1
+                            continue
+                        with lock:
+                            result['latencies'].append((time.perf_counter() - started) * 1000)
+            finally:
+                connections.close_all()
+
+        def writer():
+            client = Client(headers=headers)
+            day = date.today() - timedelta(days=1)
+            rows = [
+                {
+                    'description': IMPORT_DESCRIPTION, 'category': categories[index % len(categories)],
+                    'amount': '12.50', 'type': 'expense', 'date': day.isoformat(), 'completed': True,
+                }
+                for index in range(options['import_rows'])
+            ]
+            body = json.dumps(rows)
+            try:
+                while not stop.is_set():
+                    try:
+                        response = client.post(IMPORT_URL, body, content_type='application/json')
+                    except OperationalError:
+                        with lock:
+                            result['write_errors'] += 1
+                        continue
+                    with lock:
+                        if response.status_code == 201:
+                            result['imported'] += len(rows)
+                        else:
+                            result['write_errors'] += 1
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=reader) for _ in range(options['readers'])]
+        threads += [threading.Thread(target=writer) for _ in range(writers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(options['seconds'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return result
+
+    def report(self, name, result, seconds):
+        latencies = result['latencies']
+        if not latencies:
+            self.stdout.write(f'{name}: no successful reads, {result["read_errors"]} read errors')
+            return
+        self.stdout.write(
+            f'{name}: {len(latencies) / seconds:.1f} reads/s, p50 {percentile(latencies, 50):.1f} ms, '
+            f'p95 {percentile(latencies, 95):.1f} ms, max {max(latencies):.1f} ms, {result["read_errors"]} read errors, '
+            f'{result["imported"] / seconds:.0f} rows imported/s, {result["write_errors"]} failed imports'
+        )
+
+    # imports went through bulk_create, remove them the same way and rebuild the rollup and budget counters
+    def cleanup(self, user):
+        imported = Transaction.objects.filter(user=user, description=IMPORT_DESCRIPTION)
+        imported._raw_delete(imported.db)
+        rollups.rebuild(user_ids=[user.pk])
+        budgets.reconcile(user_ids=[user.pk])
+        signals.invalidate_analytics_cache(user.pk)
@@ -0,0 +1,157 @@
+import json
+import time
+import tracemalloc
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from finance import urls
+from finance.benchmarking import auth_headers, benchmark_settings, get_user, percentile
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'benchmarks' / 'baseline.json'
+# changes below these are noise and never flagged
+MIN_REGRESSION = {'p95_ms': 2.0, 'peak_memory_kb': 64.0}
+
+
+# GET urls of every endpoint registered on the finance router: list, detail
+# (for the first listed object) and every GET list action
+def router_urls(client):
+    endpoints = {}
+    for prefix, viewset, basename in urls.router.registry:
+        list_url = reverse(f'{basename}-list')
+        endpoints[f'{basename}-list'] = list_url
+
+        response = client.get(list_url, {'format': 'json'})
+        if response.status_code == 200:
+            data = response.json()
+            rows = data['results'] if isinstance(data, dict) else data
+            if rows and 'id' in rows[0]:
+                endpoints[f'{basename}-detail'] = reverse(f'{basename}-detail', args=[rows[0]['id']])
+
+        for extra_action in viewset.get_extra_actions():
+            if not extra_action.detail and 'get' in extra_action.mapping:
+                name = f'{basename}-{extra_action.url_name}'
+                endpoints[name] = reverse(name)
+    return endpoints
+
+
+def consume(response):
+    # streamed responses (export) only do their work while being read
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    return response
+
+
+# latency percentiles, query count and peak traced memory of every router
+# endpoint through the test client, compared against a stored baseline
+# queries of every request are counted; memory is traced in a separate request
+# so tracemalloc does not slow down the timed ones
+class Command(BaseCommand):
+    help = 'Benchmark every finance API endpoint and compare against a baseline.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='username to benchmark as (defaults to the first staff user, then the first user)')
+        parser.add_argument('--iterations', type=int, default=20, help='timed requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=2, help='untimed requests per endpoint')
+        parser.add_argument('--endpoint', action='append', dest='endpoints', help='only run endpoints with this name')
+        parser.add_argument('--with-cache', action='store_true', help='keep the response caches enabled')
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE), help='baseline json to compare against')
+        parser.add_argument('--save-baseline', action='store_true', help='write the results as the new baseline')
+        parser.add_argument('--output', help='also write the results to this json file')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='allowed relative increase in p95 latency and peak memory before flagging a regression')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1 or options['warmup'] < 0:
+            raise CommandError('--iterations must be at least 1 and --warmup at least 0.')
+        user = get_user(options['user'], staff_first=True)
+        if user is None:
+            raise CommandError('No user to benchmark with. Run seed_data or pass --user.')
+
+        with benchmark_settings(with_cache=options['with_cache']):
+            results = self.run(Client(headers=auth_headers(user)), options)
+
+        self.report(results)
+        if options['output']:
+            self.write(options['output'], results)
+        baseline_path = Path(options['baseline'])
+        if options['save_baseline']:
+            self.write(baseline_path, results)
+            self.stdout.write(self.style.SUCCESS(f'Saved baseline to {baseline_path}.'))
+        elif baseline_path.exists():
+            regressions = self.compare(results, json.loads(baseline_path.read_text()), options['tolerance'])
+            if regressions:
+                for regression in regressions:
+                    self.stdout.write(self.style.ERROR(regression))
+                raise CommandError(f'{len(regressions)} regressions against {baseline_path}.')
+            self.stdout.write(self.style.SUCCESS(f'No regressions against {baseline_path}.'))
+
+    def run(self, client, options):
+        results = {}
+        for name, url in router_urls(client).items():
+            if options['endpoints'] and name not in options['endpoints']:
+                continue
+            for _ in range(options['warmup']):
+                consume(client.get(url))
+
+            latencies = []
+            queries = []
+            for _ in range(options['iterations']):
+                with CaptureQueriesContext(connections['default']) as ctx:
+                    started = time.perf_counter()
+                    response = consume(client.get(url))
+                    latencies.append((time.perf_counter() - started) * 1000)
+                queries.append(len(ctx.captured_queries))
+
+            tracemalloc.start()
+            try:
+                consume(client.get(url))
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+            results[name] = {
+                'url': url,
+                'status': response.status_code,
+                'p50_ms': round(percentile(latencies, 50), 2),
+                'p95_ms': round(percentile(latencies, 95), 2),
+                'p99_ms': round(percentile(latencies, 99), 2),
+                'queries': max(queries),
+                'peak_memory_kb': round(peak / 1024, 1),
+            }
+        return results
+
+    def report(self, results):
+        self.stdout.write(f'{"endpoint":<28} {"status":>6} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"queries":>8} {"peak KiB":>10}')
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<28} {result["status"]:>6} {result["p50_ms"]:>9.2f} {result["p95_ms"]:>9.2f} '
+                f'{result["p99_ms"]:>9.2f} {result["queries"]:>8} {result["peak_memory_kb"]:>10.1f}'
+            )
+
+    # query counts must not grow at all, latency and memory within the tolerance
+    def compare(self, results, baseline, tolerance):
+        regressions = []
+        for name, result in results.items():
+            expected = baseline.get(name)
+            if expected is None:
+                continue
+            if result['status'] != expected['status']:
+                regressions.append(f'{name}: status {expected["status"]} -> {result["status"]}')
+            if result['queries'] > expected['queries']:
+                regressions.append(f'{name}: queries {expected["queries"]} -> {result["queries"]}')
+            for field, floor in MIN_REGRESSION.items():
+                if result[field] > max(expected[field] * (1 + tolerance), expected[field] + floor):
+                    regressions.append(f'{name}: {field} {expected[field]} -> {result[field]}')
+        return regressions
+
+    def write(self, path, results):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(results, indent=2, sort_keys=True) + '\n')
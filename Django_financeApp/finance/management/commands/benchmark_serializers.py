@@ -0,0 +1,65 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from finance.models import Transaction
+from finance.renderers import ORJSONRenderer, orjson
+from finance.serializers import FlatTransactionSerializer, TransactionCategoryUserSerializer
+
+
+def model_rows(limit):
+    queryset = Transaction.objects.select_related('user').order_by('-date', '-id')  # as TransactionsViewSet
+    return TransactionCategoryUserSerializer(queryset[:limit], many=True).data
+
+
+def flat_rows(limit):
+    queryset = Transaction.objects.values(*FlatTransactionSerializer().lookups()).order_by('-date', '-id')
+    return FlatTransactionSerializer(queryset[:limit], many=True).data
+
+
+PATHS = [
+    ('model serializer + JSONRenderer', model_rows, JSONRenderer),
+    ('flat serializer + JSONRenderer', flat_rows, JSONRenderer),
+    ('flat serializer + ORJSONRenderer', flat_rows, ORJSONRenderer),
+]
+
+
+# rows/s of the transaction list read path (query, serialize, render) with the
+# nested model serializers and with FlatTransactionSerializer, best of --repeat runs
+class Command(BaseCommand):
+    help = 'Benchmark transaction list serialization and rendering throughput.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=50000)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        if options['rows'] < 1 or options['repeat'] < 1:
+            raise CommandError('--rows and --repeat must be at least 1.')
+        rows = min(options['rows'], Transaction.objects.count())
+        if rows < options['rows']:
+            raise CommandError(f'Only {rows} transactions. Run seed_data first.')
+        if orjson is None:
+            self.stdout.write(self.style.WARNING('orjson is not installed, ORJSONRenderer falls back to json.'))
+
+        outputs = {}
+        for name, read, renderer_class in PATHS:
+            best = None
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                data = read(rows)
+                serialized = time.perf_counter()
+                outputs[name] = renderer_class().render(data)
+                rendered = time.perf_counter()
+                timings = (serialized - started, rendered - serialized, rendered - started)
+                best = timings if best is None or timings[2] < best[2] else best
+            read_seconds, render_seconds, total = best
+            self.stdout.write(
+                f'{name:<34} {rows / total:>10.0f} rows/s  '
+                f'(query + serialize {read_seconds * 1000:.0f} ms, render {render_seconds * 1000:.0f} ms)'
+            )
+
+        if len(set(outputs.values())) != 1:
+            raise CommandError('The read paths rendered different output.')
+        self.stdout.write(self.style.SUCCESS('All read paths rendered identical output.'))
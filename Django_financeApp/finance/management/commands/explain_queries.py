@@ -0,0 +1,72 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from finance import views
+from finance.benchmarking import benchmark_settings
+
+# (label, viewset, action) for every endpoint whose queries should be reviewed
+ENDPOINTS = [
+    ('transactions list', views.TransactionsViewSet, 'list'),
+    ('transactions summary', views.TransactionsViewSet, 'summary'),
+    ('budgets list', views.BudgetViewSet, 'list'),
+    ('budgets progress', views.BudgetViewSet, 'progress'),
+    ('forecasts list', views.ForecastViewSet, 'list'),
+    ('forecasts summary13week', views.ForecastViewSet, 'summary13week'),
+    ('categories list', views.CategoryViewSet, 'list'),
+    ('profiles list', views.UserProfileViewSet, 'list'),
+]
+
+
+# prints the database query plan for every query the analytic endpoints run
+# requests are built for the test server host with response caching off, so every query shows
+class Command(BaseCommand):
+    help = 'Print EXPLAIN QUERY PLAN output for the queries issued by each API endpoint.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='username to run the endpoints as (defaults to the first superuser)')
+        parser.add_argument('--endpoint', action='append', help='only explain endpoints whose label contains this text')
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        with benchmark_settings():
+            self.explain(user, options['endpoint'])
+
+    def explain(self, user, endpoints):
+        factory = APIRequestFactory()
+        prefix = connection.ops.explain_query_prefix()
+        for label, viewset, action in ENDPOINTS:
+            if endpoints and not any(text in label for text in endpoints):
+                continue
+
+            request = factory.get('/')
+            force_authenticate(request, user=user)
+            view = viewset.as_view({'get': action})
+            with CaptureQueriesContext(connection) as ctx:
+                response = view(request)
+                response.render()
+
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{label} ({len(ctx.captured_queries)} queries)'))
+            for query in ctx.captured_queries:
+                sql = query['sql']
+                if not sql.lstrip().upper().startswith('SELECT'):
+                    continue
+                self.stdout.write(sql)
+                with connection.cursor() as cursor:
+                    cursor.execute(f'{prefix} {sql}')
+                    for row in cursor.fetchall():
+                        self.stdout.write('    ' + ' | '.join(str(column) for column in row))
+                self.stdout.write('')
+
+    def get_user(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'User "{username}" does not exist.')
+        user = User.objects.filter(is_superuser=True).first() or User.objects.first()
+        if user is None:
+            raise CommandError('No users found. Create one or pass --user.')
+        return user
@@ -0,0 +1,106 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import F, Max, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from finance import forecasting, sync
+from finance.forecasting import PROJECTION_BUCKETS
+from finance.models import Forecast, SyncTombstone, Transaction
+
+FORECAST_FIELDS = ['opening_balance', 'cash_in', 'cash_out', 'closing_balance', 'updated_at']
+
+
+# computes each user's cash projection and upserts it into Forecast
+# users are computed on a thread pool, rows are written from the main thread in
+# batches so sqlite only ever sees one writer
+# by default only users without a current snapshot or with transactions changed
+# or deleted since their snapshot are recomputed. Writing a user's rows replaces the periods
+# of their previous snapshot, so /forecasts/ never mixes runs
+class Command(BaseCommand):
+    help = 'Materialize cash forecast periods into the Forecast table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='threads computing projections (1 runs inline)')
+        parser.add_argument('--periods', type=int, default=13)
+        parser.add_argument('--bucket', choices=PROJECTION_BUCKETS, default='week')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--all', action='store_true', help='recompute every active user')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['periods'] < 1:
+            raise CommandError('--workers and --periods must be at least 1.')
+        today = timezone.now().date()
+        users = self.stale_users(today, options['all'])
+
+        def compute(user):
+            try:
+                return [
+                    Forecast(user=user, **period)
+                    for period in forecasting.cash_projection(user, today, options['periods'], options['bucket'])
+                ]
+            finally:
+                if options['workers'] > 1:
+                    connections.close_all()  # thread-local connections are not reused
+
+        if options['workers'] == 1:
+            results = map(compute, users)
+        else:
+            executor = ThreadPoolExecutor(max_workers=options['workers'])
+            results = executor.map(compute, users)
+
+        pending = []
+        written = 0
+        for rows in results:
+            pending.extend(rows)  # flushed between users only, a user's rows are replaced together
+            if len(pending) >= options['batch_size']:
+                written += self.upsert(pending, options['batch_size'])
+                pending = []
+        written += self.upsert(pending, options['batch_size'])
+
+        if options['workers'] > 1:
+            executor.shutdown()
+        self.stdout.write(self.style.SUCCESS(f'Materialized {written} forecast rows for {len(users)} users.'))
+
+    # users without a snapshot, whose snapshot has run out, or with transactions
+    # updated or deleted (see sync.record_deletion) after their latest snapshot
+    # whatever day it was taken on
+    def stale_users(self, today, everyone):
+        users = User.objects.filter(is_active=True).order_by('pk')
+        if everyone:
+            return list(users)
+        snapshots = Forecast.objects.filter(user=OuterRef('pk')).order_by().values('user')
+        changed = Transaction.objects.filter(user=OuterRef('pk')).order_by().values('user').annotate(
+            at=Max('updated_at')
+        ).values('at')
+        deleted = SyncTombstone.objects.filter(
+            collection=sync.COLLECTION_NAMES[Transaction], user=OuterRef('pk')
+        ).order_by().values('user').annotate(at=Max('deleted_at')).values('at')
+        return list(users.annotate(
+            snapshot=Subquery(snapshots.annotate(at=Max('updated_at')).values('at')),
+            horizon=Subquery(snapshots.annotate(end=Max('end_date')).values('end')),
+            changed=Subquery(changed),
+            deleted=Subquery(deleted),
+        ).filter(
+            Q(snapshot__isnull=True) | Q(horizon__lt=today) | Q(changed__gt=F('snapshot')) | Q(deleted__gt=F('snapshot'))
+        ))
+
+    # upserts the rows and deletes the users' periods that are not among them
+    # (snapshots of earlier days or of another --periods/--bucket). Every written
+    # row gets an updated_at of at least `started`, so older rows are the superseded ones
+    def upsert(self, rows, batch_size):
+        if not rows:
+            return 0
+        with transaction.atomic():
+            started = timezone.now()
+            Forecast.objects.bulk_create(
+                rows,
+                batch_size=batch_size,
+                update_conflicts=True,
+                unique_fields=['user', 'start_date', 'end_date'],
+                update_fields=FORECAST_FIELDS,
+            )
+            Forecast.objects.filter(user_id__in={row.user_id for row in rows}, updated_at__lt=started).delete()
+        return len(rows)
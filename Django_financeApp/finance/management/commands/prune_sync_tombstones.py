@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from finance import sync
+
+
+# sync tokens older than the retention get a snapshot, their tombstones are no longer needed
+class Command(BaseCommand):
+    help = 'Delete sync tombstones older than FINANCE_SYNC_TOMBSTONE_DAYS.'
+
+    def handle(self, *args, **options):
+        deleted = sync.prune_tombstones(timezone.now())
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} sync tombstones.'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from finance import rollups
+
+
+# recomputes DailyRollup from the transaction table
+# run after loading data outside the ORM or to correct drift
+class Command(BaseCommand):
+    help = 'Rebuild the daily transaction rollup table from transactions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users', help='only rebuild rows for this user id')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count = rollups.rebuild(user_ids=options['users'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} rollup rows.'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from finance import search
+
+
+# recreates the FTS5 search tables and triggers and reindexes every row
+# run after a sqlite migration that rebuilt an indexed table
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for transactions and categories.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            raise CommandError('The full-text search index is only used on sqlite.')
+        search.rebuild(connection)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {len(search.INDEXES)} search indexes.'))
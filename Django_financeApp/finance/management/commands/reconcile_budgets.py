@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from finance import budgets
+
+
+# recomputes Budget.spent from the transaction table where the running counter drifted
+# run after writes that skip the rollup (raw deletes, queryset updates, loaded fixtures)
+class Command(BaseCommand):
+    help = 'Correct budget spent counters that drifted from their transactions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users', help='only check budgets of this user id')
+        parser.add_argument('--dry-run', action='store_true', help='report drift without correcting it')
+
+    def handle(self, *args, **options):
+        drifted = budgets.reconcile(user_ids=options['users'], dry_run=options['dry_run'])
+        for budget_id, spent, expected in drifted:
+            self.stdout.write(f'budget {budget_id}: spent {spent}, expected {expected}')
+        verb = 'Found' if options['dry_run'] else 'Corrected'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {len(drifted)} drifted budgets.'))
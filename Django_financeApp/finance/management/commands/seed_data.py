@@ -0,0 +1,179 @@
+import uuid
+from datetime import date, timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction as db_transaction
+from django.utils import timezone
+
+from finance import budgets as budget_counters, lookups, rollups, signals
+from finance.models import Budget, Category, DailyRollup, Forecast, Transaction
+
+# category -> (type, typical amount)
+CATEGORIES = {
+    'Sales': ('income', 1200),
+    'Consulting': ('income', 3000),
+    'Subscriptions': ('income', 90),
+    'Grants': ('income', 15000),
+    'Interest': ('income', 40),
+    'Rent': ('expense', 2500),
+    'Payroll': ('expense', 4000),
+    'Utilities': ('expense', 300),
+    'Software': ('expense', 120),
+    'Marketing': ('expense', 800),
+    'Travel': ('expense', 450),
+    'Office Supplies': ('expense', 60),
+    'Insurance': ('expense', 700),
+    'Taxes': ('expense', 5000),
+    'Equipment': ('expense', 1500),
+}
+CLIENTS = ['Acme', 'Globex', 'Initech', 'Umbrella', 'Hooli', 'Stark', 'Wayne', '']
+PENDING_DAYS = 30   # recent transactions are often still pending
+FUTURE_DAYS = 60    # scheduled (pending) transactions after today
+
+
+# seeds a realistic dataset for load testing and benchmarks
+# amounts follow a yearly and weekly season with lognormal noise; transactions
+# older than PENDING_DAYS are mostly completed, future ones are all pending.
+# rows are generated with numpy and written with bulk_create in batches, so
+# signals do not run and the rollup is rebuilt for the seeded users at the end
+class Command(BaseCommand):
+    help = 'Seed users, categories, budgets and transactions for benchmarking.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--transactions', type=int, default=100000, help='total transactions across all users')
+        parser.add_argument('--days', type=int, default=730, help='days of history')
+        parser.add_argument('--prefix', default='seed', help='username prefix of the seeded users')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, help='random seed for a reproducible dataset')
+        parser.add_argument('--clear', action='store_true', help='delete previously seeded users and their data first')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['days'] < 1 or options['batch_size'] < 1 or options['transactions'] < 0:
+            raise CommandError('--users, --days and --batch-size must be at least 1.')
+        rng = np.random.default_rng(options['seed'])
+        today = timezone.now().date()
+
+        if options['clear']:
+            self.clear(options['prefix'])
+        users = self.create_users(options['prefix'], options['users'])
+        categories = self.create_categories()
+        budgets = self.create_budgets(users, categories, today, options['days'], options['batch_size'])
+        count = self.create_transactions(
+            rng, users, categories, today, options['days'], options['transactions'], options['batch_size']
+        )
+
+        user_ids = [user.pk for user in users]
+        rollup_rows = rollups.rebuild(user_ids=user_ids, batch_size=options['batch_size'])
+        budget_counters.reconcile(user_ids=user_ids)  # bulk_create skips the spent counters too
+        signals.invalidate_analytics_cache(*user_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {len(users)} users, {len(categories)} categories, {budgets} budgets, '
+            f'{count} transactions and {rollup_rows} rollup rows.'
+        ))
+
+    def clear(self, prefix):
+        users = User.objects.filter(username__startswith=f'{prefix}_')
+        with db_transaction.atomic():
+            # skips the per row rollup signals, the seeded users' rollup rows go with them
+            transactions = Transaction.objects.filter(user__in=users)
+            transactions._raw_delete(transactions.db)
+            DailyRollup.objects.filter(user__in=users).delete()
+            Budget.objects.filter(user__in=users).delete()
+            Forecast.objects.filter(user__in=users).delete()
+            users.delete()
+
+    def create_users(self, prefix, count):
+        existing = User.objects.filter(username__startswith=f'{prefix}_').count()
+        password = make_password(f'{prefix}-pass-123')  # hashed once, every seeded user shares it
+        User.objects.bulk_create([
+            User(username=f'{prefix}_{index}', email=f'{prefix}_{index}@example.com', password=password)
+            for index in range(existing + 1, existing + count + 1)
+        ])
+        return list(User.objects.filter(username__startswith=f'{prefix}_').order_by('-pk')[:count])
+
+    def create_categories(self):
+        Category.objects.bulk_create(
+            [Category(name=name, description=f'{type.title()} category') for name, (type, _) in CATEGORIES.items()],
+            ignore_conflicts=True
+        )
+        lookups.invalidate(Category)  # bulk_create skips the lookup table signals
+        return list(Category.objects.filter(name__in=CATEGORIES).order_by('name'))
+
+    # one monthly budget per user and expense category
+    def create_budgets(self, users, categories, today, days, batch_size):
+        months = []
+        month = (today - timedelta(days=days)).replace(day=1)
+        while month <= today:
+            next_month = (month + timedelta(days=32)).replace(day=1)
+            months.append((month, next_month - timedelta(days=1)))
+            month = next_month
+
+        budgets = [
+            Budget(
+                user=user, category=category, start_date=start, end_date=end,
+                amount=Decimal(CATEGORIES[category.name][1] * 20),
+            )
+            for user in users
+            for category in categories if CATEGORIES[category.name][0] == 'expense'
+            for start, end in months
+        ]
+        Budget.objects.bulk_create(budgets, batch_size=batch_size)
+        return len(budgets)
+
+    def create_transactions(self, rng, users, categories, today, days, total, batch_size):
+        types = np.array([CATEGORIES[category.name][0] for category in categories])
+        typical = np.array([CATEGORIES[category.name][1] for category in categories], dtype=np.float64)
+        # expenses are booked more often than income, but in smaller amounts
+        weights = np.where(types == 'expense', 3.0, 1.0) / np.sqrt(typical)
+        weights /= weights.sum()
+        first_day = (today - timedelta(days=days)).toordinal()
+        category_types = types.tolist()
+        descriptions = [f'{category.name} payment' for category in categories]
+
+        written = 0
+        while written < total:
+            size = min(batch_size, total - written)
+            user_index = rng.integers(0, len(users), size)
+            category_index = rng.choice(len(categories), size, p=weights)
+            ordinals = rng.integers(first_day, today.toordinal() + FUTURE_DAYS + 1, size)
+
+            # yearly peak in december, quieter weekends, lognormal noise
+            day_of_year = (ordinals - date(1970, 1, 1).toordinal()) % 365.25
+            season = 1 + 0.3 * np.cos(2 * np.pi * (day_of_year - 350) / 365.25)
+            weekend = np.where((ordinals - 1) % 7 >= 5, 0.6, 1.0)
+            amounts = np.round(typical[category_index] * season * weekend * rng.lognormal(0, 0.4, size), 2)
+            amounts = np.maximum(amounts, 0.01)
+
+            age = today.toordinal() - ordinals
+            completed = np.where(age < 0, False, rng.random(size) < np.where(age < PENDING_DAYS, 0.5, 0.97))
+            clients = rng.integers(0, len(CLIENTS), size)
+
+            rows = [
+                Transaction(
+                    id=uuid.uuid4(),
+                    user=users[user],
+                    category=categories[category],
+                    description=descriptions[category],
+                    amount=Decimal(f'{amount:.2f}'),
+                    type=category_types[category],
+                    date=date.fromordinal(ordinal),
+                    client=CLIENTS[client],
+                    completed=is_completed,
+                )
+                for user, category, amount, ordinal, client, is_completed in zip(
+                    user_index.tolist(), category_index.tolist(), amounts.tolist(),
+                    ordinals.tolist(), clients.tolist(), completed.tolist()
+                )
+            ]
+            with db_transaction.atomic():
+                Transaction.objects.bulk_create(rows, batch_size=batch_size)
+            written += size
+            self.stdout.write(f'{written}/{total} transactions', ending='\r')
+        if total:
+            self.stdout.write('')
+        return written
@@ -0,0 +1,69 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from finance import caching, routers
+
+
+# size and modification time of the primary's database and WAL files, they
+# change with every commit whichever process wrote it
+def primary_signature():
+    name = str(connections[DEFAULT_DB_ALIAS].settings_dict['NAME'])
+    signature = []
+    for path in (name, f'{name}-wal'):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            signature.append(None)
+        else:
+            signature.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+# keeps the local sqlite replicas (FINANCE_REPLICAS) a copy of the primary
+# with sqlite's online backup API. A copy is only made when the primary's files
+# changed since the last one; each copy starts a new replica epoch so analytic
+# responses cached from the stale replica are dropped. Epochs and read-your-writes
+# pins only reach the web workers through a shared cache, so locmem aliases are refused.
+class Command(BaseCommand):
+    help = 'Copy the primary sqlite database into the configured replicas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0, help='seconds between checks, 0 copies once and exits')
+
+    def handle(self, *args, **options):
+        replicas = getattr(settings, 'FINANCE_REPLICAS', [])
+        if not replicas:
+            raise CommandError('No replicas configured. Set FINANCE_REPLICA_DB to a sqlite file path.')
+        if not (caching.is_shared(caching.get_cache()) and caching.is_shared(routers.get_cache())):
+            raise CommandError(
+                'Replicas need a cache shared by every worker: point FINANCE_ANALYTICS_CACHE_ALIAS and '
+                'FINANCE_REPLICA_PIN_CACHE_ALIAS at a cache other than locmem.'
+            )
+        aliases = [DEFAULT_DB_ALIAS, *replicas]
+        if any(connections[alias].vendor != 'sqlite' for alias in aliases):
+            raise CommandError('sync_replica only copies sqlite databases, configure replication in the database server otherwise.')
+
+        copied = None
+        while True:
+            signature = primary_signature()
+            if signature != copied:
+                started = time.perf_counter()
+                self.copy(replicas)
+                caching.bump_replica_epoch()
+                copied = signature
+                self.stdout.write(f'Copied the primary to {", ".join(replicas)} in {time.perf_counter() - started:.2f}s.')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def copy(self, replicas):
+        primary = connections[DEFAULT_DB_ALIAS]
+        primary.ensure_connection()
+        for alias in replicas:
+            replica = connections[alias]
+            replica.ensure_connection()
+            primary.connection.backup(replica.connection)
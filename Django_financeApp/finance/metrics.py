@@ -0,0 +1,245 @@
+import bisect
+import contextvars
+import json
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+# per request performance metrics
+# RequestMetricsMiddleware times every request, counts and times its SQL through
+# a database execute wrapper installed on every connection (see signals.py) and
+# collects the serializer and render stages.
+# Each request gets a Server-Timing header and a structured DEBUG log line (slow
+# queries are logged as warnings), and its duration is added to an in-memory histogram for its route (see MetricsView).
+
+logger = logging.getLogger('finance.metrics')
+
+# histogram bucket upper bounds in ms, 0.1 ms to ~2 minutes in 25% steps
+BUCKETS = tuple(0.1 * 1.25 ** index for index in range(64))
+SLOW_QUERY_LOG_LIMIT = 10  # slow queries logged per request, slowest first
+
+current = contextvars.ContextVar('finance_request_metrics', default=None)
+
+
+def slow_query_threshold():
+    # ms, None disables slow query logging
+    return getattr(settings, 'FINANCE_SLOW_QUERY_MS', 200)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.stages = {'sql': 0.0, 'serialize': 0.0, 'render': 0.0}
+        self.open_stages = set()
+        self.slow_queries = []
+        self.threshold = slow_query_threshold()
+
+    def query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            self.queries += 1
+            self.stages['sql'] += elapsed
+            if self.threshold is not None and elapsed >= self.threshold:
+                self.slow_queries.append((elapsed, context['connection'].alias, sql))
+
+    def add(self, stage, elapsed):
+        self.stages[stage] += elapsed
+
+    def total(self):
+        return (time.perf_counter() - self.started) * 1000
+
+
+# execute wrapper for every connection, the request metrics are found through a
+# context variable so queries run in sync_to_async threads are counted too
+def record_query(execute, sql, params, many, context):
+    metrics = current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics.query(execute, sql, params, many, context)
+
+
+def install(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+# times a stage of the current request, nested calls of the same stage count once
+@contextmanager
+def stage(name):
+    metrics = current.get()
+    if metrics is None or name in metrics.open_stages:
+        yield
+        return
+    metrics.open_stages.add(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.open_stages.discard(name)
+        metrics.add(name, (time.perf_counter() - started) * 1000)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    # upper bound of the bucket holding the percentile, capped at the largest value seen
+    def percentile(self, percent):
+        if not self.count:
+            return 0.0
+        rank = math.ceil(self.count * percent / 100)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                break
+        return min(BUCKETS[index], self.max) if index < len(BUCKETS) else self.max
+
+
+class RouteStats:
+    def __init__(self):
+        self.duration = Histogram()
+        self.queries = 0
+        self.stages = {'sql': 0.0, 'serialize': 0.0, 'render': 0.0}
+
+    def observe(self, metrics, duration):
+        self.duration.observe(duration)
+        self.queries += metrics.queries
+        for name, elapsed in metrics.stages.items():
+            self.stages[name] += elapsed
+
+    def summary(self):
+        count = self.duration.count
+        return {
+            'count': count,
+            'p50_ms': round(self.duration.percentile(50), 2),
+            'p95_ms': round(self.duration.percentile(95), 2),
+            'p99_ms': round(self.duration.percentile(99), 2),
+            'max_ms': round(self.duration.max, 2),
+            'mean_ms': round(self.duration.sum / count, 2),
+            'mean_queries': round(self.queries / count, 2),
+            **{f'mean_{name}_ms': round(elapsed / count, 2) for name, elapsed in self.stages.items()},
+        }
+
+
+# route -> RouteStats for this process
+routes = {}
+routes_lock = threading.Lock()
+
+
+def record(route, metrics, duration):
+    with routes_lock:
+        stats = routes.get(route)
+        if stats is None:
+            stats = routes[route] = RouteStats()
+        stats.observe(metrics, duration)
+
+
+def snapshot():
+    with routes_lock:
+        return {route: stats.summary() for route, stats in sorted(routes.items())}
+
+
+def reset():
+    with routes_lock:
+        routes.clear()
+
+
+def route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return f'{request.method} {match.view_name if match else "<unresolved>"}'
+
+
+def server_timing(metrics, duration):
+    return ', '.join([
+        f'db;dur={metrics.stages["sql"]:.2f};desc="{metrics.queries} queries"',
+        f'serialize;dur={metrics.stages["serialize"]:.2f}',
+        f'render;dur={metrics.stages["render"]:.2f}',
+        f'total;dur={duration:.2f}',
+    ])
+
+
+class RequestMetricsMiddleware:
+    # keep it first in MIDDLEWARE so the timings cover the whole middleware stack
+    # and process_template_response runs right before the response is rendered
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            current.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current.reset(token)
+        return self.finish(request, response, metrics)
+
+    def process_template_response(self, request, response):
+        metrics = current.get()
+        if metrics is not None:
+            started = time.perf_counter()
+            response.add_post_render_callback(
+                lambda rendered: metrics.add('render', (time.perf_counter() - started) * 1000)
+            )
+        return response
+
+    def finish(self, request, response, metrics):
+        duration = metrics.total()
+        route = route_name(request)
+        response['Server-Timing'] = server_timing(metrics, duration)
+        record(route, metrics, duration)
+
+        logger.debug(json.dumps({
+            'event': 'request',
+            'route': route,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(duration, 2),
+            'queries': metrics.queries,
+            'sql_ms': round(metrics.stages['sql'], 2),
+            'serialize_ms': round(metrics.stages['serialize'], 2),
+            'render_ms': round(metrics.stages['render'], 2),
+        }))
+        for elapsed, alias, sql in sorted(metrics.slow_queries, reverse=True)[:SLOW_QUERY_LOG_LIMIT]:
+            logger.warning(json.dumps({
+                'event': 'slow_query',
+                'route': route,
+                'database': alias,
+                'duration_ms': round(elapsed, 2),
+                'sql': sql,
+            }))
+        return response
@@ -0,0 +1,49 @@
+# Generated by Django 5.1.7 on 2026-10-18 14:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_rollup(apps, schema_editor):
+    Transaction = apps.get_model('finance', 'Transaction')
+    DailyRollup = apps.get_model('finance', 'DailyRollup')
+    zero = Value(0, output_field=models.DecimalField())
+    grouped = Transaction.objects.order_by().values('user_id', 'category_id', 'date').annotate(
+        income_completed=Coalesce(Sum('amount', filter=Q(type='income', completed=True)), zero),
+        expense_completed=Coalesce(Sum('amount', filter=Q(type='expense', completed=True)), zero),
+        income_pending=Coalesce(Sum('amount', filter=Q(type='income', completed=False)), zero),
+        expense_pending=Coalesce(Sum('amount', filter=Q(type='expense', completed=False)), zero),
+    )
+    DailyRollup.objects.bulk_create((DailyRollup(**row) for row in grouped.iterator()), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0007_transaction_budget_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('income_completed', models.DecimalField(decimal_places=2, default=0, max_digits=17)),
+                ('expense_completed', models.DecimalField(decimal_places=2, default=0, max_digits=17)),
+                ('income_pending', models.DecimalField(decimal_places=2, default=0, max_digits=17)),
+                ('expense_pending', models.DecimalField(decimal_places=2, default=0, max_digits=17)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='finance.category')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'date'], name='rollup_user_date_idx'), models.Index(fields=['category', 'user', 'date'], name='rollup_category_user_date_idx'), models.Index(fields=['date'], name='rollup_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'category', 'date'), name='rollup_user_category_date_uniq')],
+            },
+        ),
+        migrations.RunPython(populate_rollup, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.1.7 on 2026-10-18 16:05
+
+from django.db import migrations
+
+# FTS5 indexes keyed on the row's id (see finance/search.py); the DDL is inlined
+# so later changes to search.py do not rewrite this migration
+
+CREATE = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS finance_transaction_fts USING fts5(id, description, category, note, client, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4')",
+    "INSERT INTO finance_transaction_fts(finance_transaction_fts, rank) VALUES ('rank', 'bm25(0.0, 10.0, 5.0, 1.0, 3.0)')",
+    """CREATE TRIGGER IF NOT EXISTS finance_transaction_fts_insert AFTER INSERT ON finance_transaction BEGIN
+        INSERT INTO finance_transaction_fts(id, description, category, note, client)
+        VALUES (new.id, new.description, (SELECT name FROM finance_category WHERE id = new.category_id), new.note, new.client);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS finance_transaction_fts_update
+    AFTER UPDATE OF id, description, category_id, note, client ON finance_transaction BEGIN
+        DELETE FROM finance_transaction_fts WHERE finance_transaction_fts MATCH 'id : "' || old.id || '"';
+        INSERT INTO finance_transaction_fts(id, description, category, note, client)
+        VALUES (new.id, new.description, (SELECT name FROM finance_category WHERE id = new.category_id), new.note, new.client);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS finance_transaction_fts_delete AFTER DELETE ON finance_transaction BEGIN
+        DELETE FROM finance_transaction_fts WHERE finance_transaction_fts MATCH 'id : "' || old.id || '"';
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS finance_category_name_fts_update AFTER UPDATE OF name ON finance_category BEGIN
+        UPDATE finance_transaction_fts SET category = new.name
+        WHERE id IN (SELECT id FROM finance_transaction WHERE category_id = new.id);
+    END""",
+    "INSERT INTO finance_transaction_fts(id, description, category, note, client) "
+    "SELECT t.id, t.description, (SELECT name FROM finance_category WHERE id = t.category_id), t.note, t.client "
+    "FROM finance_transaction t",
+    "INSERT INTO finance_transaction_fts(finance_transaction_fts) VALUES ('optimize')",
+
+    "CREATE VIRTUAL TABLE IF NOT EXISTS finance_category_fts USING fts5(id, name, description, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4')",
+    "INSERT INTO finance_category_fts(finance_category_fts, rank) VALUES ('rank', 'bm25(0.0, 10.0, 1.0)')",
+    """CREATE TRIGGER IF NOT EXISTS finance_category_fts_insert AFTER INSERT ON finance_category BEGIN
+        INSERT INTO finance_category_fts(id, name, description) VALUES (new.id, new.name, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS finance_category_fts_update AFTER UPDATE OF id, name, description ON finance_category BEGIN
+        DELETE FROM finance_category_fts WHERE finance_category_fts MATCH 'id : "' || old.id || '"';
+        INSERT INTO finance_category_fts(id, name, description) VALUES (new.id, new.name, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS finance_category_fts_delete AFTER DELETE ON finance_category BEGIN
+        DELETE FROM finance_category_fts WHERE finance_category_fts MATCH 'id : "' || old.id || '"';
+    END""",
+    "INSERT INTO finance_category_fts(id, name, description) SELECT t.id, t.name, t.description FROM finance_category t",
+    "INSERT INTO finance_category_fts(finance_category_fts) VALUES ('optimize')",
+]
+
+DROP = [
+    'DROP TRIGGER IF EXISTS finance_transaction_fts_insert',
+    'DROP TRIGGER IF EXISTS finance_transaction_fts_update',
+    'DROP TRIGGER IF EXISTS finance_transaction_fts_delete',
+    'DROP TRIGGER IF EXISTS finance_category_name_fts_update',
+    'DROP TABLE IF EXISTS finance_transaction_fts',
+    'DROP TRIGGER IF EXISTS finance_category_fts_insert',
+    'DROP TRIGGER IF EXISTS finance_category_fts_update',
+    'DROP TRIGGER IF EXISTS finance_category_fts_delete',
+    'DROP TABLE IF EXISTS finance_category_fts',
+]
+
+
+def execute(statements):
+    # FTS5 tables and triggers only exist on sqlite, other databases keep LIKE search
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == 'sqlite':
+            with schema_editor.connection.cursor() as cursor:
+                for statement in statements:
+                    cursor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0010_forecast_user_period_unique'),
+    ]
+
+    operations = [
+        migrations.RunPython(execute(CREATE), execute(DROP)),
+    ]
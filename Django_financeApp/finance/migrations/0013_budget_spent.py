@@ -0,0 +1,59 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_spent(apps, schema_editor):
+    Budget = apps.get_model('finance', 'Budget')
+    DailyRollup = apps.get_model('finance', 'DailyRollup')
+    spent = DailyRollup.objects.filter(
+        user=OuterRef('user'),
+        category=OuterRef('category'),
+        date__gte=OuterRef('start_date'),
+        date__lte=OuterRef('end_date'),
+    ).order_by().values('category').annotate(total=Sum('expense_completed')).values('total')
+    Budget.objects.update(spent=Coalesce(Subquery(spent), Value(0, output_field=models.DecimalField())))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0012_sync_tombstone'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BudgetAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('threshold', models.PositiveSmallIntegerField()),
+                ('spent', models.DecimalField(decimal_places=2, max_digits=17)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='budget',
+            name='spent',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=17),
+        ),
+        migrations.AddIndex(
+            model_name='budget',
+            index=models.Index(fields=['user', 'category', 'start_date'], name='budget_user_category_idx'),
+        ),
+        migrations.AddField(
+            model_name='budgetalert',
+            name='budget',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alerts', to='finance.budget'),
+        ),
+        migrations.AddIndex(
+            model_name='budgetalert',
+            index=models.Index(fields=['budget', 'created_at'], name='budget_alert_created_idx'),
+        ),
+        migrations.RunPython(populate_spent, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.7 on 2026-10-19 11:10
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+FIELDS = ('income_completed', 'expense_completed', 'income_pending', 'expense_pending')
+
+
+# rows of deleted users were set to NULL one by one, leave one per category and day
+def merge_ownerless_rows(apps, schema_editor):
+    DailyRollup = apps.get_model('finance', 'DailyRollup')
+    ownerless = DailyRollup.objects.filter(user__isnull=True)
+    duplicated = ownerless.order_by().values('category_id', 'date').annotate(
+        rows=Count('id'), keep=Min('id'), **{field: Sum(field) for field in FIELDS}
+    ).filter(rows__gt=1)
+    for group in duplicated:
+        same_day = ownerless.filter(category_id=group['category_id'], date=group['date'])
+        same_day.filter(pk=group['keep']).update(**{field: group[field] for field in FIELDS})
+        same_day.exclude(pk=group['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0013_budget_spent'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_ownerless_rows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='dailyrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', True)), fields=('category', 'date'), name='rollup_ownerless_category_date_uniq'),
+        ),
+    ]
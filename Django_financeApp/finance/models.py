@@ -14,6 +14,9 @@ class Category (models.Model):
     
     class Meta:
         verbose_name_plural = 'Categories'
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='category_updated_id_idx'),  # delta sync
+        ]
 
     def __str__(self):
         return self.name
@@ -39,9 +42,17 @@ class Budget (models.Model):
     amount = models.DecimalField(max_digits=15, decimal_places=2,default=0.0 ) # under certain cases the balance can be 0
     start_date = models.DateField()
     end_date = models.DateField()
+    spent = models.DecimalField(max_digits=17, decimal_places=2, default=0)  # completed expenses in the window, kept by budgets.py
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['start_date'], name='budget_start_date_idx'),  # monthly progress report
+            models.Index(fields=['updated_at', 'id'], name='budget_updated_id_idx'),  # delta sync
+            models.Index(fields=['user', 'category', 'start_date'], name='budget_user_category_idx'),  # spent counters
+        ]
+
     def __str__(self):
         return f'{self.category.name} Budget: {self.amount}'
 
@@ -66,6 +77,16 @@ class Transaction(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # composite indexes matching the filters used by the analytic endpoints
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'completed', 'type', 'date'], name='txn_user_status_type_date_idx'),  # balances, summaries
+            models.Index(fields=['user', 'completed', 'date'], name='txn_user_status_date_idx'),  # pending cash projection
+            models.Index(fields=['category', 'type', 'completed', 'date'], name='txn_cat_type_status_date_idx'),  # budget progress
+            models.Index(fields=['date', 'id'], name='txn_date_id_idx'),  # date ranges and keyset pagination
+            models.Index(fields=['updated_at', 'id'], name='txn_updated_id_idx'),  # delta sync
+        ]
+
     def __str__(self):
         return f'Transaction : {self.amount} type:{self.type.title()} under category {self.category.name}'
 
@@ -83,6 +104,15 @@ class Forecast(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # one row per user and period, lets materialize_forecasts upsert
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'start_date', 'end_date'], name='forecast_user_period_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='forecast_updated_id_idx'),  # delta sync
+        ]
+
     def __str__(self):
         return f'forecast for {self.start_date} to {self.end_date} - {self.opening_balance} to {self.closing_balance}'
 
@@ -96,3 +126,66 @@ class UserProfile(models.Model):
 
     def __str__(self):
         return f'{self.user.username} with role {self.role.name}'
+
+# model DailyRollup
+# per user, category and day totals of transactions, kept current by signals (see rollups.py)
+# analytic endpoints sum these rows instead of scanning every transaction
+class DailyRollup(models.Model):
+    user = models.ForeignKey(User, null=True, on_delete=models.SET_NULL)  # follows the transactions it summarises
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    date = models.DateField()
+    income_completed = models.DecimalField(max_digits=17, decimal_places=2, default=0)
+    expense_completed = models.DecimalField(max_digits=17, decimal_places=2, default=0)
+    income_pending = models.DecimalField(max_digits=17, decimal_places=2, default=0)
+    expense_pending = models.DecimalField(max_digits=17, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'category', 'date'], name='rollup_user_category_date_uniq'),
+            # NULLs are distinct in the constraint above, rows of deleted users are merged (see rollups.py)
+            models.UniqueConstraint(fields=['category', 'date'], condition=models.Q(user__isnull=True),
+                                    name='rollup_ownerless_category_date_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'date'], name='rollup_user_date_idx'),
+            models.Index(fields=['category', 'user', 'date'], name='rollup_category_user_date_idx'),
+            models.Index(fields=['date'], name='rollup_date_idx'),
+        ]
+
+    def __str__(self):
+        return f'rollup for {self.date} - {self.category_id}'
+
+# model BudgetAlert
+# written when a budget's spent amount crosses one of FINANCE_BUDGET_ALERT_THRESHOLDS
+# (percent of the budget amount), once per crossing (see budgets.py)
+class BudgetAlert(models.Model):
+    budget = models.ForeignKey(Budget, on_delete=models.CASCADE, related_name='alerts')
+    threshold = models.PositiveSmallIntegerField()
+    spent = models.DecimalField(max_digits=17, decimal_places=2)  # at the time of the crossing
+    amount = models.DecimalField(max_digits=15, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['budget', 'created_at'], name='budget_alert_created_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.threshold}% alert for budget {self.budget_id}'
+
+# model SyncTombstone
+# a deleted transaction, budget, category or forecast, so /sync/ can tell clients
+# to drop it (see sync.py). Rows older than FINANCE_SYNC_TOMBSTONE_DAYS are pruned
+class SyncTombstone(models.Model):
+    collection = models.CharField(max_length=20)
+    object_id = models.CharField(max_length=36)
+    user = models.ForeignKey(User, null=True, on_delete=models.SET_NULL)  # owner, for per-user collections
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at', 'id'], name='tombstone_deleted_id_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.collection} {self.object_id} deleted at {self.deleted_at}'
@@ -0,0 +1,137 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework import filters
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .search import RANK_ANNOTATION
+
+
+# rows are model instances or values() dicts
+def row_value(row, field):
+    return row[field] if isinstance(row, dict) else getattr(row, field)
+
+
+# keyset pagination over (ordering field, id)
+# each page is a range seek from the cursor position instead of an OFFSET,
+# so deep pages cost the same as the first one
+class KeysetPagination(BasePagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    default_ordering = '-date'
+    tiebreak_field = 'id'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.field, descending = self.get_ordering(request, queryset, view)
+        cursor = self.decode_cursor(request)
+
+        # walking backwards flips the sort so the rows nearest the cursor come first
+        backwards = cursor['backwards'] if cursor else False
+        seek_descending = descending != backwards
+        prefix = '-' if seek_descending else ''
+        queryset = queryset.order_by(prefix + self.field, prefix + self.tiebreak_field)
+
+        if cursor:
+            lookup = 'lt' if seek_descending else 'gt'
+            try:
+                queryset = queryset.filter(
+                    Q(**{f'{self.field}__{lookup}': cursor['value']}) |
+                    Q(**{self.field: cursor['value'], f'{self.tiebreak_field}__{lookup}': cursor['id']})
+                )
+            except (ValidationError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        if backwards:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    # first field from ?ordering= (validated by OrderingFilter) or the view default
+    # full-text searches are ranked best match first unless ?ordering= is given
+    def get_ordering(self, request, queryset, view):
+        ordering_filter = filters.OrderingFilter()
+        if RANK_ANNOTATION in queryset.query.annotations and not request.query_params.get(ordering_filter.ordering_param):
+            return RANK_ANNOTATION, False
+        ordering = ordering_filter.get_ordering(request, queryset, view) or [self.default_ordering]
+        field = ordering[0]
+        return field.lstrip('-'), field.startswith('-')
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], backwards=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], backwards=True)
+
+    def encode_cursor(self, row, backwards):
+        payload = {
+            'field': self.field,
+            'value': row_value(row, self.field),
+            'id': row_value(row, self.tiebreak_field),
+            'backwards': backwards,
+        }
+        encoded = base64.urlsafe_b64encode(json.dumps(payload, cls=DjangoJSONEncoder).encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            if cursor['field'] != self.field or not isinstance(cursor['backwards'], bool):
+                raise ValueError
+            if 'value' not in cursor or 'id' not in cursor:
+                raise ValueError
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
@@ -0,0 +1,64 @@
+import csv
+import io
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # optional, ORJSONRenderer falls back to JSONRenderer without it
+    orjson = None
+
+
+# export renderers
+# the export action streams its rows itself, these renderers make ?format=csv|ndjson
+# negotiable and only render the non-streamed responses (errors) in the same format
+class CSVRenderer(BaseRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if isinstance(data, dict):
+            writer.writerows(data.items())
+        elif data is not None:
+            writer.writerow([data])
+        return buffer.getvalue().encode(self.charset)
+
+
+class NDJSONRenderer(BaseRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return (json.dumps(data, cls=DjangoJSONEncoder) + '\n').encode(self.charset)
+
+
+# JSONRenderer output encoded with orjson when it is installed
+# types orjson does not know (Decimal, lazy strings, datetimes so they keep DRF's
+# format) go through DRF's encoder; indented, non-compact and ascii-only output stays on json
+class ORJSONRenderer(JSONRenderer):
+    options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        renderer_context = renderer_context or {}
+        if (orjson is None or self.ensure_ascii or not self.compact
+                or self.get_indent(accepted_media_type, renderer_context) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        ret = orjson.dumps(data, default=self.encoder_class().default, option=self.options)
+        # same escaping as JSONRenderer, keeps the output a strict javascript subset
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+
+# file-like object whose write() hands the line back so csv.writer can feed a generator
+class Echo:
+    def write(self, value):
+        return value
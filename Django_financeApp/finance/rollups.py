@@ -0,0 +1,119 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from . import budgets
+from .models import DailyRollup, Transaction
+
+TRACKED_FIELDS = ('user_id', 'category_id', 'date', 'type', 'amount', 'completed')
+
+
+# rollup column a transaction counts towards
+def rollup_field(type, completed):
+    return f"{type}_{'completed' if completed else 'pending'}"
+
+
+# snapshot of the fields that decide where (and how much) a transaction counts
+# reads __dict__ so deferred fields are never loaded, returns None when one is missing
+def transaction_state(instance):
+    values = instance.__dict__
+    if any(field not in values for field in TRACKED_FIELDS):
+        return None
+    return tuple(values[field] for field in TRACKED_FIELDS)
+
+
+# {(user_id, category_id, date): {field: amount}} for a list of transaction states
+def collect_deltas(states, sign=1):
+    deltas = defaultdict(lambda: defaultdict(Decimal))
+    for user_id, category_id, day, type, amount, completed in states:
+        deltas[(user_id, category_id, day)][rollup_field(type, completed)] += sign * Decimal(str(amount))
+    return deltas
+
+
+def merge_deltas(*groups):
+    merged = defaultdict(lambda: defaultdict(Decimal))
+    for deltas in groups:
+        for key, fields in deltas.items():
+            for field, amount in fields.items():
+                merged[key][field] += amount
+    return merged
+
+
+# applies deltas with F() increments, creating the day's row on first use
+# budget spent counters follow the same deltas
+def apply_deltas(deltas):
+    for (user_id, category_id, day), fields in deltas.items():
+        changes = {field: amount for field, amount in fields.items() if amount}
+        if not changes:
+            continue
+        increments = {field: F(field) + amount for field, amount in changes.items()}
+        rows = DailyRollup.objects.filter(user_id=user_id, category_id=category_id, date=day)
+        if rows.update(**increments):
+            continue
+        try:
+            with transaction.atomic():
+                DailyRollup.objects.create(user_id=user_id, category_id=category_id, date=day, **changes)
+        except IntegrityError:
+            # another writer created the row first
+            rows.update(**increments)
+    budgets.apply_deltas(deltas)
+
+
+# folds a user's rows into the ownerless rows (user NULL) of the same category and
+# day, called before the user is deleted so SET_NULL leaves one row per day and
+# increments for their transactions count once
+def release_user(user_id):
+    fields = ('income_completed', 'expense_completed', 'income_pending', 'expense_pending')
+    with transaction.atomic():
+        rows = DailyRollup.objects.filter(user_id=user_id)
+        deltas = {
+            (None, category_id, day): dict(zip(fields, amounts))
+            for category_id, day, *amounts in rows.values_list('category_id', 'date', *fields)
+        }
+        rows.delete()
+        apply_deltas(deltas)
+
+
+# adds transactions written without signals (bulk_create) to the rollup
+def add_transactions(transactions):
+    apply_deltas(collect_deltas(transaction_state(instance) for instance in transactions))
+
+
+# recomputes the rollup from the transaction table, optionally for some users only
+def rebuild(user_ids=None, batch_size=1000):
+    transactions = Transaction.objects.all()
+    rollups = DailyRollup.objects.all()
+    if user_ids is not None:
+        transactions = transactions.filter(user_id__in=user_ids)
+        rollups = rollups.filter(user_id__in=user_ids)
+
+    zero = Value(0, output_field=models.DecimalField())
+    grouped = transactions.order_by().values('user_id', 'category_id', 'date').annotate(**{
+        field: Coalesce(Sum('amount', filter=Q(type=type, completed=completed)), zero)
+        for field, type, completed in (
+            ('income_completed', 'income', True),
+            ('expense_completed', 'expense', True),
+            ('income_pending', 'income', False),
+            ('expense_pending', 'expense', False),
+        )
+    })
+
+    with transaction.atomic():
+        rollups.delete()
+        created = DailyRollup.objects.bulk_create(
+            (DailyRollup(**row) for row in grouped.iterator(chunk_size=batch_size)),
+            batch_size=batch_size
+        )
+    return len(created)
+
+
+# rollup-backed equivalents of Sum over transactions
+def completed_sum(type, **extra):
+    return Coalesce(Sum(f'{type}_completed', **extra), Value(0, output_field=models.DecimalField()))
+
+
+def pending_sum(type, **extra):
+    return Coalesce(Sum(f'{type}_pending', **extra), Value(0, output_field=models.DecimalField()))
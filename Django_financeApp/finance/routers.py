@@ -0,0 +1,133 @@
+import contextvars
+import hashlib
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from . import caching
+
+# primary/replica routing
+# writes always go to the primary. Reads during a request go to one of
+# FINANCE_REPLICAS, except for requests that write (any unsafe method, or a
+# safe one that writes) and for clients that wrote within the last
+# FINANCE_REPLICA_PIN_SECONDS, so a client always reads its own writes.
+# Clients are told apart by their Authorization header or session cookie,
+# which needs no database lookup. Outside requests (commands, shell) every
+# read goes to the primary.
+# Pins live in FINANCE_REPLICA_PIN_CACHE_ALIAS, which must be shared by every
+# worker: a locmem pin only holds in the worker that took the write, so with a
+# locmem alias replicas are never read.
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PRIMARY_APPS = ('sessions', 'authtoken')  # read right after a login creates them, replicas may lag
+
+current = contextvars.ContextVar('finance_db_routing', default=None)
+
+
+def get_replicas():
+    return getattr(settings, 'FINANCE_REPLICAS', [])
+
+
+def get_cache():
+    return caches[getattr(settings, 'FINANCE_REPLICA_PIN_CACHE_ALIAS', 'default')]
+
+
+# replicas requests may read from, none without a shared pin cache
+def readable_replicas():
+    replicas = get_replicas()
+    return replicas if replicas and caching.is_shared(get_cache()) else []
+
+
+def pin_seconds():
+    return getattr(settings, 'FINANCE_REPLICA_PIN_SECONDS', 10)
+
+
+def client_key(request):
+    identity = request.META.get('HTTP_AUTHORIZATION') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not identity:
+        return None
+    return 'finance:db:pin:' + hashlib.sha256(identity.encode()).hexdigest()
+
+
+class RoutingState:
+    def __init__(self, key, pinned):
+        self.key = key
+        self.pinned = pinned
+        self.wrote = False
+        self.replica = None
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = readable_replicas()
+        state = current.get()
+        if (not replicas or state is None or state.pinned or model._meta.app_label in PRIMARY_APPS
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        if state.replica is None:
+            state.replica = random.choice(replicas)  # one replica per request for consistent reads
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = current.get()
+        if state is not None:
+            state.pinned = state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    # replicas are copies of the primary (see sync_replica), never migrated themselves
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in get_replicas():
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    # sets up the routing state read by PrimaryReplicaRouter for each request
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self.start(request)
+        token = current.set(state)
+        try:
+            return self.get_response(request)
+        finally:
+            current.reset(token)
+            self.finish(state)
+
+    async def __acall__(self, request):
+        state = self.start(request)
+        token = current.set(state)
+        try:
+            return await self.get_response(request)
+        finally:
+            current.reset(token)
+            self.finish(state)
+
+    def start(self, request):
+        key = client_key(request)
+        pinned = request.method not in SAFE_METHODS
+        if not pinned and key is not None and readable_replicas():
+            pinned = get_cache().get(key) is not None
+        return RoutingState(key, pinned)
+
+    def finish(self, state):
+        if state.wrote and state.key is not None and readable_replicas():
+            get_cache().set(state.key, time.time(), pin_seconds())
@@ -0,0 +1,168 @@
+import re
+
+from django.db import connections
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+# full-text search on sqlite FTS5
+# every indexed table has an FTS5 table holding the row's primary key in an `id`
+# column. Searches join on it, never on sqlite's implicit rowid, which table
+# rebuilds (AlterField migrations) and VACUUM may renumber. `id` is an indexed
+# column rather than UNINDEXED so the triggers find a row's entry with MATCH
+# instead of scanning the index; its bm25 weight is 0 and searches only match
+# the text columns. Triggers keep the index in sync on insert, update and
+# delete, so bulk_create and queryset updates and deletes are covered as well as
+# save() and delete(). Terms are prefix matched and results ranked with bm25.
+# Other databases keep DRF's SearchFilter.
+#
+# sqlite migrations that rebuild an indexed table drop its triggers; they are
+# recreated after every migrate (see signals.py) and the entries stay valid.
+
+RANK_ANNOTATION = 'search_rank'
+KEY = 'id'
+
+
+# FTS5 query for the entry of the row with primary key `pk`, as a sql expression
+def key_match(pk):
+    return f"'{KEY} : \"' || {pk} || '\"'"
+
+
+class SearchIndex:
+    def __init__(self, table, source_table, columns, weights, triggers):
+        self.table = table
+        self.source_table = source_table
+        self.columns = columns  # FTS text column -> sql expression over the source row `t`
+        self.weights = weights  # bm25 weight per text column
+        self.triggers = triggers
+
+    def create_statements(self):
+        columns = ', '.join([KEY, *self.columns])
+        weights = ', '.join(str(weight) for weight in (0.0, *self.weights))
+        return [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5({columns}, "
+            f"tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4')",
+            f"INSERT INTO {self.table}({self.table}, rank) VALUES ('rank', 'bm25({weights})')",
+            *self.triggers,
+        ]
+
+    def drop_statements(self):
+        names = re.findall(r'CREATE TRIGGER IF NOT EXISTS (\w+)', '\n'.join(self.triggers))
+        return [f'DROP TRIGGER IF EXISTS {name}' for name in names] + [f'DROP TABLE IF EXISTS {self.table}']
+
+    def populate_statements(self):
+        columns = ', '.join([KEY, *self.columns])
+        expressions = ', '.join([f't.{KEY}', *self.columns.values()])
+        return [
+            f'DELETE FROM {self.table}',
+            f'INSERT INTO {self.table}({columns}) SELECT {expressions} FROM {self.source_table} t',
+            f"INSERT INTO {self.table}({self.table}) VALUES ('optimize')",
+        ]
+
+    # FTS5 column filter limiting a query to the text columns
+    def match(self, query):
+        return f"{{{' '.join(self.columns)}}} : ({query})"
+
+
+TRANSACTION_INDEX = SearchIndex(
+    table='finance_transaction_fts',
+    source_table='finance_transaction',
+    columns={
+        'description': 't.description',
+        'category': '(SELECT name FROM finance_category WHERE id = t.category_id)',
+        'note': 't.note',
+        'client': 't.client',
+    },
+    weights=(10.0, 5.0, 1.0, 3.0),
+    triggers=[
+        """CREATE TRIGGER IF NOT EXISTS finance_transaction_fts_insert AFTER INSERT ON finance_transaction BEGIN
+            INSERT INTO finance_transaction_fts(id, description, category, note, client)
+            VALUES (new.id, new.description, (SELECT name FROM finance_category WHERE id = new.category_id), new.note, new.client);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS finance_transaction_fts_update
+        AFTER UPDATE OF id, description, category_id, note, client ON finance_transaction BEGIN
+            DELETE FROM finance_transaction_fts WHERE finance_transaction_fts MATCH {key_match('old.id')};
+            INSERT INTO finance_transaction_fts(id, description, category, note, client)
+            VALUES (new.id, new.description, (SELECT name FROM finance_category WHERE id = new.category_id), new.note, new.client);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS finance_transaction_fts_delete AFTER DELETE ON finance_transaction BEGIN
+            DELETE FROM finance_transaction_fts WHERE finance_transaction_fts MATCH {key_match('old.id')};
+        END""",
+        # transactions are indexed under their category's name; renames are rare,
+        # so this one scans the index
+        """CREATE TRIGGER IF NOT EXISTS finance_category_name_fts_update AFTER UPDATE OF name ON finance_category BEGIN
+            UPDATE finance_transaction_fts SET category = new.name
+            WHERE id IN (SELECT id FROM finance_transaction WHERE category_id = new.id);
+        END""",
+    ],
+)
+
+CATEGORY_INDEX = SearchIndex(
+    table='finance_category_fts',
+    source_table='finance_category',
+    columns={'name': 't.name', 'description': 't.description'},
+    weights=(10.0, 1.0),
+    triggers=[
+        """CREATE TRIGGER IF NOT EXISTS finance_category_fts_insert AFTER INSERT ON finance_category BEGIN
+            INSERT INTO finance_category_fts(id, name, description) VALUES (new.id, new.name, new.description);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS finance_category_fts_update AFTER UPDATE OF id, name, description ON finance_category BEGIN
+            DELETE FROM finance_category_fts WHERE finance_category_fts MATCH {key_match('old.id')};
+            INSERT INTO finance_category_fts(id, name, description) VALUES (new.id, new.name, new.description);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS finance_category_fts_delete AFTER DELETE ON finance_category BEGIN
+            DELETE FROM finance_category_fts WHERE finance_category_fts MATCH {key_match('old.id')};
+        END""",
+    ],
+)
+
+INDEXES = [TRANSACTION_INDEX, CATEGORY_INDEX]
+
+
+# recreates triggers dropped by a table rebuild, for indexes that exist
+def ensure_triggers(connection):
+    with connection.cursor() as cursor:
+        existing = set(connection.introspection.table_names(cursor))
+        for index in INDEXES:
+            if index.table in existing and index.source_table in existing:
+                for trigger in index.triggers:
+                    cursor.execute(trigger)
+
+
+# drops, recreates and repopulates every index
+def rebuild(connection):
+    with connection.cursor() as cursor:
+        for index in INDEXES:
+            for statement in index.drop_statements() + index.create_statements() + index.populate_statements():
+                cursor.execute(statement)
+
+
+# FTS5 query matching every term of the search as a prefix, or None without terms
+def match_query(search):
+    terms = re.findall(r'\w+', search)
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+# drop-in SearchFilter: views set `search_index` to use FTS, search_fields are still
+# used on databases without FTS5. Results are ordered best match first; paginated
+# views leave that to KeysetPagination, which orders by the rank annotation
+class FullTextSearchFilter(filters.SearchFilter):
+    def filter_queryset(self, request, queryset, view):
+        index = getattr(view, 'search_index', None)
+        if index is None or connections[queryset.db].vendor != 'sqlite':
+            return super().filter_queryset(request, queryset, view)
+
+        query = match_query(request.query_params.get(self.search_param, ''))
+        if query is None:
+            return queryset
+        # join the index so MATCH runs once and every row carries its bm25 rank
+        table = queryset.model._meta.db_table
+        return queryset.extra(
+            tables=[index.table],
+            where=[f'{index.table}.{KEY} = {table}.{KEY}', f'{index.table} MATCH %s'],
+            params=[index.match(query)],
+        ).annotate(**{
+            RANK_ANNOTATION: RawSQL(f'{index.table}.rank', (), output_field=FloatField()),
+        }).order_by(RANK_ANNOTATION)
@@ -1,17 +1,72 @@
 from rest_framework import serializers
+import uuid
+from datetime import date
 from decimal import Decimal
 from django.contrib.auth.models import User
-from .models import Category, Role, Budget, Transaction, Forecast, UserProfile
+from django.utils import timezone
+from rest_framework.utils.serializer_helpers import ReturnList
+from . import lookups, metrics
+from .models import Category, Role, Budget, BudgetAlert, Transaction, Forecast, UserProfile
 
-class UserSerializer(serializers.ModelSerializer):
+# times building response data for the request metrics (see metrics.py)
+# list responses are timed through Meta.list_serializer_class = TimedListSerializer
+class TimedListSerializer(serializers.ListSerializer):
+    @property
+    def data(self):
+        with metrics.stage('serialize'):
+            return super().data
+
+class TimedSerializerMixin:
+    @property
+    def data(self):
+        with metrics.stage('serialize'):
+            return super().data
+
+
+# categories and roles come from the in-process tables of lookups.py
+# LookupRelatedField validates written keys without a query, LookupRelationMixin
+# serializes a nested relation from the table by its key so querysets need not
+# join it; one table snapshot is taken per serializer and used for every row
+class LookupRelatedField(serializers.PrimaryKeyRelatedField):
+    def __init__(self, lookup_table, **kwargs):
+        self.lookup_table = lookup_table
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = uuid.UUID(str(data))
+        except ValueError:
+            self.fail('does_not_exist', pk_value=data)
+        row = self.lookup_table().get(pk)
+        if row is None:
+            self.fail('does_not_exist', pk_value=data)
+        return row
+
+class LookupRelationMixin:
+    lookup_table = None
+
+    def get_attribute(self, instance):
+        pk = getattr(instance, f'{self.source}_id')
+        if pk is None:
+            return None
+        if getattr(self, 'table', None) is None:
+            self.table = self.lookup_table()
+        return self.table.get(pk)
+
+
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = User
+        list_serializer_class = TimedListSerializer
         fields = ('id', 'username', 'email', 'first_name', 'last_name')
         read_only_fields = ('id',)
         
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
+        list_serializer_class = TimedListSerializer
         fields = '__all__'
         read_only_fields = ('id', 'created_at', 'updated_at')
         
@@ -20,9 +75,10 @@ class CategorySerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Name must be at least 3 characters long.")
         return data
 
-class RoleSerializer(serializers.ModelSerializer):
+class RoleSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Role
+        list_serializer_class = TimedListSerializer
         fields = '__all__'
         read_only_fields = ('id', 'created_at', 'updated_at')
         
@@ -30,23 +86,42 @@ class RoleSerializer(serializers.ModelSerializer):
         if len(data['name']) < 3:
             raise serializers.ValidationError("Name must be at least 3 characters long.")
         return data
+
+class LookupCategorySerializer(LookupRelationMixin, CategorySerializer):
+    lookup_table = staticmethod(lookups.categories)
+
+class LookupRoleSerializer(LookupRelationMixin, RoleSerializer):
+    lookup_table = staticmethod(lookups.roles)
         
-class BudgetCategorySerializer(serializers.ModelSerializer):
-    category = CategorySerializer()
+class BudgetCategorySerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    category = LookupCategorySerializer()
     class Meta:
         model = Budget
-        fields = ['id','user', 'category', 'amount', 'start_date','end_date']
-        read_only_fields = ('id', 'created_at', 'updated_at')
+        list_serializer_class = TimedListSerializer
+        fields = ['id','user', 'category', 'amount', 'spent', 'start_date','end_date']
+        read_only_fields = ('id', 'spent', 'created_at', 'updated_at')
 
-class BudgetSerializer(serializers.ModelSerializer):
+class BudgetSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    category = LookupRelatedField(lookups.categories, queryset=Category.objects.all())
     class Meta:
         model = Budget
-        fields = ['user', 'category', 'amount', 'start_date','end_date']
-        read_only_fields = ('id', 'created_at', 'updated_at')
+        list_serializer_class = TimedListSerializer
+        fields = ['user', 'category', 'amount', 'spent', 'start_date','end_date']
+        read_only_fields = ('id', 'spent', 'created_at', 'updated_at')  # spent is kept by budgets.py
+
+class BudgetAlertSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    category = serializers.CharField(source='budget.category.name', read_only=True)
+    class Meta:
+        model = BudgetAlert
+        list_serializer_class = TimedListSerializer
+        fields = ['id', 'budget', 'category', 'threshold', 'spent', 'amount', 'created_at']
+        read_only_fields = fields
 
-class TransactionSerializer(serializers.ModelSerializer):
+class TransactionSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    category = LookupRelatedField(lookups.categories, queryset=Category.objects.all())
     class Meta:
         model = Transaction
+        list_serializer_class = TimedListSerializer
         fields = '__all__'
         read_only_fields = ('id', 'created_at', 'updated_at')
         
@@ -59,31 +134,179 @@ class TransactionSerializer(serializers.ModelSerializer):
         
         return value
    
-class TransactionCategoryUserSerializer(serializers.ModelSerializer):
-    category = CategorySerializer() #nested serializer
+# validates one row of a bulk import without touching the database
+# category is a name (or id) that the import view resolves for all rows in one query
+class TransactionImportSerializer(serializers.Serializer):
+    description = serializers.CharField(max_length=255)
+    category = serializers.CharField(max_length=50)
+    amount = serializers.DecimalField(max_digits=15, decimal_places=2, min_value=Decimal('0.01'))
+    type = serializers.ChoiceField(choices=Transaction.TRANSACTION_TYPES)
+    date = serializers.DateField()
+    client = serializers.CharField(max_length=50, required=False, allow_blank=True, default='')
+    note = serializers.CharField(required=False, allow_blank=True, default='')
+    completed = serializers.BooleanField(required=False, default=False)
+
+class TransactionCategoryUserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    category = LookupCategorySerializer() #nested serializer
     user = UserSerializer(read_only=True)
     
     class Meta:
         model = Transaction
+        list_serializer_class = TimedListSerializer
         fields = '__all__'
         read_only_fields = ('id', 'created_at', 'updated_at')
         
 
 
-    
-class ForecastSerializer(serializers.Serializer):
+
+# same formats as DRF's DateTimeField and DecimalField (values from the database are already quantized)
+# the current timezone is looked up once per list by the caller
+def datetime_string(value, tz):
+    if value.tzinfo is not None:
+        value = value.astimezone(tz)
+    value = value.isoformat()
+    return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+def decimal_string(value):
+    return format(value, 'f')
+
+# read-only list serializer building rows straight from values() dicts
+# same output as TransactionCategoryUserSerializer without per-field dispatch or
+# model instances; other keys (e.g. the search rank) are ignored.
+# `columns` maps each output field to its values() lookup and converter, nested
+# relations to the relation's key lookup (null without the relation) and its columns.
+# Relations in `lookup_relations` are built from their lookups.py table by key,
+# only the key is read from the database
+class FlatTransactionSerializer:
+    columns = {
+        'id': ('id', str),
+        'category': ('category_id', {
+            'id': ('category_id', str),
+            'name': ('category__name', None),
+            'description': ('category__description', None),
+            'created_at': ('category__created_at', datetime_string),
+            'updated_at': ('category__updated_at', datetime_string),
+        }),
+        'user': ('user_id', {
+            'id': ('user_id', None),
+            'username': ('user__username', None),
+            'email': ('user__email', None),
+            'first_name': ('user__first_name', None),
+            'last_name': ('user__last_name', None),
+        }),
+        'description': ('description', None),
+        'amount': ('amount', decimal_string),
+        'type': ('type', None),
+        'date': ('date', date.isoformat),
+        'client': ('client', None),
+        'note': ('note', None),
+        'completed': ('completed', None),
+        'created_at': ('created_at', datetime_string),
+        'updated_at': ('updated_at', datetime_string),
+    }
+    lookup_relations = {'category': lookups.categories}
+
+    def __init__(self, instance=None, many=False, **kwargs):
+        self.instance = instance
+        self.many = many
+        self.timezone = timezone.get_current_timezone()
+
+    @property
+    def data(self):
+        with metrics.stage('serialize'):
+            if self.many:
+                plan = self.plan(self.columns)
+                return ReturnList([build_row(row, plan) for row in self.instance], serializer=self)
+            return self.to_representation(self.instance)
+
+    def to_representation(self, row):
+        return build_row(row, self.plan(self.columns))
+
+    # keeps the fields of a fieldsets.Selection
+    def select(self, selection):
+        self.columns = select_columns(self.columns, selection)
+
+    # values() lookups read by the selected columns
+    def lookups(self):
+        columns = {
+            name: (lookup, None if name in self.lookup_relations else convert)
+            for name, (lookup, convert) in self.columns.items()
+        }
+        return list(dict.fromkeys(column_lookups(columns)))
+
+    # (field, lookup, converter or nested plan) with the current timezone bound
+    def plan(self, columns):
+        tz = self.timezone
+        plan = []
+        for name, (lookup, convert) in columns.items():
+            if isinstance(convert, dict):
+                convert = self.plan(convert)
+                if name in self.lookup_relations:
+                    convert = lookup_relation(self.lookup_relations[name](), name, convert)
+            elif convert is datetime_string:
+                convert = lambda value: datetime_string(value, tz)
+            plan.append((name, lookup, convert))
+        return plan
+
+
+# collapsed relations send their key
+def select_columns(columns, selection):
+    selected = {}
+    for name in selection.names(columns):
+        lookup, convert = columns[name]
+        if isinstance(convert, dict):
+            nested = selection.relation(name)
+            convert = convert['id'][1] if nested is None else select_columns(convert, nested)
+        selected[name] = (lookup, convert)
+    return selected
+
+def column_lookups(columns):
+    for lookup, convert in columns.values():
+        yield lookup
+        if isinstance(convert, dict):
+            yield from column_lookups(convert)
+
+# converter building a nested relation from its lookup table row, once per key
+def lookup_relation(table, name, plan):
+    built = {}
+
+    def convert(pk):
+        if pk not in built:
+            row = table.get(pk)
+            values = {f'{name}__{field.attname}': getattr(row, field.attname) for field in row._meta.concrete_fields}
+            values[f'{name}_id'] = pk
+            built[pk] = build_row(values, plan)
+        return dict(built[pk])
+    return convert
+
+def build_row(row, plan):
+    data = {}
+    for name, lookup, convert in plan:
+        value = row[lookup]
+        if value is None or convert is None:
+            data[name] = value
+        elif type(convert) is list:
+            data[name] = build_row(row, convert)
+        else:
+            data[name] = convert(value)
+    return data
+
+
+class ForecastSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)  # nested serializer
     class Meta:
         model = Forecast
-        fields = ['user', 'opening_balance', 'cash_in', 'cash_out','closing_balance','start_date','end_date']
+        list_serializer_class = TimedListSerializer
+        fields = ['id', 'user', 'opening_balance', 'cash_in', 'cash_out','closing_balance','start_date','end_date']
         read_only_fields = ('id', 'created_at', 'updated_at')
 
       
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
-    role = RoleSerializer(read_only=True)
+    role = LookupRoleSerializer(read_only=True)
 
     class Meta:
         model = UserProfile
+        list_serializer_class = TimedListSerializer
         fields = '__all__'
         read_only_fields = ('id', 'created_at', 'updated_at')
\ No newline at end of file
@@ -0,0 +1,140 @@
+from django.contrib.auth.models import User
+from django.db import connections, transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_init, post_migrate, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from . import authentication, budgets, caching, database, lookups, metrics, rollups, search, sync
+from .models import Budget, Category, Forecast, Role, Transaction
+
+
+# keeps DailyRollup in step with single-row transaction writes
+# bulk writes call rollups.add_transactions themselves
+
+@receiver(post_init, sender=Transaction)
+def remember_rollup_state(sender, instance, **kwargs):
+    instance._rollup_state = rollups.transaction_state(instance)
+
+
+# rows loaded with deferred fields have no snapshot, read the stored values instead
+@receiver(pre_save, sender=Transaction)
+@receiver(pre_delete, sender=Transaction)
+def load_rollup_state(sender, instance, **kwargs):
+    if instance._rollup_state is None and not instance._state.adding:
+        instance._rollup_state = Transaction.objects.filter(pk=instance.pk).values_list(*rollups.TRACKED_FIELDS).first()
+
+
+@receiver(post_save, sender=Transaction)
+def update_rollup_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old = None if created else instance._rollup_state
+    new = rollups.transaction_state(instance)
+    if new is None:
+        new = Transaction.objects.filter(pk=instance.pk).values_list(*rollups.TRACKED_FIELDS).get()
+    rollups.apply_deltas(rollups.merge_deltas(
+        rollups.collect_deltas([old] if old else [], sign=-1),
+        rollups.collect_deltas([new]),
+    ))
+    instance._rollup_state = new
+    invalidate_analytics_cache(new[0], old[0] if old else None)
+
+
+@receiver(post_delete, sender=Transaction)
+def update_rollup_on_delete(sender, instance, **kwargs):
+    if instance._rollup_state:
+        rollups.apply_deltas(rollups.collect_deltas([instance._rollup_state], sign=-1))
+    invalidate_analytics_cache(instance.user_id)
+
+
+# analytic responses cached in caching.py are invalidated by any write they depend on
+# the bump is repeated on commit so a read racing an open transaction cannot
+# cache pre-commit data under the new version
+def invalidate_analytics_cache(*user_ids):
+    caching.invalidate(*user_ids)
+    transaction.on_commit(lambda: caching.invalidate(*user_ids))
+
+
+# a saved budget may have a new user, category or window, its spent counter is
+# recomputed and thresholds it reaches by the change (e.g. a lower amount) alert
+@receiver(pre_save, sender=Budget)
+def refresh_budget_spent(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = None if instance._state.adding else Budget.objects.filter(pk=instance.pk).values_list('amount', 'spent').first()
+    instance._previous_usage = previous or (0, 0)
+    budgets.refresh(instance)
+
+
+@receiver(post_save, sender=Budget)
+def alert_on_budget_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    budgets.write_alerts([(instance.pk, instance.amount, instance.spent, *instance._previous_usage)])
+
+
+@receiver(post_save, sender=Budget)
+@receiver(post_delete, sender=Budget)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_on_change(sender, instance, **kwargs):
+    invalidate_analytics_cache(getattr(instance, 'user_id', None))
+
+
+# in-process category and role tables (lookups.py) reload in every worker after a write
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Role)
+@receiver(post_delete, sender=Role)
+def invalidate_lookup_table(sender, instance, **kwargs):
+    lookups.invalidate(sender)
+
+
+# deletes are kept as tombstones for /sync/ clients (see sync.py)
+@receiver(post_delete, sender=Transaction)
+@receiver(post_delete, sender=Budget)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Forecast)
+def record_sync_tombstone(sender, instance, **kwargs):
+    sync.record_deletion(instance)
+
+
+# a deleted user's rollup rows join the ownerless rows before SET_NULL would duplicate them
+@receiver(pre_delete, sender=User)
+def release_user_rollups(sender, instance, **kwargs):
+    rollups.release_user(instance.pk)
+
+
+# cached token lookups (authentication.py) must not outlive the token or a change to its user
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    authentication.invalidate(instance.key)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    if not created:
+        authentication.invalidate(*Token.objects.filter(user=instance).values_list('key', flat=True))
+
+
+# count every connection's queries in the request metrics
+@receiver(connection_created)
+def install_query_metrics(sender, connection, **kwargs):
+    metrics.install(connection)
+
+
+# sqlite pragmas for the database profile (FINANCE_SQLITE_PRAGMAS)
+@receiver(connection_created)
+def configure_database_connection(sender, connection, **kwargs):
+    database.configure_connection(connection)
+
+
+# sqlite drops a table's triggers when a migration rebuilds it, put the search index triggers back
+@receiver(post_migrate)
+def restore_search_triggers(sender, using, **kwargs):
+    if sender.name != 'finance':
+        return
+    connection = connections[using]
+    if connection.vendor == 'sqlite':
+        search.ensure_triggers(connection)
@@ -0,0 +1,77 @@
+import atexit
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# monte carlo cash runway simulation
+# kept free of django imports so pool workers only need numpy
+# paths are simulated in chunks, each chunk in one vectorised pass, and the
+# chunks are spread over a process pool. Its workers are started by a fork server
+# (spawn where that is unavailable), never forked from a request handler, whose
+# other threads may hold locks the child would inherit.
+
+CHUNK_SIZE = 10000  # paths per task
+
+_pool = None
+_pool_workers = None
+
+
+def get_pool(workers):
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=pool_context())
+        _pool_workers = workers
+    return _pool
+
+
+def pool_context():
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return multiprocessing.get_context(method)
+
+
+@atexit.register
+def shutdown_pool():
+    if _pool is not None:
+        _pool.shutdown(wait=False)
+
+
+# week-end balances and whether the balance dipped below zero during each week
+# for `paths` bootstrap paths of daily flows
+def simulate_chunk(flows, opening_balance, weeks, paths, seed):
+    rng = np.random.default_rng(seed)
+    draws = flows[rng.integers(0, flows.size, size=(paths, weeks * 7))]
+    balances = (opening_balance + np.cumsum(draws, axis=1)).reshape(paths, weeks, 7)
+    return balances[:, :, -1], balances.min(axis=2) < 0
+
+
+# P10/P50/P90 week closing balances and probability of going negative per week
+def simulate(flows, opening_balance, weeks, paths, workers=None, seed=None):
+    flows = np.asarray(flows, dtype=np.float64)
+    if flows.size == 0:
+        flows = np.zeros(1)
+    workers = workers or os.cpu_count() or 1
+
+    sizes = [CHUNK_SIZE] * (paths // CHUNK_SIZE)
+    if paths % CHUNK_SIZE:
+        sizes.append(paths % CHUNK_SIZE)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    args = [(flows, opening_balance, weeks, size, chunk_seed) for size, chunk_seed in zip(sizes, seeds)]
+
+    if workers == 1 or len(args) == 1:
+        chunks = [simulate_chunk(*chunk) for chunk in args]
+    else:
+        chunks = list(get_pool(workers).map(simulate_chunk, *zip(*args)))
+
+    closing = np.concatenate([chunk[0] for chunk in chunks])
+    negative = np.concatenate([chunk[1] for chunk in chunks])
+    p10, p50, p90 = np.percentile(closing, [10, 50, 90], axis=0)
+    return {
+        'p10': p10,
+        'p50': p50,
+        'p90': p90,
+        'probability_negative': negative.mean(axis=0),
+    }
@@ -0,0 +1,159 @@
+import base64
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from .models import Budget, Category, Forecast, SyncTombstone, Transaction
+from .pagination import row_value
+from .serializers import BudgetCategorySerializer, CategorySerializer, FlatTransactionSerializer, ForecastSerializer
+
+# delta sync
+# clients keep a local copy of the collections below and send back the token of
+# their last sync; /sync/ returns only the rows created or updated since then
+# (by updated_at) and the ids deleted since then (from SyncTombstone).
+# The token holds an (updated_at, id) cursor per collection. Once a collection
+# is caught up its cursor moves to FINANCE_SYNC_OVERLAP_SECONDS before the sync
+# started, so rows saved by transactions still open at that moment are sent
+# next time; clients apply rows idempotently. A missing token or one older than
+# the tombstone retention gets a full snapshot with reset=true.
+# Reads always go to the primary: rows a lagging replica has not seen yet would
+# otherwise fall behind the cursor and never be sent.
+
+MAX_LIMIT = 5000
+
+
+def overlap_seconds():
+    return getattr(settings, 'FINANCE_SYNC_OVERLAP_SECONDS', 5)
+
+
+def tombstone_days():
+    return getattr(settings, 'FINANCE_SYNC_TOMBSTONE_DAYS', 30)
+
+
+def transactions(user):
+    return Transaction.objects.values(*FlatTransactionSerializer().lookups())
+
+
+def budgets(user):
+    return Budget.objects.all()
+
+
+def categories(user):
+    return Category.objects.all()
+
+
+# own rows only unless staff, as in ForecastViewSet
+def forecasts(user):
+    rows = Forecast.objects.select_related('user')
+    return rows if user.is_staff else rows.filter(user=user)
+
+
+# collection -> (model, rows visible to a user, serializer), each as in its list endpoint
+COLLECTIONS = {
+    'transactions': (Transaction, transactions, FlatTransactionSerializer),
+    'budgets': (Budget, budgets, BudgetCategorySerializer),
+    'categories': (Category, categories, CategorySerializer),
+    'forecasts': (Forecast, forecasts, ForecastSerializer),
+}
+OWNED_COLLECTIONS = ('forecasts',)
+COLLECTION_NAMES = {model: name for name, (model, _, _) in COLLECTIONS.items()}
+
+
+# called by the post_delete signal of every synced model
+def record_deletion(instance):
+    SyncTombstone.objects.create(
+        collection=COLLECTION_NAMES[type(instance)],
+        object_id=str(instance.pk),
+        user_id=getattr(instance, 'user_id', None),
+    )
+
+
+def encode_token(token):
+    return base64.urlsafe_b64encode(json.dumps(token).encode()).decode()
+
+
+# raises ValueError for anything that is not a token issued by changes()
+def decode_token(encoded):
+    try:
+        token = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+        at = parse_datetime(token['at'])
+        cursors = {name: decode_cursor(cursor) for name, cursor in token['cursors'].items() if name in COLLECTIONS}
+        deleted = decode_cursor(token['deleted'])
+    except (TypeError, ValueError, KeyError, AttributeError):
+        raise ValueError('Invalid sync token.')
+    if at is None:
+        raise ValueError('Invalid sync token.')
+    return {'at': at, 'cursors': cursors, 'deleted': deleted}
+
+
+def encode_cursor(cursor):
+    moment, pk = cursor
+    return [moment.isoformat(), pk if pk is None or isinstance(pk, int) else str(pk)]
+
+
+def decode_cursor(cursor):
+    moment, pk = cursor
+    moment = parse_datetime(moment)
+    if moment is None:
+        raise ValueError
+    return moment, pk
+
+
+# up to `limit` rows after the (time, id) cursor and the cursor to continue from
+# an id of None starts at the time itself; caught up cursors fall back to `horizon`
+def page(queryset, field, cursor, limit, horizon):
+    if cursor is not None:
+        moment, pk = cursor
+        if pk is None:
+            queryset = queryset.filter(**{f'{field}__gte': moment})
+        else:
+            queryset = queryset.filter(Q(**{f'{field}__gt': moment}) | Q(**{field: moment, 'id__gt': pk}))
+    rows = list(queryset.order_by(field, 'id')[:limit + 1])
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, (row_value(rows[-1], field), row_value(rows[-1], 'id')), True
+    return rows, (horizon, None), False
+
+
+def changes(user, token, limit, now):
+    horizon = now - timedelta(seconds=overlap_seconds())
+    reset = token is None or token['at'] < now - timedelta(days=tombstone_days())
+    cursors = {} if reset else token['cursors']
+
+    payload = {}
+    next_cursors = {}
+    has_more = False
+    for name, (model, visible, serializer_class) in COLLECTIONS.items():
+        rows, next_cursors[name], more = page(
+            visible(user).using(DEFAULT_DB_ALIAS), 'updated_at', cursors.get(name), limit, horizon
+        )
+        payload[name] = {'updated': serializer_class(rows, many=True).data, 'deleted': []}
+        has_more |= more
+
+    # a snapshot has nothing to delete, later deletes are picked up from its start
+    deleted_cursor = (horizon, None)
+    if not reset:
+        tombstones = SyncTombstone.objects.using(DEFAULT_DB_ALIAS)
+        if not user.is_staff:
+            tombstones = tombstones.filter(~Q(collection__in=OWNED_COLLECTIONS) | Q(user=user))
+        rows, deleted_cursor, more = page(tombstones, 'deleted_at', token['deleted'], limit, horizon)
+        for tombstone in rows:
+            payload[tombstone.collection]['deleted'].append(tombstone.object_id)
+        has_more |= more
+
+    next_token = {
+        'at': now.isoformat(),
+        'cursors': {name: encode_cursor(cursor) for name, cursor in next_cursors.items()},
+        'deleted': encode_cursor(deleted_cursor),
+    }
+    return {'token': encode_token(next_token), 'reset': reset, 'has_more': has_more, 'changes': payload}
+
+
+# drops tombstones older than the retention, tokens that old get a snapshot instead
+def prune_tombstones(now):
+    expired = SyncTombstone.objects.filter(deleted_at__lt=now - timedelta(days=tombstone_days()))
+    return expired.delete()[0]
@@ -1,3 +1,1606 @@
-from django.test import TestCase
+import io
+import json
+import tempfile
+import time
+import uuid
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import skipIf
 
-# Create your tests here.
+import numpy as np
+
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, connections
+from django.db.models import F
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient
+
+from . import authentication, budgets, caching, database, forecasting, lookups, metrics, rollups, routers, search, simulation, sync
+from .management.commands import explain_queries
+from .renderers import ORJSONRenderer, orjson
+from .serializers import TransactionCategoryUserSerializer
+from .models import Budget, BudgetAlert, Category, DailyRollup, Forecast, Role, SyncTombstone, Transaction, UserProfile
+
+
+# a file cache stands in for a backend shared by every worker such as redis
+SHARED_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'shared': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+               'LOCATION': f'{tempfile.gettempdir()}/finance-test-shared-cache'},
+}
+
+
+class FinanceAPITestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='founder', password='secret-pass-123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def make_category(self, name):
+        return Category.objects.create(name=name)
+
+    def make_transaction(self, category, amount, type='expense', completed=True, on=None, user=None):
+        return Transaction.objects.create(
+            description='test',
+            user=user or self.user,
+            category=category,
+            amount=Decimal(amount),
+            type=type,
+            date=on or date.today(),
+            completed=completed,
+        )
+
+    # asserts a list endpoint returns `rows` rows using at most `max_queries`
+    # queries, so a serializer that lazily loads relations fails loudly
+    def assertListQueries(self, url, rows, max_queries, **params):
+        queries, response = self.count_queries(url, **params)
+        results = response.data['results'] if isinstance(response.data, dict) else response.data
+        self.assertEqual(len(results), rows)
+        self.assertLessEqual(queries, max_queries, f'{url} issued {queries} queries for {rows} rows')
+        return response
+
+    # the category and role tables (lookups.py) load once per worker, counts are taken warm
+    def count_queries(self, url, **params):
+        lookups.categories()
+        lookups.roles()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(ctx.captured_queries), response
+
+
+class BudgetProgressTests(FinanceAPITestCase):
+    url = '/api/budgets/progress/'
+
+    def make_budget(self, category, amount):
+        start = date.today().replace(day=1)
+        return Budget.objects.create(
+            user=self.user, category=category, amount=Decimal(amount),
+            start_date=start, end_date=start + timedelta(days=27),
+        )
+
+    def test_progress_sums_completed_expenses_in_window(self):
+        rent = self.make_category('Rent')
+        budget = self.make_budget(rent, '1000')
+        self.make_transaction(rent, '250', on=budget.start_date)
+        self.make_transaction(rent, '100', completed=False, on=budget.start_date)
+        self.make_transaction(rent, '500', type='income', on=budget.start_date)
+        self.make_transaction(rent, '75', on=budget.start_date - timedelta(days=1))
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(len(response.data), 1)
+        row = response.data[0]
+        self.assertEqual(row['category'], 'Rent')
+        self.assertEqual(row['amount_spent'], Decimal('250'))
+        self.assertEqual(row['amount_remaining'], Decimal('750'))
+        self.assertEqual(row['percentage_used'], Decimal('25'))
+
+    def test_progress_ignores_other_users(self):
+        rent = self.make_category('Rent')
+        budget = self.make_budget(rent, '1000')
+        other = User.objects.create_user(username='other', password='secret-pass-123')
+        self.make_transaction(rent, '400', on=budget.start_date, user=other)
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.data[0]['amount_spent'], Decimal('0'))
+
+    def test_progress_query_count_is_constant(self):
+        categories = [self.make_category(f'Category {i}') for i in range(20)]
+        self.make_budget(categories[0], '100')
+        baseline, _ = self.count_queries(self.url)
+
+        for category in categories[1:]:
+            self.make_budget(category, '100')
+            self.make_transaction(category, '10', on=date.today().replace(day=1))
+        queries, response = self.count_queries(self.url)
+
+        self.assertEqual(len(response.data), 20)
+        self.assertEqual(queries, baseline)
+
+
+class ForecastProjectionTests(FinanceAPITestCase):
+    url = '/api/forecasts/summary13week/'
+
+    def test_projection_folds_pending_transactions_into_weeks(self):
+        sales = self.make_category('Sales')
+        today = date.today()
+        self.make_transaction(sales, '1000', type='income', on=today - timedelta(days=40))
+        self.make_transaction(sales, '300', type='income', completed=False, on=today + timedelta(days=8))
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(len(response.data), 13)
+        first, second = response.data[0], response.data[1]
+        self.assertEqual(first['opening_balance'], 1000.0)
+        self.assertEqual(first['cash_in'], 0.0)
+        self.assertEqual(second['cash_in'], 300.0)
+        self.assertEqual(second['opening_balance'], first['closing_balance'])
+        self.assertEqual(response.data[-1]['closing_balance'], 1300.0)
+
+    def test_projection_query_count_does_not_grow_with_horizon(self):
+        short, _ = self.count_queries(self.url, periods=4)
+        long, response = self.count_queries(self.url, periods=52)
+
+        self.assertEqual(len(response.data), 52)
+        self.assertEqual(short, long)
+
+    def test_projection_month_buckets(self):
+        response = self.client.get(self.url, {'bucket': 'month', 'periods': 3})
+
+        self.assertEqual(len(response.data), 3)
+        self.assertEqual(response.data[1]['week_start'], response.data[0]['week_end'] + timedelta(days=1))
+
+    def test_projection_rejects_unknown_bucket(self):
+        response = self.client.get(self.url, {'bucket': 'year'})
+
+        self.assertEqual(response.status_code, 400)
+
+
+class TransactionSummaryTests(FinanceAPITestCase):
+    url = '/api/transactions/summary/'
+
+    def test_summary_totals(self):
+        sales = self.make_category('Sales')
+        self.make_transaction(sales, '500', type='income')
+        self.make_transaction(sales, '200')
+        self.make_transaction(sales, '50', type='income', completed=False)
+        self.make_transaction(sales, '20', completed=False)
+
+        queries, response = self.count_queries(self.url)
+
+        self.assertEqual(queries, 1)
+        self.assertEqual(response.data['completed']['total_income'], Decimal('500'))
+        self.assertEqual(response.data['completed']['total_expenses'], Decimal('200'))
+        self.assertEqual(response.data['completed']['net_amount'], Decimal('300'))
+        self.assertEqual(response.data['completed']['burn_rate'], Decimal('1.5'))
+        self.assertEqual(response.data['pending']['net_amount'], Decimal('30'))
+
+    def test_summary_scoping(self):
+        sales = self.make_category('Sales')
+        rent = self.make_category('Rent')
+        self.make_transaction(sales, '500', type='income', on=date(2024, 1, 10))
+        self.make_transaction(rent, '200', on=date(2024, 2, 10))
+
+        by_date = self.client.get(self.url, {'start_date': '2024-02-01', 'end_date': '2024-02-28'})
+        by_category = self.client.get(self.url, {'category': str(sales.id)})
+
+        self.assertEqual(by_date.data['completed']['total_income'], 0)
+        self.assertEqual(by_date.data['completed']['total_expenses'], Decimal('200'))
+        self.assertEqual(by_category.data['completed']['total_income'], Decimal('500'))
+        self.assertEqual(by_category.data['completed']['total_expenses'], 0)
+
+    def test_summary_rejects_bad_scope(self):
+        response = self.client.get(self.url, {'start_date': 'yesterday'})
+
+        self.assertEqual(response.status_code, 400)
+
+
+class ListQueryCountTests(FinanceAPITestCase):
+    rows = 1000
+
+    def setUp(self):
+        super().setUp()
+        self.categories = Category.objects.bulk_create(
+            [Category(name=f'Category {i}') for i in range(50)]
+        )
+        self.users = User.objects.bulk_create(
+            [User(username=f'user{i}') for i in range(20)]
+        )
+
+    def test_transaction_list(self):
+        Transaction.objects.bulk_create([
+            Transaction(
+                description=f'row {i}', user=self.users[i % 20], category=self.categories[i % 50],
+                amount=Decimal('10'), type='expense', date=date.today(),
+            )
+            for i in range(self.rows)
+        ])
+
+        self.assertListQueries('/api/transactions/', self.rows, max_queries=1, page_size=self.rows)
+
+    def test_budget_list(self):
+        Budget.objects.bulk_create([
+            Budget(
+                user=self.users[i % 20], category=self.categories[i % 50], amount=Decimal('100'),
+                start_date=date.today(), end_date=date.today(),
+            )
+            for i in range(self.rows)
+        ])
+
+        self.assertListQueries('/api/budgets/', self.rows, max_queries=1)
+
+    def test_profile_list(self):
+        self.user.is_staff = True
+        self.user.save()
+        roles = Role.objects.bulk_create([Role(name=f'Role {i}') for i in range(5)])
+        users = User.objects.bulk_create([User(username=f'member{i}') for i in range(self.rows)])
+        UserProfile.objects.bulk_create([
+            UserProfile(user=user, role=roles[i % 5]) for i, user in enumerate(users)
+        ])
+
+        self.assertListQueries('/api/profiles/', self.rows, max_queries=1)
+
+
+class TransactionPaginationTests(FinanceAPITestCase):
+    url = '/api/transactions/'
+
+    def setUp(self):
+        super().setUp()
+        sales = self.make_category('Sales')
+        # several rows share a date so the id tiebreak is exercised
+        Transaction.objects.bulk_create([
+            Transaction(
+                description=f'row {i}', user=self.user, category=sales, amount=Decimal(i + 1),
+                type='income', date=date(2024, 1, 1) + timedelta(days=i // 3),
+            )
+            for i in range(25)
+        ])
+
+    def walk(self, response, link):
+        ids = []
+        while True:
+            ids.extend(row['id'] for row in response.data['results'])
+            if not response.data[link]:
+                return ids
+            response = self.client.get(response.data[link])
+
+    def test_forward_walk_visits_every_row_once_in_order(self):
+        first = self.client.get(self.url, {'page_size': 4})
+
+        ids = self.walk(first, 'next')
+
+        expected = [str(pk) for pk in Transaction.objects.order_by('-date', '-id').values_list('id', flat=True)]
+        self.assertEqual(ids, expected)
+        self.assertIsNone(first.data['previous'])
+
+    def test_backward_walk_returns_previous_pages(self):
+        first = self.client.get(self.url, {'page_size': 4, 'ordering': 'amount'})
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+
+        self.assertEqual(back.data['results'], first.data['results'])
+        self.assertIsNone(back.data['previous'])
+        self.assertEqual([row['amount'] for row in first.data['results']], ['1.00', '2.00', '3.00', '4.00'])
+
+    def test_page_query_count_is_flat(self):
+        first_queries, first = self.count_queries(self.url, page_size=5)
+        response = first
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+        last_queries, _ = self.count_queries(response.data['previous'])
+
+        self.assertEqual(first_queries, last_queries)
+
+    def test_filtered_pages_keep_the_filters(self):
+        rent = self.make_category('Rent')
+        for i in range(5):
+            self.make_transaction(rent, '10', on=date(2024, 2, 1) + timedelta(days=i))
+
+        first = self.client.get(self.url, {'page_size': 2, 'type': 'expense', 'category__name': 'Rent'})
+        ids = self.walk(first, 'next')
+
+        self.assertEqual(len(ids), 5)
+        self.assertEqual(len(self.client.get(self.url, {'completed': 'true'}).data['results']), 5)
+        response = self.client.get(self.url, {'completed': 'maybe'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', response.data)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {'cursor': 'not-a-cursor'})
+
+        self.assertEqual(response.status_code, 404)
+
+
+class TransactionExportTests(FinanceAPITestCase):
+    url = '/api/transactions/export/'
+
+    def setUp(self):
+        super().setUp()
+        sales = self.make_category('Sales')
+        rent = self.make_category('Rent')
+        self.make_transaction(sales, '120.50', type='income', on=date(2024, 1, 2))
+        self.make_transaction(rent, '80', on=date(2024, 1, 1))
+
+    def test_csv_export_streams_ordered_rows(self):
+        response = self.client.get(self.url, {'format': 'csv', 'ordering': 'date'})
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertTrue(lines[0].startswith('id,date,description,type,amount'))
+        self.assertEqual(len(lines), 3)
+        self.assertIn(',Rent,', lines[1])
+        self.assertIn(',120.50,', lines[2])
+
+    def test_ndjson_export_respects_search(self):
+        response = self.client.get(self.url, {'format': 'ndjson', 'search': 'Rent'})
+
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['category'], 'Rent')
+        self.assertEqual(rows[0]['amount'], '80.00')
+        self.assertEqual(rows[0]['user'], 'founder')
+
+
+class TransactionImportTests(FinanceAPITestCase):
+    url = '/api/transactions/import/'
+
+    def setUp(self):
+        super().setUp()
+        self.sales = self.make_category('Sales')
+        self.rent = self.make_category('Rent')
+
+    def row(self, **overrides):
+        row = {'description': 'invoice', 'category': 'Sales', 'amount': '100.00', 'type': 'income', 'date': '2024-03-01'}
+        row.update(overrides)
+        return row
+
+    def test_json_import_uses_constant_queries(self):
+        rows = [self.row(category='Rent' if i % 2 else 'Sales') for i in range(300)]
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(f'{self.url}?batch_size=50', rows, format='json')
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['created'], 300)
+        self.assertEqual(Transaction.objects.filter(category=self.rent, user=self.user).count(), 150)
+        statements = [query['sql'] for query in ctx.captured_queries]
+        self.assertEqual(sum(sql.startswith('INSERT INTO "finance_transaction"') for sql in statements), 6)
+        self.assertEqual(sum(sql.startswith('SELECT') for sql in statements), 1)
+
+    def test_csv_import(self):
+        upload = SimpleUploadedFile('statement.csv', (
+            'description,category,amount,type,date,completed\n'
+            'rent,Rent,900,expense,2024-03-01,true\n'
+            f'sale,{self.sales.id},50.5,income,2024-03-02,false\n'
+        ).encode())
+
+        response = self.client.post(self.url, {'file': upload}, format='multipart')
+
+        self.assertEqual(response.status_code, 201, response.data)
+        rent = Transaction.objects.get(category=self.rent)
+        self.assertTrue(rent.completed)
+        self.assertEqual(rent.amount, Decimal('900'))
+        self.assertEqual(Transaction.objects.get(category=self.sales).amount, Decimal('50.50'))
+
+    def test_invalid_rows_are_reported_and_nothing_is_written(self):
+        rows = [self.row(), self.row(amount='-5'), self.row(category='Unknown')]
+
+        response = self.client.post(self.url, rows, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['row'] for error in response.data['errors']], [1, 2])
+        self.assertIn('amount', response.data['errors'][0]['errors'])
+        self.assertIn('category', response.data['errors'][1]['errors'])
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_skip_invalid_imports_valid_rows(self):
+        rows = [self.row(), self.row(type='refund')]
+
+        response = self.client.post(f'{self.url}?skip_invalid=true', rows, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(len(response.data['errors']), 1)
+
+
+class DailyRollupTests(FinanceAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.sales = self.make_category('Sales')
+        self.rent = self.make_category('Rent')
+
+    def snapshot(self):
+        return sorted(
+            DailyRollup.objects.exclude(
+                income_completed=0, expense_completed=0, income_pending=0, expense_pending=0
+            ).values_list('user_id', 'category_id', 'date', 'income_completed', 'expense_completed',
+                          'income_pending', 'expense_pending')
+        )
+
+    def assertRollupMatchesRebuild(self):
+        incremental = self.snapshot()
+        rollups.rebuild()
+        self.assertEqual(incremental, self.snapshot())
+
+    def test_create_update_and_delete_keep_rollup_current(self):
+        day = date(2024, 5, 1)
+        sale = self.make_transaction(self.sales, '100', type='income', completed=False, on=day)
+        rent = self.make_transaction(self.rent, '40', on=day)
+        self.make_transaction(self.rent, '60', on=day)
+
+        row = DailyRollup.objects.get(category=self.rent, date=day)
+        self.assertEqual(row.expense_completed, Decimal('100'))
+
+        sale.completed = True
+        sale.amount = Decimal('120')
+        sale.save()
+        rent.date = day + timedelta(days=1)
+        rent.category = self.sales
+        rent.save()
+        self.assertRollupMatchesRebuild()
+
+        Transaction.objects.get(pk=rent.pk).delete()
+        Transaction.objects.filter(category=self.rent).delete()
+        self.assertRollupMatchesRebuild()
+
+    def test_deferred_update_reads_stored_state(self):
+        sale = self.make_transaction(self.sales, '100', type='income')
+        deferred = Transaction.objects.only('id', 'description').get(pk=sale.pk)
+        deferred.completed = False
+        deferred.save()
+
+        self.assertRollupMatchesRebuild()
+        self.assertEqual(DailyRollup.objects.get(category=self.sales).income_pending, Decimal('100'))
+
+    def test_bulk_import_updates_rollup(self):
+        rows = [
+            {'description': 'sale', 'category': 'Sales', 'amount': '10', 'type': 'income', 'date': '2024-05-01'}
+            for _ in range(5)
+        ]
+        self.client.post('/api/transactions/import/', rows, format='json')
+
+        self.assertEqual(DailyRollup.objects.get(category=self.sales).income_pending, Decimal('50'))
+        self.assertRollupMatchesRebuild()
+
+    def test_deleted_users_share_one_ownerless_row(self):
+        day = date(2024, 5, 1)
+        other = User.objects.create_user(username='cofounder', password='secret-pass-123')
+        sale = self.make_transaction(self.sales, '100', type='income', on=day)
+        self.make_transaction(self.sales, '30', type='income', on=day, user=other)
+
+        User.objects.filter(pk__in=[self.user.pk, other.pk]).delete()
+        row = DailyRollup.objects.get(user=None, category=self.sales, date=day)
+        self.assertEqual(row.income_completed, Decimal('130'))
+
+        # an ownerless transaction's edit is counted once
+        sale = Transaction.objects.get(pk=sale.pk)
+        sale.amount = Decimal('120')
+        sale.save()
+        self.assertEqual(DailyRollup.objects.get(pk=row.pk).income_completed, Decimal('150'))
+        self.assertRollupMatchesRebuild()
+
+
+class AnalyticsCacheTests(FinanceAPITestCase):
+    url = '/api/forecasts/summary13week/'
+
+    def setUp(self):
+        super().setUp()
+        self.sales = self.make_category('Sales')
+        self.make_transaction(self.sales, '100', type='income', on=date.today() - timedelta(days=1))
+
+    def test_repeat_request_is_served_from_cache(self):
+        first_queries, first = self.count_queries(self.url)
+        second_queries, second = self.count_queries(self.url)
+
+        self.assertGreater(first_queries, 0)
+        self.assertEqual(second_queries, 0)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_conditional_request_returns_not_modified(self):
+        first = self.client.get(self.url)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_write_invalidates_cached_response(self):
+        first = self.client.get(self.url)
+        self.make_transaction(self.sales, '50', type='income', on=date.today() - timedelta(days=1))
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['opening_balance'], 150.0)
+
+    def test_other_users_writes_keep_user_scoped_cache(self):
+        self.client.get(self.url)
+        other = User.objects.create_user(username='other', password='secret-pass-123')
+        self.make_transaction(self.sales, '50', type='income', user=other)
+
+        queries, _ = self.count_queries(self.url)
+
+        self.assertEqual(queries, 0)
+
+    def test_global_summary_is_invalidated_by_any_user(self):
+        self.client.get('/api/transactions/summary/')
+        other = User.objects.create_user(username='other', password='secret-pass-123')
+        self.make_transaction(self.sales, '50', type='income', user=other)
+
+        response = self.client.get('/api/transactions/summary/')
+
+        self.assertEqual(response.data['completed']['total_income'], Decimal('150'))
+
+
+class ForecastModelTests(FinanceAPITestCase):
+    url = '/api/forecasts/projection/'
+
+    def setUp(self):
+        super().setUp()
+        self.sales = self.make_category('Sales')
+        # 8 weeks of history: 70 income every monday, nothing on other days
+        today = date.today()
+        for offset in range(1, 57):
+            day = today - timedelta(days=offset)
+            if day.weekday() == 0:
+                self.make_transaction(self.sales, '70', type='income', on=day)
+
+    def test_weekday_model_repeats_weekly_pattern(self):
+        response = self.client.get(self.url, {'model': 'weekday', 'bucket': 'day', 'periods': 14})
+
+        self.assertEqual(len(response.data), 14)
+        nets = {row['period_start'].weekday(): row['net_cash'] for row in response.data}
+        self.assertEqual(nets[0], 70.0)
+        self.assertEqual(nets[3], 0.0)
+        self.assertEqual(response.data[0]['opening_balance'], 560.0)
+        self.assertEqual(response.data[-1]['closing_balance'], 700.0)
+
+    def test_moving_average_spreads_weekly_income(self):
+        response = self.client.get(self.url, {'model': 'moving_average', 'periods': 2})
+
+        self.assertAlmostEqual(response.data[0]['net_cash'], 70.0, delta=10)
+        self.assertEqual(response.data[1]['opening_balance'], response.data[0]['closing_balance'])
+
+    def test_all_models_in_one_request(self):
+        queries, response = self.count_queries(self.url, model='all', bucket='month', periods=60)
+
+        self.assertEqual(set(response.data), set(forecasting.MODELS))
+        self.assertEqual(len(response.data['seasonal']), 60)
+        self.assertEqual(queries, 1)
+
+    def test_unknown_model(self):
+        response = self.client.get(self.url, {'model': 'oracle'})
+
+        self.assertEqual(response.status_code, 400)
+
+
+class RunwaySimulationTests(FinanceAPITestCase):
+    url = '/api/forecasts/runway/'
+
+    def setUp(self):
+        super().setUp()
+        sales = self.make_category('Sales')
+        today = date.today()
+        # funding outside the resampled year, then a month of spending
+        self.make_transaction(sales, '3000', type='income', on=today - timedelta(days=400))
+        for offset in range(1, 31):
+            self.make_transaction(sales, '60', on=today - timedelta(days=offset))
+
+    def test_bands_are_ordered_and_reproducible(self):
+        first = self.client.get(self.url, {'paths': 2000, 'weeks': 8, 'seed': 7})
+        cache.clear()
+        second = self.client.get(self.url, {'paths': 2000, 'weeks': 8, 'seed': 7})
+
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(first.data['opening_balance'], 1200.0)
+        self.assertEqual(len(first.data['weeks']), 8)
+        for week in first.data['weeks']:
+            self.assertLessEqual(week['p10'], week['p50'])
+            self.assertLessEqual(week['p50'], week['p90'])
+
+    def test_probability_of_going_negative_grows(self):
+        response = self.client.get(self.url, {'paths': 5000, 'weeks': 52, 'seed': 1})
+
+        weeks = response.data['weeks']
+        self.assertEqual(weeks[0]['probability_negative'], 0)
+        self.assertGreater(weeks[-1]['probability_negative'], 0.5)
+
+    def test_pool_and_inline_runs_agree(self):
+        flows = np.array([-10.0, 5.0, 0.0])
+        inline = simulation.simulate(flows, 100.0, 4, 25000, workers=1, seed=3)
+        pooled = simulation.simulate(flows, 100.0, 4, 25000, workers=2, seed=3)
+
+        np.testing.assert_array_equal(inline['p50'], pooled['p50'])
+        np.testing.assert_array_equal(inline['probability_negative'], pooled['probability_negative'])
+        self.assertNotEqual(simulation.get_pool(2)._mp_context.get_start_method(), 'fork')
+
+    def test_invalid_params(self):
+        response = self.client.get(self.url, {'paths': 0})
+
+        self.assertEqual(response.status_code, 400)
+
+
+class MaterializeForecastTests(FinanceAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.sales = self.make_category('Sales')
+        self.sale = self.make_transaction(self.sales, '500', type='income', on=date.today() - timedelta(days=3))
+
+    def materialize(self, **options):
+        call_command('materialize_forecasts', workers=1, stdout=io.StringIO(), **options)
+
+    def test_rows_match_live_projection(self):
+        self.materialize()
+
+        live = self.client.get('/api/forecasts/summary13week/').data
+        rows = self.client.get('/api/forecasts/').data
+        self.assertEqual(len(rows), 13)
+        self.assertEqual([row['start_date'] for row in rows], [week['week_start'].isoformat() for week in live])
+        self.assertEqual(Decimal(rows[0]['opening_balance']), Decimal('500'))
+        self.assertEqual(float(rows[-1]['closing_balance']), live[-1]['closing_balance'])
+
+    def test_only_changed_users_are_recomputed(self):
+        self.materialize()
+        first = Forecast.objects.get(user=self.user, start_date=date.today())
+
+        self.materialize()
+        self.assertEqual(Forecast.objects.get(pk=first.pk).updated_at, first.updated_at)
+
+        self.sale.amount = Decimal('800')
+        self.sale.save()
+        self.materialize()
+        refreshed = Forecast.objects.get(pk=first.pk)
+        self.assertEqual(refreshed.opening_balance, Decimal('800'))
+        self.assertEqual(Forecast.objects.filter(user=self.user).count(), 13)
+
+    def test_later_runs_replace_earlier_snapshots(self):
+        self.materialize()
+        Forecast.objects.filter(user=self.user).update(
+            start_date=F('start_date') - timedelta(days=1), end_date=F('end_date') - timedelta(days=1)
+        )
+
+        # unchanged transactions keep the earlier snapshot, whatever day it started on
+        self.materialize()
+        self.assertFalse(Forecast.objects.filter(user=self.user, start_date=date.today()).exists())
+
+        self.sale.amount = Decimal('800')
+        self.sale.save()
+        self.materialize()
+        rows = Forecast.objects.filter(user=self.user)
+        self.assertEqual(rows.count(), 13)
+        self.assertEqual(rows.order_by('start_date').first().start_date, date.today())
+
+    def test_deleted_transactions_trigger_a_recompute(self):
+        self.materialize()
+        self.sale.delete()
+
+        self.materialize()
+        first = Forecast.objects.get(user=self.user, start_date=date.today())
+        self.assertEqual(first.opening_balance, Decimal('0'))
+
+    def test_large_batches_replace_snapshots(self):
+        for index in range(3):
+            user = User.objects.create_user(username=f'user{index}', password='secret-pass-123')
+            self.make_transaction(self.sales, '10', type='income', on=date.today() - timedelta(days=3), user=user)
+        self.materialize()
+
+        self.materialize(all=True, periods=366, bucket='day', batch_size=2000)
+        self.assertEqual(Forecast.objects.count(), 4 * 366)
+        self.assertFalse(Forecast.objects.exclude(end_date=F('start_date')).exists())
+
+    def test_other_users_rows_are_hidden(self):
+        other = User.objects.create_user(username='other', password='secret-pass-123')
+        Forecast.objects.create(user=other, start_date=date.today(), end_date=date.today())
+
+        self.assertEqual(self.client.get('/api/forecasts/').data, [])
+
+
+@override_settings(CACHES=SHARED_CACHES, FINANCE_AUTH_CACHE_ALIAS='shared')
+class CachedTokenAuthenticationTests(FinanceAPITestCase):
+    url = '/api/categories/'
+
+    def setUp(self):
+        super().setUp()
+        caches['shared'].clear()
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_repeat_requests_skip_the_token_query(self):
+        first, _ = self.count_queries(self.url)
+        second, _ = self.count_queries(self.url)
+
+        self.assertEqual(first - second, 1)
+
+    def test_deleted_token_is_rejected_immediately(self):
+        self.client.get(self.url)
+        self.token.delete()
+
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_deactivated_user_is_rejected_immediately(self):
+        self.client.get(self.url)
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_locmem_alias_uses_the_local_layer_only(self):
+        with override_settings(FINANCE_AUTH_CACHE_ALIAS='default'):
+            first, _ = self.count_queries(self.url)
+            second, _ = self.count_queries(self.url)
+            self.token.delete()
+
+            self.assertEqual(first - second, 1)
+            self.assertEqual(self.client.get(self.url).status_code, 401)
+            self.assertIsNone(cache.get(authentication.entry_key(self.token.key)))
+
+    def test_other_workers_drop_tokens_after_the_local_timeout(self):
+        self.client.get(self.url)
+        # a delete in another worker: the shared entry goes, this worker's local entry stays
+        Token.objects.filter(pk=self.token.pk)._raw_delete('default')
+        caches['shared'].delete(authentication.entry_key(self.token.key))
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+        authentication.local_tokens.entries[self.token.key]['expires'] = 0  # the local timeout passes
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_requests_get_their_own_user(self):
+        first, _ = authentication.CachedTokenAuthentication().authenticate_credentials(self.token.key)
+        first.first_name = 'changed by a request'
+        second, token = authentication.CachedTokenAuthentication().authenticate_credentials(self.token.key)
+
+        self.assertIsNot(first, second)
+        self.assertEqual(second.first_name, '')
+        self.assertIs(token.user, second)
+
+    def test_local_cache_is_bounded(self):
+        lru = authentication.TokenLRU(max_size=2)
+        for key in ('a', 'b', 'c'):
+            lru.set(key, {'expires': float('inf')})
+
+        self.assertIsNone(lru.get('a'))
+        self.assertIsNotNone(lru.get('c'))
+
+
+class AsyncDashboardTests(FinanceAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.token = Token.objects.create(user=self.user)
+        self.auth = {'HTTP_AUTHORIZATION': f'Token {self.token.key}'}
+        sales = self.make_category('Sales')
+        start = date.today().replace(day=1)
+        Budget.objects.create(user=self.user, category=sales, amount=Decimal('300'), start_date=start, end_date=start + timedelta(days=27))
+        self.make_transaction(sales, '1000', type='income', on=start - timedelta(days=3))
+        self.make_transaction(sales, '120', on=start)
+        self.make_transaction(sales, '80', completed=False, on=date.today() + timedelta(days=3))
+
+    def assertSameAsSync(self, async_url, sync_url, **params):
+        async_response = self.client.get(async_url, params, **self.auth)
+        sync_response = self.client.get(sync_url, params, **self.auth)
+
+        self.assertEqual(async_response.status_code, 200)
+        self.assertEqual(async_response.json(), json.loads(sync_response.content))
+
+    def test_endpoints_match_sync_views(self):
+        self.assertSameAsSync('/api/async/transactions/summary/', '/api/transactions/summary/', format='json')
+        self.assertSameAsSync('/api/async/budgets/progress/', '/api/budgets/progress/', format='json')
+        self.assertSameAsSync('/api/async/forecasts/summary13week/', '/api/forecasts/summary13week/', format='json', periods=6)
+
+    def test_dashboard_combines_all_three(self):
+        response = self.client.get('/api/async/dashboard/', **self.auth)
+
+        data = response.json()
+        self.assertEqual(set(data), {'summary', 'progress', 'summary13week'})
+        self.assertEqual(data['progress'][0]['amount_spent'], 120.0)
+        self.assertEqual(len(data['summary13week']), 13)
+
+    def test_errors(self):
+        self.client = APIClient()
+        self.assertEqual(self.client.get('/api/async/dashboard/').status_code, 401)
+        self.assertEqual(self.client.get('/api/async/dashboard/', HTTP_AUTHORIZATION='Token nope').status_code, 401)
+        self.assertEqual(self.client.get('/api/async/transactions/summary/', {'start_date': 'x'}, **self.auth).status_code, 400)
+        self.assertEqual(self.client.post('/api/async/dashboard/', **self.auth).status_code, 405)
+
+
+class RequestMetricsTests(FinanceAPITestCase):
+    def setUp(self):
+        super().setUp()
+        metrics.reset()
+
+    def server_timing(self, response):
+        return dict(
+            (entry.split(';')[0], entry)
+            for entry in response['Server-Timing'].split(', ')
+        )
+
+    def test_server_timing_reports_queries_and_stages(self):
+        rent = self.make_category('Rent')
+        self.make_transaction(rent, '10')
+
+        with CaptureQueriesContext(connection) as ctx, self.assertLogs('finance.metrics', 'DEBUG') as logs:
+            response = self.client.get('/api/transactions/', {'format': 'json'})
+
+        timing = self.server_timing(response)
+        self.assertEqual(set(timing), {'db', 'serialize', 'render', 'total'})
+        self.assertIn(f'desc="{len(ctx.captured_queries)} queries"', timing['db'])
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line['route'], 'GET transaction-list')
+        self.assertEqual(line['queries'], len(ctx.captured_queries))
+        self.assertGreater(line['serialize_ms'], 0)
+        self.assertGreater(line['render_ms'], 0)
+
+    def test_async_view_queries_are_counted(self):
+        token = Token.objects.create(user=self.user)
+
+        response = self.client.get('/api/async/budgets/progress/', HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        self.assertNotIn('desc="0 queries"', self.server_timing(response)['db'])
+
+    def test_routes_are_aggregated(self):
+        for _ in range(3):
+            self.client.get('/api/categories/')
+
+        stats = metrics.snapshot()['GET category-list']
+        self.assertEqual(stats['count'], 3)
+        self.assertLessEqual(stats['p50_ms'], stats['p95_ms'])
+        self.assertLessEqual(stats['p99_ms'], stats['max_ms'])
+
+    def test_histogram_percentiles(self):
+        histogram = metrics.Histogram()
+        for value in range(1, 101):
+            histogram.observe(value)
+
+        self.assertAlmostEqual(histogram.percentile(50), 50, delta=50 * 0.25)
+        self.assertAlmostEqual(histogram.percentile(99), 99, delta=99 * 0.25)
+        self.assertEqual(histogram.percentile(100), 100)
+
+    @override_settings(FINANCE_SLOW_QUERY_MS=0)
+    def test_slow_queries_are_logged_with_their_view(self):
+        with self.assertLogs('finance.metrics', 'WARNING') as logs:
+            self.client.get('/api/categories/')
+
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line['event'], 'slow_query')
+        self.assertEqual(line['route'], 'GET category-list')
+        self.assertIn('finance_category', line['sql'])
+
+    def test_metrics_endpoint_is_admin_only(self):
+        self.client.get('/api/categories/')
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get('/metrics/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('GET category-list', response.data)
+
+
+class SeedDataTests(TestCase):
+    def seed(self, **options):
+        call_command('seed_data', users=3, transactions=600, days=120, batch_size=250, seed=7, stdout=io.StringIO(), **options)
+
+    def test_seeds_a_consistent_dataset(self):
+        self.seed()
+
+        users = User.objects.filter(username__startswith='seed_')
+        self.assertEqual(users.count(), 3)
+        self.assertEqual(Transaction.objects.filter(user__in=users).count(), 600)
+        self.assertTrue(Budget.objects.filter(user__in=users).exists())
+        statuses = set(Transaction.objects.values_list('completed', flat=True))
+        self.assertEqual(statuses, {True, False})
+        self.assertFalse(Transaction.objects.filter(date__gt=date.today(), completed=True).exists())
+
+        # bulk inserts skip the signals, the rollup is rebuilt instead
+        rollup_total = sum(DailyRollup.objects.values_list('income_completed', flat=True))
+        transaction_total = sum(Transaction.objects.filter(type='income', completed=True).values_list('amount', flat=True))
+        self.assertEqual(rollup_total, transaction_total)
+
+    def test_clear_replaces_previous_seed(self):
+        self.seed()
+        self.seed(clear=True)
+
+        self.assertEqual(User.objects.filter(username__startswith='seed_').count(), 3)
+        self.assertEqual(Transaction.objects.count(), 600)
+
+
+@override_settings(FINANCE_SIMULATION_WORKERS=1)
+class BenchmarkEndpointsTests(TestCase):
+    def setUp(self):
+        call_command('seed_data', users=2, transactions=200, days=60, seed=3, stdout=io.StringIO())
+        self.baseline = f'{tempfile.mkdtemp()}/baseline.json'
+
+    def benchmark(self, **options):
+        out = io.StringIO()
+        call_command('benchmark_endpoints', iterations=2, warmup=0, baseline=self.baseline, stdout=out, **options)
+        return out.getvalue()
+
+    def test_every_router_endpoint_is_benchmarked(self):
+        self.benchmark(save_baseline=True)
+
+        with open(self.baseline) as baseline:
+            results = json.load(baseline)
+        for name in ('transaction-list', 'transaction-detail', 'transaction-summary', 'transaction-export',
+                     'budget-progress', 'forecast-runway', 'forecast-summary13week', 'category-list'):
+            self.assertIn(name, results)
+        self.assertEqual(results['transaction-list']['status'], 200)
+        self.assertGreater(results['transaction-list']['queries'], 0)
+        self.assertGreater(results['transaction-list']['peak_memory_kb'], 0)
+
+    def test_query_regressions_are_flagged(self):
+        self.benchmark(save_baseline=True, endpoint=['transaction-list'])
+        with open(self.baseline) as baseline:
+            results = json.load(baseline)
+        results['transaction-list']['queries'] -= 1
+        with open(self.baseline, 'w') as baseline:
+            json.dump(results, baseline)
+
+        # a tolerance this wide leaves only the query count to flag, timings are noisy
+        with self.assertRaisesMessage(CommandError, '1 regressions'):
+            self.benchmark(endpoint=['transaction-list'], tolerance=100)
+
+    def test_explain_queries_covers_every_endpoint(self):
+        out = io.StringIO()
+        # the test runner allows 'testserver', the command must not rely on it
+        with override_settings(ALLOWED_HOSTS=['localhost']):
+            call_command('explain_queries', stdout=out)
+
+        for label, _, _ in explain_queries.ENDPOINTS:
+            self.assertIn(f'{label} (', out.getvalue())
+        self.assertIn('SEARCH', out.getvalue())
+
+
+class DatabaseProfileTests(TestCase):
+    @override_settings(FINANCE_SQLITE_PRAGMAS={'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'busy_timeout': 1234})
+    def test_pragmas_are_applied_to_new_connections(self):
+        with tempfile.TemporaryDirectory() as directory:
+            wrapper = connections['default'].__class__(dict(connection.settings_dict, NAME=f'{directory}/db.sqlite3'), alias='profile')
+            try:
+                pragmas = database.current_pragmas(wrapper)
+            finally:
+                wrapper.close()
+
+        self.assertEqual(pragmas, {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 1234})
+
+    def test_development_profile_leaves_connections_alone(self):
+        self.assertEqual(database.current_pragmas(connection), {})
+
+
+# SimpleTestCase: TestCase's transaction would keep every read on the primary
+@override_settings(FINANCE_REPLICAS=['replica'], CACHES=SHARED_CACHES, FINANCE_REPLICA_PIN_CACHE_ALIAS='shared')
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        caches['shared'].clear()
+        self.router = routers.PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+
+    # databases the router picks for a read, then a write and a read during one request
+    def route(self, method='get', write=False, token='abc'):
+        picked = []
+
+        def view(request):
+            picked.append(self.router.db_for_read(Transaction))
+            if write:
+                picked.append(self.router.db_for_write(Transaction))
+                picked.append(self.router.db_for_read(Transaction))
+            return None
+
+        request = getattr(self.factory, method)('/api/transactions/', HTTP_AUTHORIZATION=f'Token {token}')
+        routers.ReplicaRoutingMiddleware(view)(request)
+        return picked
+
+    def test_reads_go_to_the_replica(self):
+        self.assertEqual(self.route(), ['replica'])
+
+    def test_writes_go_to_the_primary_and_pin_the_client(self):
+        self.assertEqual(self.route(write=True), ['replica', 'default', 'default'])
+        self.assertEqual(self.route(), ['default'])
+        self.assertEqual(self.route(token='other'), ['replica'])
+
+    def test_unsafe_methods_read_the_primary(self):
+        self.assertEqual(self.route(method='post', write=True), ['default', 'default', 'default'])
+
+    def test_pin_expires(self):
+        with override_settings(FINANCE_REPLICA_PIN_SECONDS=0.01):
+            self.route(write=True)
+        time.sleep(0.05)
+        self.assertEqual(self.route(), ['replica'])
+
+    def test_primary_outside_requests_and_for_auth_tables(self):
+        self.assertEqual(self.router.db_for_read(Transaction), 'default')
+        self.assertEqual(self.route(token='abc') + [self.router.db_for_read(Token)], ['replica', 'default'])
+        self.assertFalse(self.router.allow_migrate('replica', 'finance'))
+
+    def test_locmem_pins_keep_reads_on_the_primary(self):
+        # another worker would not see the pin, so the replica is not read at all
+        with override_settings(FINANCE_REPLICA_PIN_CACHE_ALIAS='default'):
+            self.assertEqual(self.route(), ['default'])
+
+    def test_sync_needs_a_shared_cache(self):
+        with self.assertRaisesMessage(CommandError, 'shared by every worker'):
+            call_command('sync_replica', stdout=io.StringIO())
+
+    def test_replica_sync_drops_cached_analytics(self):
+        epoch = caching.replica_epoch()
+        time.sleep(0.001)
+        caching.bump_replica_epoch()
+        self.assertNotEqual(caching.replica_epoch(), epoch)
+
+
+class FullTextSearchTests(FinanceAPITestCase):
+    url = '/api/transactions/'
+
+    def setUp(self):
+        super().setUp()
+        self.rent = self.make_category('Rent')
+        self.travel = self.make_category('Travel')
+
+    def search(self, term, url=None, **params):
+        response = self.client.get(url or self.url, {'search': term, **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        rows = response.data['results'] if isinstance(response.data, dict) else response.data
+        return [row['name' if url else 'description'] for row in rows]
+
+    def test_prefix_matching_across_fields(self):
+        Transaction.objects.create(description='Quarterly invoice', user=self.user, category=self.travel,
+                                   amount=Decimal('10'), type='income', client='Acme Corp', date=date.today())
+        Transaction.objects.create(description='Office lease', user=self.user, category=self.rent,
+                                   amount=Decimal('10'), type='expense', note='paid by standing order', date=date.today())
+
+        self.assertEqual(self.search('invo'), ['Quarterly invoice'])
+        self.assertEqual(self.search('acm'), ['Quarterly invoice'])
+        self.assertEqual(self.search('stand ord'), ['Office lease'])
+        self.assertEqual(self.search('ren'), ['Office lease'])
+        self.assertEqual(self.search('nothing'), [])
+
+    def test_results_are_ranked_best_match_first(self):
+        Transaction.objects.create(description='Team lunch', user=self.user, category=self.travel,
+                                   amount=Decimal('10'), type='expense', note='hotel nearby', date=date(2024, 1, 2))
+        Transaction.objects.create(description='Hotel booking', user=self.user, category=self.travel,
+                                   amount=Decimal('10'), type='expense', date=date(2024, 1, 1))
+
+        # the description match outranks the newer note match
+        self.assertEqual(self.search('hotel'), ['Hotel booking', 'Team lunch'])
+        self.assertEqual(self.search('hotel', ordering='-date'), ['Team lunch', 'Hotel booking'])
+
+    def test_ranked_pages_walk_every_match_once(self):
+        Transaction.objects.bulk_create([
+            Transaction(description=f'supplies {i}', user=self.user, category=self.travel, amount=Decimal('10'),
+                        type='expense', note='supplies' if i % 2 else '', date=date.today())
+            for i in range(9)
+        ])
+
+        response = self.client.get(self.url, {'search': 'supplies', 'page_size': 4})
+        seen = []
+        while True:
+            seen.extend(row['description'] for row in response.data['results'])
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+
+        self.assertEqual(sorted(seen), sorted(f'supplies {i}' for i in range(9)))
+
+    def test_index_follows_writes(self):
+        # bulk_create, queryset updates and deletes bypass signals, the triggers still see them
+        Transaction.objects.bulk_create([
+            Transaction(description='Fuel', user=self.user, category=self.travel, amount=Decimal('10'), type='expense',
+                        date=date.today()),
+        ])
+        self.assertEqual(self.search('fuel'), ['Fuel'])
+
+        Transaction.objects.filter(description='Fuel').update(description='Parking')
+        self.assertEqual(self.search('fuel'), [])
+        self.assertEqual(self.search('parking'), ['Parking'])
+
+        Category.objects.filter(pk=self.travel.pk).update(name='Transport')
+        self.assertEqual(self.search('transp'), ['Parking'])
+
+        Transaction.objects.all().delete()
+        self.assertEqual(self.search('parking'), [])
+
+    def test_index_survives_renumbered_rowids(self):
+        # table rebuilds and VACUUM may renumber rowids, the index is keyed on id
+        fuel = Transaction.objects.create(description='Fuel', user=self.user, category=self.travel,
+                                          amount=Decimal('10'), type='expense', date=date.today())
+        Transaction.objects.create(description='Parking', user=self.user, category=self.travel,
+                                   amount=Decimal('10'), type='expense', date=date.today())
+        with connection.cursor() as cursor:
+            cursor.execute('UPDATE finance_transaction SET rowid = 1000 - rowid')
+        self.assertEqual(self.search('fuel'), ['Fuel'])
+
+        fuel.description = 'Diesel'
+        fuel.save()
+        self.assertEqual(self.search('fuel'), [])
+        self.assertEqual(self.search('diesel'), ['Diesel'])
+        self.assertEqual(self.search('parking'), ['Parking'])
+
+    def test_categories_search(self):
+        Category.objects.create(name='Utilities', description='electricity and water')
+
+        self.assertEqual(self.search('electr', url='/api/categories/'), ['Utilities'])
+        self.assertEqual(self.search('util', url='/api/categories/'), ['Utilities'])
+
+    def test_rebuild_restores_the_index(self):
+        Transaction.objects.create(description='Fuel', user=self.user, category=self.travel,
+                                   amount=Decimal('10'), type='expense', date=date.today())
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM finance_transaction_fts')
+        self.assertEqual(self.search('fuel'), [])
+
+        call_command('rebuild_search_index', stdout=io.StringIO())
+
+        self.assertEqual(self.search('fuel'), ['Fuel'])
+
+    def test_falls_back_to_search_fields_without_fts(self):
+        Transaction.objects.create(description='Fuel', user=self.user, category=self.travel,
+                                   amount=Decimal('10'), type='expense', date=date.today())
+        request = RequestFactory().get(self.url, {'search': 'fue'})
+        view = type('View', (), {'search_fields': ['description'], 'search_index': None})()
+
+        queryset = search.FullTextSearchFilter().filter_queryset(
+            Request(request), Transaction.objects.all(), view)
+
+        self.assertEqual([row.description for row in queryset], ['Fuel'])
+        self.assertEqual(search.match_query('rent, "q3"'), '"rent"* "q3"*')
+        self.assertIsNone(search.match_query(' ;; '))
+
+
+class FlatReadPathTests(FinanceAPITestCase):
+    url = '/api/transactions/'
+
+    def setUp(self):
+        super().setUp()
+        self.user.first_name = 'Zoë'
+        self.user.save()
+        travel = self.make_category('Travel')
+        self.make_transaction(travel, '12.50')
+        orphan = self.make_transaction(travel, '3.00', type='income', on=date.today() - timedelta(days=1))
+        Transaction.objects.filter(pk=orphan.pk).update(user=None, note='line\u2028break')
+
+    def test_list_matches_the_model_serializer(self):
+        response = self.client.get(self.url)
+
+        queryset = Transaction.objects.select_related('category', 'user').order_by('-date', '-id')
+        expected = TransactionCategoryUserSerializer(queryset, many=True).data
+        self.assertEqual(response.content, JSONRenderer().render({'next': None, 'previous': None, 'results': expected}))
+        self.assertIsNone(response.data['results'][1]['user'])
+
+    def test_browsable_api_keeps_the_model_serializers(self):
+        response = self.client.get(self.url, {'format': 'api'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response.renderer_context['view'].get_serializer(), TransactionCategoryUserSerializer)
+
+    @skipIf(orjson is None, 'orjson is not installed')
+    def test_orjson_renderer_matches_json_renderer(self):
+        data = {
+            'amount': Decimal('12.50'), 'id': uuid.uuid4(), 'at': timezone.now(), 'on': date.today(),
+            'name': 'Zoë\u2028\u2029', 'rows': [1, 2.5, None, True], 1: 'int key',
+        }
+
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+        self.assertEqual(ORJSONRenderer().render(data, 'application/json; indent=4'),
+                         JSONRenderer().render(data, 'application/json; indent=4'))
+
+    def test_benchmark_serializers(self):
+        out = io.StringIO()
+        call_command('benchmark_serializers', rows=2, repeat=1, stdout=out)
+
+        self.assertIn('All read paths rendered identical output.', out.getvalue())
+        with self.assertRaisesMessage(CommandError, 'Run seed_data first'):
+            call_command('benchmark_serializers', rows=3, stdout=io.StringIO())
+
+
+class SparseFieldsTests(FinanceAPITestCase):
+    url = '/api/transactions/'
+
+    def setUp(self):
+        super().setUp()
+        self.travel = self.make_category('Travel')
+        self.transactions = [self.make_transaction(self.travel, f'{i + 1}.00', on=date(2024, 1, 1 + i)) for i in range(5)]
+
+    def get_sql(self, url, **params):
+        lookups.categories()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response, ctx.captured_queries[-1]['sql']
+
+    def test_fields_trim_rows_and_joins(self):
+        response, sql = self.get_sql(self.url, fields='date,amount,description')
+
+        self.assertEqual(list(response.data['results'][0]), ['description', 'amount', 'date'])
+        self.assertNotIn('JOIN', sql)
+        self.assertNotIn('"note"', sql)
+
+    def test_dotted_fields_pick_nested_fields(self):
+        response, sql = self.get_sql(self.url, fields='amount,category.name')
+
+        self.assertEqual(response.data['results'][0], {'category': {'name': 'Travel'}, 'amount': '5.00'})
+        self.assertNotIn('JOIN', sql)  # the category comes from lookups.categories()
+
+    def test_expand_keeps_relations_nested(self):
+        response, sql = self.get_sql(self.url, expand='category')
+
+        row = response.data['results'][0]
+        self.assertEqual(row['category']['name'], 'Travel')
+        self.assertEqual(row['user'], self.user.pk)
+        self.assertNotIn('auth_user', sql)
+        self.assertEqual(set(row), set(self.client.get(self.url).data['results'][0]))
+
+    def test_sparse_pages_walk_every_row(self):
+        response = self.client.get(self.url, {'fields': 'amount', 'ordering': 'amount', 'page_size': 2})
+        amounts = []
+        while True:
+            amounts += [row['amount'] for row in response.data['results']]
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+
+        self.assertEqual(amounts, ['1.00', '2.00', '3.00', '4.00', '5.00'])
+
+    def test_model_serializers_and_retrieve(self):
+        Budget.objects.create(user=self.user, category=self.travel, amount=Decimal('100'),
+                              start_date=date(2024, 1, 1), end_date=date(2024, 1, 31))
+
+        response, sql = self.get_sql('/api/budgets/', fields='amount,category.name')
+        self.assertEqual(response.data['results'][0] if isinstance(response.data, dict) else response.data[0],
+                         {'category': {'name': 'Travel'}, 'amount': '100.00'})
+        self.assertNotIn('"description"', sql)
+
+        response, sql = self.get_sql(f'{self.url}{self.transactions[0].pk}/', fields='amount,category')
+        self.assertEqual(response.data, {'category': self.travel.pk, 'amount': '1.00'})
+        self.assertNotIn('JOIN', sql)
+
+    def test_unknown_fields(self):
+        response = self.client.get(self.url, {'fields': 'amount,secret'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'error': 'Unknown fields: secret.'})
+        self.assertEqual(self.client.get('/api/budgets/', {'fields': 'category.secret'}).status_code, 400)
+
+
+@override_settings(FINANCE_SYNC_OVERLAP_SECONDS=0)
+class DeltaSyncTests(FinanceAPITestCase):
+    url = '/api/sync/'
+
+    def setUp(self):
+        super().setUp()
+        self.travel = self.make_category('Travel')
+        self.transactions = [self.make_transaction(self.travel, f'{i + 1}.00') for i in range(3)]
+        self.budget = Budget.objects.create(user=self.user, category=self.travel, amount=Decimal('100'),
+                                            start_date=date(2024, 1, 1), end_date=date(2024, 1, 31))
+
+    def sync(self, token=None, **params):
+        if token:
+            params['token'] = token
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.data
+
+    def updated_ids(self, data, collection):
+        return {str(row['id']) for row in data['changes'][collection]['updated']}
+
+    def test_snapshot_then_only_changes(self):
+        snapshot = self.sync()
+        self.assertTrue(snapshot['reset'])
+        self.assertEqual(self.updated_ids(snapshot, 'transactions'), {str(t.pk) for t in self.transactions})
+        listed = self.client.get('/api/transactions/').data['results']
+        self.assertCountEqual(snapshot['changes']['transactions']['updated'], listed)
+
+        unused = self.make_category('Unused')
+        added = self.make_transaction(self.travel, '9.00')
+        self.budget.amount = Decimal('150')
+        self.budget.save()
+        deleted_transaction, deleted_category = str(self.transactions[0].pk), str(unused.pk)
+        self.transactions[0].delete()
+        unused.delete()
+
+        delta = self.sync(snapshot['token'])
+        self.assertFalse(delta['reset'])
+        self.assertFalse(delta['has_more'])
+        self.assertEqual(self.updated_ids(delta, 'transactions'), {str(added.pk)})
+        self.assertEqual(self.updated_ids(delta, 'budgets'), {str(self.budget.pk)})
+        self.assertEqual(self.updated_ids(delta, 'categories'), set())
+        self.assertEqual(delta['changes']['transactions']['deleted'], [deleted_transaction])
+        self.assertEqual(delta['changes']['categories']['deleted'], [deleted_category])
+
+        quiet = self.sync(delta['token'])
+        self.assertEqual(sum(len(c['updated']) + len(c['deleted']) for c in quiet['changes'].values()), 0)
+
+    def test_limited_pages_send_every_row_once(self):
+        Transaction.objects.bulk_create([
+            Transaction(description='bulk', user=self.user, category=self.travel, amount=Decimal('1'),
+                        type='expense', date=date.today())
+            for _ in range(7)
+        ])
+
+        data = self.sync(limit=2)
+        seen = []
+        while True:
+            seen += [row['id'] for row in data['changes']['transactions']['updated']]
+            if not data['has_more']:
+                break
+            data = self.sync(data['token'], limit=2)
+
+        self.assertEqual(len(seen), 10)
+        self.assertEqual(len(set(seen)), 10)
+
+    def test_forecasts_are_scoped_to_their_owner(self):
+        other = User.objects.create_user(username='other')
+        own = Forecast.objects.create(user=self.user, start_date=date(2024, 1, 1), end_date=date(2024, 1, 7))
+        theirs = Forecast.objects.create(user=other, start_date=date(2024, 1, 1), end_date=date(2024, 1, 7))
+        snapshot = self.sync()
+        self.assertEqual(self.updated_ids(snapshot, 'forecasts'), {str(own.pk)})
+
+        own_id = str(own.pk)
+        theirs.delete()
+        own.delete()
+
+        delta = self.sync(snapshot['token'])
+        self.assertEqual(delta['changes']['forecasts']['deleted'], [own_id])
+
+    def test_recent_rows_are_sent_again_within_the_overlap(self):
+        snapshot = self.sync()
+        with override_settings(FINANCE_SYNC_OVERLAP_SECONDS=60):
+            first = self.sync(snapshot['token'])
+        second = self.sync(first['token'])
+
+        # every row is younger than a minute, the first delta starts over from before them
+        self.assertEqual(self.updated_ids(first, 'transactions'), set())
+        self.assertEqual(self.updated_ids(second, 'transactions'), {str(t.pk) for t in self.transactions})
+
+    def test_expired_tokens_get_a_snapshot(self):
+        token = sync.encode_token({
+            'at': (timezone.now() - timedelta(days=31)).isoformat(),
+            'cursors': {},
+            'deleted': [timezone.now().isoformat(), None],
+        })
+
+        self.assertTrue(self.sync(token)['reset'])
+
+    def test_invalid_token_and_limit(self):
+        for params in ({'token': 'not-a-token'}, {'limit': 0}, {'limit': 'all'}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('error', response.data)
+
+    def test_prune_old_tombstones(self):
+        kept = str(self.transactions[1].pk)
+        self.transactions[0].delete()
+        SyncTombstone.objects.update(deleted_at=timezone.now() - timedelta(days=31))
+        self.transactions[1].delete()
+
+        call_command('prune_sync_tombstones', stdout=io.StringIO())
+
+        self.assertEqual(list(SyncTombstone.objects.values_list('object_id', flat=True)), [kept])
+
+
+class BudgetSpentTests(FinanceAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.rent = self.make_category('Rent')
+        self.start = date.today().replace(day=1)
+        self.budget = Budget.objects.create(
+            user=self.user, category=self.rent, amount=Decimal('1000'),
+            start_date=self.start, end_date=self.start + timedelta(days=27),
+        )
+
+    def spent(self):
+        return Budget.objects.get(pk=self.budget.pk).spent
+
+    def alerts(self):
+        return list(BudgetAlert.objects.filter(budget=self.budget).order_by('id').values_list('threshold', 'spent'))
+
+    def test_spent_follows_completed_expenses_in_window(self):
+        entry = self.make_transaction(self.rent, '250', completed=False, on=self.start)
+        self.make_transaction(self.rent, '500', type='income', on=self.start)
+        self.make_transaction(self.rent, '75', on=self.start - timedelta(days=1))
+        self.make_transaction(self.make_category('Food'), '60', on=self.start)
+        self.assertEqual(self.spent(), Decimal('0'))
+
+        entry.completed = True
+        entry.save()
+        self.assertEqual(self.spent(), Decimal('250'))
+
+        entry.amount = Decimal('300')
+        entry.save()
+        self.assertEqual(self.spent(), Decimal('300'))
+
+        entry.date = self.start - timedelta(days=1)
+        entry.save()
+        self.assertEqual(self.spent(), Decimal('0'))
+
+        entry.date = self.start
+        entry.save()
+        entry.delete()
+        self.assertEqual(self.spent(), Decimal('0'))
+
+    def test_counter_changes_move_updated_at(self):
+        before = Budget.objects.get(pk=self.budget.pk).updated_at
+        self.make_transaction(self.rent, '90', on=self.start)
+        after = Budget.objects.get(pk=self.budget.pk)
+
+        self.assertEqual(after.spent, Decimal('90'))
+        self.assertGreater(after.updated_at, before)
+
+        Budget.objects.filter(pk=self.budget.pk).update(spent=Decimal('0'))
+        budgets.reconcile()
+        self.assertGreater(Budget.objects.get(pk=self.budget.pk).updated_at, after.updated_at)
+
+    def test_bulk_import_moves_spent(self):
+        rows = Transaction.objects.bulk_create([
+            Transaction(description='import', user=self.user, category=self.rent, amount=Decimal('40'),
+                        type='expense', date=self.start + timedelta(days=i), completed=True)
+            for i in range(5)
+        ])
+        rollups.add_transactions(rows)
+
+        self.assertEqual(self.spent(), Decimal('200'))
+
+    def test_alert_written_once_per_crossing(self):
+        self.make_transaction(self.rent, '700', on=self.start)
+        self.assertEqual(self.alerts(), [])
+
+        entry = self.make_transaction(self.rent, '150', on=self.start)
+        self.make_transaction(self.rent, '10', on=self.start)
+        self.assertEqual(self.alerts(), [(80, Decimal('850'))])
+
+        self.make_transaction(self.rent, '200', on=self.start)
+        self.assertEqual(self.alerts(), [(80, Decimal('850')), (100, Decimal('1060'))])
+
+        # dropping back below and crossing again is a new crossing
+        entry.delete()
+        self.make_transaction(self.rent, '150', on=self.start)
+        self.assertEqual([threshold for threshold, _ in self.alerts()], [80, 100, 100])
+
+    def test_budget_save_recomputes_spent_and_alerts(self):
+        self.make_transaction(self.rent, '600', on=self.start - timedelta(days=3))
+        self.assertEqual(self.spent(), Decimal('0'))
+
+        self.budget.start_date = self.start - timedelta(days=5)
+        self.budget.save()
+        self.assertEqual(self.spent(), Decimal('600'))
+        self.assertEqual(self.alerts(), [])
+
+        self.budget.amount = Decimal('700')
+        self.budget.save()
+        self.assertEqual(self.alerts(), [(80, Decimal('600'))])
+
+    def test_progress_reads_the_counter(self):
+        self.make_transaction(self.rent, '250', on=self.start)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/budgets/progress/')
+
+        self.assertEqual(response.data[0]['amount_spent'], Decimal('250'))
+        self.assertFalse(any('finance_transaction' in query['sql'] or 'finance_dailyrollup' in query['sql']
+                             for query in ctx.captured_queries))
+
+    def test_reconcile_corrects_drift(self):
+        self.make_transaction(self.rent, '900', on=self.start)
+        Budget.objects.filter(pk=self.budget.pk).update(spent=Decimal('100'))
+        BudgetAlert.objects.all().delete()
+
+        out = io.StringIO()
+        call_command('reconcile_budgets', dry_run=True, stdout=out)
+        self.assertIn('Found 1 drifted budgets', out.getvalue())
+        self.assertEqual(self.spent(), Decimal('100'))
+
+        call_command('reconcile_budgets', stdout=io.StringIO())
+        self.assertEqual(self.spent(), Decimal('900'))
+        self.assertEqual(self.alerts(), [(80, Decimal('900'))])
+        self.assertEqual(budgets.reconcile(), [])
+
+    def test_alerts_endpoint_lists_own_budgets(self):
+        other = User.objects.create_user(username='other', password='secret-pass-123')
+        Budget.objects.create(user=other, category=self.rent, amount=Decimal('10'),
+                              start_date=self.start, end_date=self.start)
+        self.make_transaction(self.rent, '10', on=self.start, user=other)
+        self.make_transaction(self.rent, '850', on=self.start)
+
+        response = self.client.get('/api/budgets/alerts/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(row['threshold'], row['category']) for row in response.data], [(80, 'Rent')])
+
+
+class LookupTableTests(FinanceAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.rent = self.make_category('Rent')
+        lookups.categories()
+
+    def category_queries(self, method, url, data=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(self.client, method)(url, data, format='json')
+        return response, [query['sql'] for query in ctx.captured_queries if 'FROM "finance_category"' in query['sql']]
+
+    def test_writes_validate_category_from_the_table(self):
+        response, queries = self.category_queries('post', '/api/transactions/', {
+            'description': 'rent', 'category': str(self.rent.pk), 'amount': '10.00', 'type': 'expense', 'date': '2024-03-01',
+        })
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(queries, [])
+
+        response, queries = self.category_queries('post', '/api/budgets/', {
+            'category': str(self.rent.pk), 'amount': '100.00', 'start_date': '2024-03-01', 'end_date': '2024-03-31',
+        })
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(queries, [])
+
+        response = self.client.post('/api/budgets/', {
+            'category': str(uuid.uuid4()), 'amount': '100.00', 'start_date': '2024-03-01', 'end_date': '2024-03-31',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('does not exist', str(response.data['category']))
+
+    def test_reads_serve_nested_categories_from_the_table(self):
+        self.make_transaction(self.rent, '10')
+        Budget.objects.create(user=self.user, category=self.rent, amount=Decimal('100'),
+                              start_date=date.today().replace(day=1), end_date=date.today())
+
+        for url in ('/api/transactions/', '/api/budgets/', '/api/budgets/progress/'):
+            response, queries = self.category_queries('get', url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(queries, [], url)
+        rows = self.client.get('/api/transactions/').data['results']
+        self.assertEqual(rows[0]['category']['name'], 'Rent')
+        self.assertEqual(self.client.get('/api/budgets/progress/').data[0]['category'], 'Rent')
+
+    def test_writes_invalidate_the_table(self):
+        self.rent.name = 'Housing'
+        self.rent.save()
+        self.assertEqual(lookups.categories().get(self.rent.pk).name, 'Housing')
+
+        Category.objects.filter(pk=self.rent.pk).update(name='Lodging')
+        self.assertEqual(lookups.categories().get(self.rent.pk).name, 'Housing')
+        # another worker's write replaces the shared version
+        lookups.get_cache().set(lookups.version_key(Category), 0, None)
+        self.assertEqual(lookups.categories().get(self.rent.pk).name, 'Lodging')
+
+    # a worker whose cache does not see the writer's bump (locmem) reloads after the local timeout
+    def test_tables_expire_without_a_version_bump(self):
+        Category.objects.filter(pk=self.rent.pk).update(name='Lodging')
+        self.assertEqual(lookups.categories().get(self.rent.pk).name, 'Rent')
+
+        with override_settings(FINANCE_LOOKUP_LOCAL_TIMEOUT=0):
+            lookups.local_tables.pop(Category)  # the next load takes the zero timeout
+            self.assertEqual(lookups.categories().get(self.rent.pk).name, 'Lodging')
+            Category.objects.filter(pk=self.rent.pk).update(name='Housing')
+            self.assertEqual(lookups.categories().get(self.rent.pk).name, 'Housing')
+
+    def test_misses_fall_back_to_the_database(self):
+        late = Category.objects.bulk_create([Category(name='Late')])[0]  # no signal, the table is stale
+
+        self.assertEqual(lookups.categories().get(late.pk).name, 'Late')
+        self.assertEqual(lookups.categories().resolve('Late').pk, late.pk)
+        self.assertIsNone(lookups.categories().resolve('Missing'))
+
+    def test_profile_roles_come_from_the_table(self):
+        role = Role.objects.create(name='Owner')
+        UserProfile.objects.create(user=self.user, role=role)
+        lookups.roles()
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/profiles/')
+
+        self.assertEqual(response.data['results'][0]['role']['name'] if isinstance(response.data, dict)
+                         else response.data[0]['role']['name'], 'Owner')
+        self.assertFalse(any('finance_role' in query['sql'] for query in ctx.captured_queries))
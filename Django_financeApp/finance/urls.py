@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import async_views, views
 from .auth import CustomAuthToken, SignupView
 
 router = DefaultRouter()
@@ -15,4 +15,10 @@ urlpatterns = [
     path('', include(router.urls)),
     path('auth/login/', CustomAuthToken.as_view(), name='auth_token'),
     path('auth/signup/', SignupView.as_view(), name='auth_signup'),
+    path('sync/', views.SyncView.as_view(), name='sync'),  # delta sync for client side caches
+    # async dashboard endpoints, served without a worker thread per request under ASGI
+    path('async/transactions/summary/', async_views.transaction_summary, name='async_transaction_summary'),
+    path('async/budgets/progress/', async_views.budget_progress, name='async_budget_progress'),
+    path('async/forecasts/summary13week/', async_views.summary13week, name='async_summary13week'),
+    path('async/dashboard/', async_views.dashboard, name='async_dashboard'),
 ]
@@ -1,22 +1,94 @@
-from rest_framework import viewsets, permissions, filters
+from rest_framework import viewsets, permissions, filters, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from django.utils import timezone
+import csv
+import io
+import itertools
 from datetime import timedelta
 from datetime import date
-from django.utils.timezone import now
-from django.db import models
-from django.db.models import Q, Sum, Value
-from django.db.models.functions import Coalesce
-from rest_framework.permissions import IsAuthenticatedOrReadOnly
-from .models import Role, Category, Transaction, Budget, Forecast, UserProfile
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction as db_transaction
+from django.http import StreamingHttpResponse
+from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAdminUser
+from rest_framework.views import APIView
+from .fieldsets import SparseFieldsMixin
+from .pagination import KeysetPagination
+from .search import FullTextSearchFilter
+from .renderers import CSVRenderer, NDJSONRenderer, Echo
+from . import analytics, forecasting, lookups, metrics, rollups, search, signals, sync
+from .caching import cached_analytics, GLOBAL_SCOPE, USER_SCOPE
+from .models import Role, Category, Transaction, Budget, BudgetAlert, Forecast, UserProfile
 from .serializers import (
     RoleSerializer, CategorySerializer, TransactionSerializer,TransactionCategoryUserSerializer,BudgetCategorySerializer,
-    BudgetSerializer, ForecastSerializer, UserProfileSerializer
+    BudgetSerializer, ForecastSerializer, UserProfileSerializer, TransactionImportSerializer, FlatTransactionSerializer,
+    BudgetAlertSerializer
 )
 
+# export column -> transaction lookup
+EXPORT_FIELDS = {
+    'id': 'id',
+    'date': 'date',
+    'description': 'description',
+    'type': 'type',
+    'amount': 'amount',
+    'completed': 'completed',
+    'category': 'category__name',
+    'client': 'client',
+    'note': 'note',
+    'user': 'user__username',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+EXPORT_CHUNK_SIZE = 2000
+
+MAX_RUNWAY_WEEKS = 104
+MAX_RUNWAY_PATHS = 200000
+
+IMPORT_BATCH_SIZE = 500
+IMPORT_MAX_BATCH_SIZE = 5000
+IMPORT_MAX_ROWS = 50000
+
+SYNC_LIMIT = 1000  # rows per collection and response
+
+# rows of a bulk import, from a csv upload or a json array body
+def import_rows(request):
+    upload = request.FILES.get('file')
+    if upload is not None:
+        try:
+            rows = list(csv.DictReader(io.TextIOWrapper(upload.file, encoding='utf-8-sig')))
+        except (UnicodeDecodeError, csv.Error):
+            raise ValueError('file must be a utf-8 encoded csv file.')
+    elif isinstance(request.data, list):
+        rows = request.data
+    else:
+        raise ValueError('Send a json array of transactions or a csv file in the "file" field.')
+    if not rows:
+        raise ValueError('No rows to import.')
+    if len(rows) > IMPORT_MAX_ROWS:
+        raise ValueError(f'Imports are limited to {IMPORT_MAX_ROWS} rows.')
+    return rows
+
+BOOLEAN_PARAMS = {'true': True, 'false': False}
+
+# exact matches on ?<field>=<value> for each of the view's filterset_fields
+# (django-filter is not a dependency)
+class FieldFilter(filters.BaseFilterBackend):
+    def filter_queryset(self, request, queryset, view):
+        lookups = {}
+        for field in getattr(view, 'filterset_fields', []):
+            value = request.query_params.get(field)
+            if value:
+                lookups[field] = BOOLEAN_PARAMS.get(value.lower(), value)
+        try:
+            return queryset.filter(**lookups)
+        except DjangoValidationError as e:
+            raise ValidationError({'error': ' '.join(e.messages)})
+
 # role viewset allowed for admin user only
-class RoleViewSet(viewsets.ModelViewSet):
+class RoleViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = Role.objects.all()
     serializer_class = RoleSerializer
     permission_classes = [permissions.IsAdminUser]
@@ -24,15 +96,18 @@ class RoleViewSet(viewsets.ModelViewSet):
 #category viewset
 # no permission needed
 # can be searched by name and description
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
-    filter_backends = [filters.SearchFilter]
+    filter_backends = [FullTextSearchFilter]
     search_fields = ['name', 'description']
+    search_index = search.CATEGORY_INDEX
+
+BUDGET_ALERT_LIMIT = 100
 
 # budget viewset
-class BudgetViewSet(viewsets.ModelViewSet):
-    queryset = Budget.objects.all()
+class BudgetViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
+    queryset = Budget.objects.all()  # the nested category is read from lookups.categories()
     serializer_class = BudgetSerializer
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]        # filters
     search_fields = ['category__name', 'start_date','end_date']             # search budget by category, by start and end date
@@ -52,42 +127,50 @@ class BudgetViewSet(viewsets.ModelViewSet):
         
     # returns percentage of budget used from amount planned
     @action(detail=False, methods=['get'])
+    @cached_analytics(GLOBAL_SCOPE)
     def progress(self, request):
-        today = date.today()
-        start_of_month = today.replace(day=1)
-        start_of_nextMonth = (start_of_month.replace(day=28) + timedelta(days=4)).replace(day=1)  # First day of next month
-
-        budgets = Budget.objects.filter(start_date__gte=start_of_month, start_date__lt=start_of_nextMonth)
-        completed_transactions = Transaction.objects.filter(completed=True, type='expense')
-
-        budget_progress = []
-
-        for budget in budgets:
-            actual_expenses = completed_transactions.filter(category=budget.category).aggregate(total=Sum('amount'))
-            total_spent = actual_expenses['total'] or 0
-
-            budget_progress.append({
-                'budget_id': budget.id,
-                'category': budget.category.name,
-                'budget_amount': budget.amount,
-                'amount_spent': total_spent,
-                'amount_remaining': budget.amount - total_spent,
-                'percentage_used': (total_spent / budget.amount) * 100 if budget.amount > 0 else 0
-            })
+        budgets = analytics.progress_queryset(date.today())
+        return Response(analytics.progress_payload(budgets, lookups.categories()))
 
-        return Response(budget_progress)               
+    # threshold alerts of the user's budgets (every budget for staff), newest first
+    @action(detail=False, methods=['get'])
+    def alerts(self, request):
+        alerts = BudgetAlert.objects.select_related('budget__category').order_by('-created_at', '-id')
+        user = request.user
+        if not user.is_authenticated:
+            alerts = alerts.none()
+        elif not user.is_staff:
+            alerts = alerts.filter(budget__user=user)
+        return Response(BudgetAlertSerializer(alerts[:BUDGET_ALERT_LIMIT], many=True).data)
 
 # Transaction viewset
-class TransactionsViewSet(viewsets.ModelViewSet):
-    queryset = Transaction.objects.all()
+class TransactionsViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
+    queryset = Transaction.objects.select_related('user')  # nested in read responses, the category comes from lookups.categories()
     serializer_class = TransactionSerializer
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]        #filters
+    filter_backends = [FieldFilter, FullTextSearchFilter, filters.OrderingFilter]        #filters
     search_fields = ['description','category__name', 'note', 'client']           # search transactions by category, by note and name
+    search_index = search.TRANSACTION_INDEX                                  # FTS5 index over the same fields
     ordering_fields = ['date', 'amount', 'type', 'completed']      # order transactions by date, amount,type(income,expense),complete status
     filterset_fields = ['type', 'completed', 'category__name']     # filter transactions by type(income,expense),complete status,category
+    ordering = ['-date']                                            # Default ordering, newest first
+    pagination_class = KeysetPagination                             # cursor pages keyed on (ordering field, id)
     permission_classes = [IsAuthenticatedOrReadOnly]                        
 
+    # json lists are read as values() rows and built by FlatTransactionSerializer,
+    # the browsable API keeps the model serializers it renders its forms from
+    def flat_list(self):
+        renderer = getattr(self.request, 'accepted_renderer', None)
+        return self.action == 'list' and renderer is not None and renderer.format != 'api'
+
+    # the values() read are picked by fieldsets.restrict, which joins only what is sent
+    def get_queryset(self):
+        if self.flat_list():
+            return Transaction.objects.all()
+        return super().get_queryset()
+
     def get_serializer_class(self):
+        if self.flat_list():
+            return FlatTransactionSerializer
     # for read actions (list and retrieve)
         if self.action in ['list', 'retrieve']:
             return TransactionCategoryUserSerializer
@@ -97,39 +180,106 @@ class TransactionsViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    # streams the (searched and ordered) ledger as csv or ndjson
+    # rows are read with a chunked iterator over values() so memory stays flat
+    @action(detail=False, methods=['get'], renderer_classes=[CSVRenderer, NDJSONRenderer])
+    def export(self, request):
+        queryset = self.filter_queryset(self.get_queryset()).values_list(*EXPORT_FIELDS.values())
+        rows = queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        renderer = request.accepted_renderer
+
+        if renderer.format == 'csv':
+            writer = csv.writer(Echo())
+            lines = itertools.chain(
+                [writer.writerow(EXPORT_FIELDS.keys())],
+                (writer.writerow(row) for row in rows)
+            )
+        else:
+            encoder = DjangoJSONEncoder()
+            lines = (encoder.encode(dict(zip(EXPORT_FIELDS, row))) + '\n' for row in rows)
+
+        response = StreamingHttpResponse(lines, content_type=f'{renderer.media_type}; charset={renderer.charset}')
+        response['Content-Disposition'] = f'attachment; filename="transactions.{renderer.format}"'
+        return response
+
+    # bulk import from a json array or a csv upload (multipart field "file")
+    # rows are validated in one pass, categories resolved in one query and the
+    # valid rows written with bulk_create in ?batch_size= batches in one transaction
+    # nothing is written when a row is invalid unless ?skip_invalid=true
+    @action(detail=False, methods=['post'], url_path='import')
+    def bulk_import(self, request):
+        try:
+            batch_size = int(request.query_params.get('batch_size', IMPORT_BATCH_SIZE))
+        except ValueError:
+            batch_size = 0
+        if not 1 <= batch_size <= IMPORT_MAX_BATCH_SIZE:
+            return Response({
+                'error': f'batch_size must be between 1 and {IMPORT_MAX_BATCH_SIZE}.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            rows = import_rows(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        errors = []
+        valid = []
+        for index, row in enumerate(rows):
+            serializer = TransactionImportSerializer(data=row)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                errors.append({'row': index, 'errors': serializer.errors})
+
+        # category names (or ids) are resolved once each from the in-process lookup table
+        table = lookups.categories()
+        categories = {reference: table.resolve(reference) for reference in {data['category'] for _, data in valid}}
+        transactions = []
+        for index, data in valid:
+            category = categories[data['category']]
+            if category is None:
+                errors.append({'row': index, 'errors': {'category': [f'Unknown category "{data["category"]}".']}})
+                continue
+            transactions.append(Transaction(user=request.user, category_id=category.pk, **{
+                field: value for field, value in data.items() if field != 'category'
+            }))
+
+        errors.sort(key=lambda error: error['row'])
+        skip_invalid = request.query_params.get('skip_invalid', '').lower() in ('1', 'true', 'yes')
+        if errors and not skip_invalid:
+            return Response({
+                'error': 'Import contains invalid rows. Nothing was imported.',
+                'created': 0,
+                'errors': errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        with db_transaction.atomic():
+            Transaction.objects.bulk_create(transactions, batch_size=batch_size)
+            rollups.add_transactions(transactions)  # bulk_create skips the rollup and cache signals
+            signals.invalidate_analytics_cache(request.user.pk)
+
+        return Response({
+            'created': len(transactions),
+            'errors': errors
+        }, status=status.HTTP_201_CREATED)
+
     @action(detail=False, methods=['get'])
+    @cached_analytics(GLOBAL_SCOPE)
     def summary(self, request):
         today = timezone.now().date()
-        last_month = today - timedelta(days=30)
-        
-        transactions = Transaction.objects.all()
-        completed_transactions = transactions.filter(completed=True)
-        pending_transactions = transactions.filter(completed=False)
-        
-        income = completed_transactions.filter(type='income').aggregate(total=Sum('amount')) 
-        expenses = completed_transactions.filter(type='expense').aggregate(total=Sum('amount')) 
-        pending_income = pending_transactions.filter(type='income').aggregate(total=Sum('amount'))
-        pending_expenses = pending_transactions.filter(type='expense').aggregate(total=Sum('amount'))
-        avg_monthly_expense = expenses['total'] or 0  # Since we're considering a 30-day window
-        net_amount = (income['total'] or 0) - (expenses['total'] or 0)
-        burn_rate = net_amount / avg_monthly_expense if avg_monthly_expense > 0 else 1
-        return Response({
-            'completed': {
-                'total_income': income['total'] or 0,
-                'total_expenses': expenses['total'] or 0,
-                'net_amount': (income['total'] or 0) - (expenses['total'] or 0),
-                'burn_rate': burn_rate or 0
-            },
-            'pending': {
-                'total_income': pending_income['total'] or 0,
-                'total_expenses': pending_expenses['total'] or 0,
-                'net_amount': (pending_income['total'] or 0) - (pending_expenses['total'] or 0)
-            }
-        })  
+
+        # optional ?start_date=&end_date=&user=&category= scoping
+        try:
+            scope = analytics.summary_scope(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # all totals come from a single scan of the daily rollup
+        rows, aggregates = analytics.summary_query(scope, today)
+        return Response(analytics.summary_payload(rows.aggregate(**aggregates)))
 
 # forecast viewset
-class ForecastViewSet(viewsets.ModelViewSet):
-    queryset = Forecast.objects.all()
+class ForecastViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
+    queryset = Forecast.objects.select_related('user')
     serializer_class = ForecastSerializer
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]         #filters
     search_fields = ['start_date', 'opening_balance', 'closing_balance']  # search forecasts by date,balance (opening, closing)
@@ -139,78 +289,109 @@ class ForecastViewSet(viewsets.ModelViewSet):
     ordering_fields = ['start_date', 'opening_balance','closing_balance']    # Fields to order by
     ordering = ['start_date']
     permission_classes = [IsAuthenticatedOrReadOnly]
+
+    # rows materialized by the materialize_forecasts command, own rows only unless staff
+    def get_queryset(self):
+        forecasts = Forecast.objects.select_related('user')
+        user = self.request.user
+        if user.is_staff:
+            return forecasts
+        if not user.is_authenticated:
+            return forecasts.none()
+        return forecasts.filter(user=user)
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
     
     # returns 13weeks projection based past data
+    # ?periods= sets the horizon and ?bucket=day|week|month the period size
     @action(detail=False, methods=['get'])
+    @cached_analytics(USER_SCOPE)
     def summary13week(self, request):
         current_date = timezone.now().date()
         user = request.user
 
-        # Calculate initial closing balance from completed transactions
-        income_expense = Transaction.objects.filter(
-            user=user,
-            date__lte=current_date,
-            completed=True
-        ).aggregate(
-            income=Coalesce(Sum('amount', filter=Q(type='income')), Value(0, output_field=models.DecimalField())),
-            expense=Coalesce(Sum('amount', filter=Q(type='expense')), Value(0, output_field=models.DecimalField()))
-        )
-        initial_closing = income_expense['income'] - income_expense['expense']
-
-        # Calculate weekly average expense
-        thirty_days_ago = current_date - timedelta(days=30)
-        avg_monthly_expense = Transaction.objects.filter(
-            user=user,
-            date__gte=thirty_days_ago,
-            type='expense',
-            completed=True
-        ).aggregate(total=Coalesce(Sum('amount'), Value(0, output_field=models.DecimalField())))['total']
-        weekly_avg_expense = (avg_monthly_expense / 30) * 7 if avg_monthly_expense else 0
+        try:
+            periods, bucket = analytics.projection_params(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        
-        projection = []
-        current_closing_balance = initial_closing
-
-        for week_num in range(13):
-            week_start = current_date + timedelta(weeks=week_num)
-            week_end = week_start + timedelta(days=6)
-
-            # Get pending transactions
-            aggregates = Transaction.objects.filter(
-                user=user,
-                date__range=[week_start, week_end],
-                completed=False
-            ).aggregate(
-                cash_in=Coalesce(Sum('amount', filter=Q(type='income')), Value(0, output_field=models.DecimalField())),
-                cash_out_pending=Coalesce(Sum('amount', filter=Q(type='expense')), Value(0, output_field=models.DecimalField()))
-            )
+        projection = forecasting.cash_projection(user, current_date, periods, bucket)
+        return Response(analytics.projection_payload(projection))
 
-            cash_in = aggregates['cash_in']
-            cash_out = aggregates['cash_out_pending'] + weekly_avg_expense
-            net_cash = cash_in - cash_out
-            opening = current_closing_balance
-            closing = opening + net_cash
+    # model based projection of net cash from the user's completed history
+    # ?model= picks one of forecasting.MODELS (or all), ?periods= and ?bucket= as for summary13week
+    @action(detail=False, methods=['get'])
+    @cached_analytics(USER_SCOPE)
+    def projection(self, request):
+        try:
+            periods, bucket = analytics.projection_params(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        model = request.query_params.get('model', 'seasonal')
+        if model != 'all' and model not in forecasting.MODELS:
+            return Response({
+                'error': f"Invalid model. Choose one of: {', '.join(forecasting.MODELS)}, all."
+            }, status=status.HTTP_400_BAD_REQUEST)
 
-            projection.append({
-                'week': week_num + 1,
-                'opening_balance': float(opening),
-                'cash_in': float(cash_in),
-                'cash_out': float(cash_out),
-                'closing_balance': float(closing),
-                'week_start': week_start,
-                'week_end': week_end,
-            })
+        # history runs through today, the projection starts tomorrow
+        model_names = forecasting.MODELS if model == 'all' else [model]
+        start_date = timezone.now().date() + timedelta(days=1)
+        results = forecasting.forecast(request.user, start_date, periods, bucket, model_names)
+        return Response(results if model == 'all' else results[model])
 
-            current_closing_balance = closing
+    # monte carlo runway: resamples historical daily flows into ?paths= cash paths
+    # over ?weeks= weeks, optional ?seed= makes the result reproducible
+    @action(detail=False, methods=['get'])
+    @cached_analytics(USER_SCOPE)
+    def runway(self, request):
+        params = request.query_params
+        try:
+            weeks = int(params.get('weeks', 13))
+            paths = int(params.get('paths', 10000))
+            seed = int(params['seed']) if params.get('seed') else None
+        except ValueError:
+            return Response({'error': 'weeks, paths and seed must be whole numbers.'}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= weeks <= MAX_RUNWAY_WEEKS or not 1 <= paths <= MAX_RUNWAY_PATHS or (seed is not None and seed < 0):
+            return Response({
+                'error': f'weeks must be between 1 and {MAX_RUNWAY_WEEKS}, paths between 1 and {MAX_RUNWAY_PATHS}.'
+            }, status=status.HTTP_400_BAD_REQUEST)
 
+        start_date = timezone.now().date() + timedelta(days=1)
+        return Response(forecasting.runway(request.user, start_date, weeks, paths, seed))
 
-        return Response(projection)
 # User Profile   
-class UserProfileViewSet(viewsets.ModelViewSet):
+class UserProfileViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
     serializer_class = UserProfileSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
+        profiles = UserProfile.objects.select_related('user')  # the role comes from lookups.roles()
         if self.request.user.is_staff:
-            return UserProfile.objects.all()
-        return UserProfile.objects.filter(user=self.request.user)
\ No newline at end of file
+            return profiles
+        return profiles.filter(user=self.request.user)
+
+# per route latency percentiles and mean query/stage timings of this process
+class MetricsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(metrics.snapshot())
+
+
+# rows created, updated or deleted since ?token= in every synced collection
+# (see sync.py); without a token the response is a snapshot with reset=true.
+# Follow the returned token while has_more is true, ?limit= caps rows per collection
+class SyncView(APIView):
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get('limit', SYNC_LIMIT))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= sync.MAX_LIMIT:
+            return Response({'error': f'limit must be between 1 and {sync.MAX_LIMIT}.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            token = sync.decode_token(request.query_params['token']) if request.query_params.get('token') else None
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(sync.changes(request.user, token, limit, timezone.now()))
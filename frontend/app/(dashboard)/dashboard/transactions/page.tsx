@@ -19,9 +19,27 @@ import { addDays, format } from "date-fns"
 import { Calendar } from "@/components/ui/calendar"
 import { TransactionDialog } from "@/components/dashboard/transaction-dialog"
 import { cn } from "@/lib/utils"
-import { API_BASE_URL, transactions as transactionsEndpoint } from "../../../../services/api/urls"
+import {
+  API_BASE_URL,
+  categories as categoriesEndpoint,
+  transactions as transactionsEndpoint,
+} from "../../../../services/api/urls"
+
+import React, { useState, useEffect, useRef, useCallback } from "react"
 
-import React, { useState, useEffect } from "react"
+const PAGE_SIZE = 50
+const SEARCH_DELAY_MS = 300
+
+async function fetchJson(url: string) {
+  const response = await fetch(url, {
+    method: "GET",
+    credentials: "include",
+  })
+  if (!response.ok) {
+    throw new Error("Network response was not ok")
+  }
+  return response.json()
+}
 // Sample data - replace with actual API data
 // const transactions = [
 //   {
@@ -127,44 +145,82 @@ export default function TransactionsPage() {
   const [selectedCategory, setSelectedCategory] = useState("All Categories")
   const [transactionType, setTransactionType] = useState("all")
   const [showTransactionDialog, setShowTransactionDialog] = useState(false)
+  const [categories, setCategories] = useState<string[]>(["All Categories"])
+  const [nextUrl, setNextUrl] = useState<string | null>(null)
+  const [loadingMore, setLoadingMore] = useState(false)
+  const latestQuery = useRef(0)  // responses of superseded filters are dropped
+  const sentinel = useRef<HTMLDivElement>(null)
 
   useEffect(() => {
-    async function fetchTransactionsData() {
+    fetchJson(`${API_BASE_URL}${categoriesEndpoint}`)
+      .then((data) => {
+        const rows = Array.isArray(data) ? data : data.results
+        setCategories(["All Categories", ...rows.map((category: any) => category.name)])
+      })
+      .catch((error) => console.error("Error fetching categories:", error))
+  }, [])
+
+  // search, type and category are filtered by the API, the list loads a page at a time
+  useEffect(() => {
+    const params = new URLSearchParams({ page_size: String(PAGE_SIZE), ordering: "-date" })
+    if (searchQuery.trim()) {
+      params.set("search", searchQuery.trim())
+    }
+    if (transactionType !== "all") {
+      params.set("type", transactionType)
+    }
+    if (selectedCategory !== "All Categories") {
+      params.set("category__name", selectedCategory)
+    }
+
+    const query = ++latestQuery.current
+    const timer = setTimeout(async () => {
       try {
-        const response = await fetch(`${API_BASE_URL}${transactionsEndpoint}`, {
-          method: "GET",
-          credentials: "include",
-        })
-        if (!response.ok) {
-          throw new Error("Network response was not ok")
+        const data = await fetchJson(`${API_BASE_URL}${transactionsEndpoint}?${params}`)
+        if (query === latestQuery.current) {
+          setTransactionsData(data.results)
+          setNextUrl(data.next)
         }
-        const data = await response.json()
-        setTransactionsData(data)
       } catch (error) {
         console.error("Error fetching transactions data:", error)
       }
-    }
-    fetchTransactionsData()
-  }, [])
-
-  const categories = ["All Categories", ...new Set(transactionsData.map(transaction => transaction.category.name))];
-
-
-  // Filter transactions based on search, category, and type
-  const filteredTransactions = transactionsData.filter((transaction) => {
-    const matchesSearch =
-      transaction.description.toLowerCase().includes(searchQuery.toLowerCase()) ||
-      transaction.client.toLowerCase().includes(searchQuery.toLowerCase())
+    }, searchQuery ? SEARCH_DELAY_MS : 0)
+    return () => clearTimeout(timer)
+  }, [searchQuery, selectedCategory, transactionType])
 
-    const matchesCategory = selectedCategory === "All Categories" || transaction.category.name === selectedCategory
-
-    const matchesType =
-      transactionType === "all" ||
-      (transactionType === "income" && transaction.type === "income") ||
-      (transactionType === "expense" && transaction.type === "expense")
+  const loadMore = useCallback(async () => {
+    if (!nextUrl || loadingMore) {
+      return
+    }
+    const query = latestQuery.current
+    setLoadingMore(true)
+    try {
+      const data = await fetchJson(nextUrl)
+      if (query === latestQuery.current) {
+        setTransactionsData((rows) => [...rows, ...data.results])
+        setNextUrl(data.next)
+      }
+    } catch (error) {
+      console.error("Error fetching transactions data:", error)
+    } finally {
+      setLoadingMore(false)
+    }
+  }, [nextUrl, loadingMore])
 
-    return matchesSearch && matchesCategory && matchesType
-  })
+  // the next page loads when the end of the table scrolls into view
+  useEffect(() => {
+    const element = sentinel.current
+    if (!element || !nextUrl) {
+      return
+    }
+    const observer = new IntersectionObserver((entries) => {
+      if (entries[0].isIntersecting) {
+        loadMore()
+      }
+    })
+    observer.observe(element)
+    return () => observer.disconnect()
+  }, [nextUrl, loadMore])
 
   return (
     <DashboardLayout>
@@ -274,14 +330,14 @@ export default function TransactionsPage() {
                   </TableRow>
                 </TableHeader>
                 <TableBody>
-                  {filteredTransactions.length === 0 ? (
+                  {transactionsData.length === 0 ? (
                     <TableRow>
                       <TableCell colSpan={5} className="h-24 text-center">
                         No transactions found.
                       </TableCell>
                     </TableRow>
                   ) : (
-                    filteredTransactions.map((transaction) => (
+                    transactionsData.map((transaction) => (
                       <TableRow key={transaction.id}>
                         <TableCell className="font-medium">{transaction.description}</TableCell>
                         <TableCell>{transaction.category.name}</TableCell>
@@ -304,6 +360,9 @@ export default function TransactionsPage() {
                   )}
                 </TableBody>
               </Table>
+              <div ref={sentinel} className="h-8 text-center text-sm text-muted-foreground">
+                {loadingMore && "Loading more transactions..."}
+              </div>
             </div>
           </CardContent>
         </Card>
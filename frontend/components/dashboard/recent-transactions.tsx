@@ -42,7 +42,7 @@ export function RecentTransactions() {
           throw new Error("Network response was not ok")
         }
         const data = await response.json()
-        setTransactions(data)
+        setTransactions(data.results)
         setIsLoading(false) // Set loading to false after successful fetch
       } catch (error) {
         console.error("Error fetching budget data:", error)
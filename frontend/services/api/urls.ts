@@ -5,7 +5,9 @@ export const API_BASE_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost
 
 // api endpoints
 export const budgets = "budgets/progress";
+export const budgetAlerts = "budgets/alerts/";
 export const categories = "categories/";
 export const transactions = "transactions/";
 export const transactionsSummary = "transactions/summary/";
-export const forecast13week = "forecasts/summary13week/";
\ No newline at end of file
+export const forecast13week = "forecasts/summary13week/";
+export const sync = "sync/";